@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Upper
 
 
 class User(AbstractUser):
@@ -23,6 +24,10 @@ class User(AbstractUser):
         verbose_name = 'User'
         verbose_name_plural = 'Users'
         ordering = ['-created_at']
+        indexes = [
+            # Backs case-insensitive e-mail lookups (e.g. order search in the admin)
+            models.Index(Upper('email'), name='user_email_upper_idx'),
+        ]
     
     def __str__(self):
         return self.email
@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Category, Product, ProductImage
+from .cache import bump_catalog_version
+from .models import Category, PriceWindow, Product, ProductImage
 
 
 class ProductImageInline(admin.TabularInline):
@@ -9,6 +11,12 @@ class ProductImageInline(admin.TabularInline):
     fields = ['image', 'ordering']
 
 
+class PriceWindowInline(admin.TabularInline):
+    model = PriceWindow
+    extra = 0
+    fields = ['price', 'starts_at', 'ends_at']
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'slug', 'is_active', 'ordering', 'created_at']
@@ -24,7 +32,7 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ['category', 'status', 'is_new', 'created_at']
     search_fields = ['name', 'slug', 'description']
     prepopulated_fields = {'slug': ('name',)}
-    inlines = [ProductImageInline]
+    inlines = [PriceWindowInline, ProductImageInline]
     list_editable = ['status', 'is_new']
     
     fieldsets = (
@@ -32,7 +40,8 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('name', 'slug', 'description', 'category')
         }),
         ('Pricing', {
-            'fields': ('price', 'promo_price', 'promo_start', 'promo_end')
+            'fields': ('price', 'promo_price', 'promo_start', 'promo_end'),
+            'description': 'More promo windows can be scheduled under Price Windows below.'
         }),
         ('Inventory', {
             'fields': ('stock_quantity',)
@@ -46,39 +55,40 @@ class ProductAdmin(admin.ModelAdmin):
     
     def current_price_display(self, obj):
         """Display current price with promo indicator."""
-        if obj.promo_price and obj.promo_start and obj.promo_end:
-            from django.utils import timezone
-            now = timezone.now()
-            if obj.promo_start <= now <= obj.promo_end:
-                return format_html(
-                    '<span style="color: red; text-decoration: line-through;">€{}</span> '
-                    '<span style="color: green; font-weight: bold;">€{}</span>',
-                    obj.price, obj.promo_price
-                )
+        if obj.effective_price is not None and obj.effective_price != obj.price:
+            return format_html(
+                '<span style="color: red; text-decoration: line-through;">€{}</span> '
+                '<span style="color: green; font-weight: bold;">€{}</span>',
+                obj.price, obj.effective_price
+            )
         return f'€{obj.price}'
     current_price_display.short_description = 'Price'
     
     def activate_products(self, request, queryset):
         """Bulk action to activate products."""
-        queryset.update(status='active')
+        queryset.update(status='active', updated_at=timezone.now())
+        bump_catalog_version()
         self.message_user(request, f'{queryset.count()} products activated.')
     activate_products.short_description = 'Activate selected products'
     
     def deactivate_products(self, request, queryset):
         """Bulk action to deactivate products."""
-        queryset.update(status='hidden')
+        queryset.update(status='hidden', updated_at=timezone.now())
+        bump_catalog_version()
         self.message_user(request, f'{queryset.count()} products deactivated.')
     deactivate_products.short_description = 'Deactivate selected products'
     
     def set_as_new(self, request, queryset):
         """Bulk action to set products as new."""
-        queryset.update(is_new=True)
+        queryset.update(is_new=True, updated_at=timezone.now())
+        bump_catalog_version()
         self.message_user(request, f'{queryset.count()} products marked as new.')
     set_as_new.short_description = 'Mark selected products as new'
     
     def remove_new_flag(self, request, queryset):
         """Bulk action to remove new flag."""
-        queryset.update(is_new=False)
+        queryset.update(is_new=False, updated_at=timezone.now())
+        bump_catalog_version()
         self.message_user(request, f'{queryset.count()} products unmarked as new.')
     remove_new_flag.short_description = 'Remove new flag from selected products'
 
@@ -0,0 +1,11 @@
+from django.urls import re_path
+from .async_views import category_detail, category_list, product_detail, product_list
+
+# Same paths and names as the router in catalog/urls.py; anything not matched
+# here (API root, format suffixes) falls through to the synchronous viewsets.
+urlpatterns = [
+    re_path(r'^categories/$', category_list, name='category-list'),
+    re_path(r'^categories/(?P<pk>[^/.]+)/$', category_detail, name='category-detail'),
+    re_path(r'^products/$', product_list, name='product-list'),
+    re_path(r'^products/(?P<pk>[^/.]+)/$', product_detail, name='product-detail'),
+]
@@ -0,0 +1,183 @@
+"""
+Async read path for the public catalog, served by the ASGI application.
+
+Each endpoint borrows its DRF viewset for everything that does not query the
+database (filter backends, ordering, pagination links, serializers, cache
+keys, validators, rendering) and runs the queries through Django's async ORM,
+so a slow query no longer holds a worker thread. Responses, cache entries and
+ETags are the same as on the WSGI path. Requests this path does not cover
+(other HTTP methods, the browsable API, cursor pagination) are handed to the
+viewset in a thread.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from core.profiling import timer
+from .cache import aget_catalog_version
+from .views import CategoryViewSet, ProductViewSet
+
+
+class AsyncCatalogView:
+    """
+    Async GET handler for the list or retrieve action of a catalog viewset.
+    The viewset must use CachedResponseMixin and ConditionalGetMixin.
+    """
+    
+    def __init__(self, viewset_class, action, basename):
+        self.viewset_class = viewset_class
+        self.action = action
+        self.basename = basename
+        self.detail = action == 'retrieve'
+        self.sync_view = sync_to_async(
+            viewset_class.as_view({'get': action}, basename=basename, detail=self.detail)
+        )
+    
+    def as_view(self):
+        async def view(request, **kwargs):
+            return await self.dispatch(request, **kwargs)
+        return view
+    
+    def get_view(self, request, kwargs):
+        """Set up a viewset instance the way APIView.dispatch does, without authentication."""
+        view = self.viewset_class(basename=self.basename, detail=self.detail, action=self.action)
+        view.action_map = {'get': self.action, 'head': self.action}
+        view.get = view.head = getattr(view, self.action)
+        view.args, view.kwargs = (), kwargs
+        view.request = view.initialize_request(request, **kwargs)
+        view.headers = view.default_response_headers
+        view.format_kwarg = view.get_format_suffix(**kwargs)
+        view.request.accepted_renderer, view.request.accepted_media_type = (
+            view.perform_content_negotiation(view.request)
+        )
+        view.request.version, view.request.versioning_scheme = view.determine_version(view.request, **kwargs)
+        return view
+    
+    def runs_in_thread(self, request, view):
+        """Requests left to the synchronous viewset."""
+        if request.method not in ('GET', 'HEAD') or view is None:
+            return True
+        if not isinstance(view.request.accepted_renderer, JSONRenderer):
+            return True
+        wants_cursor = getattr(view.paginator, 'wants_cursor', None)
+        return not self.detail and wants_cursor is not None and wants_cursor(view.request)
+    
+    async def dispatch(self, request, **kwargs):
+        try:
+            view = self.get_view(request, kwargs)
+        except Exception:
+            # Not acceptable, bad version, ...: let the viewset answer
+            view = None
+        if self.runs_in_thread(request, view):
+            return await self.sync_view(request, **kwargs)
+        
+        try:
+            if self.detail:
+                response = await self.retrieve(view)
+            else:
+                response = await self.list(view)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        return self.finalize_response(view, response)
+    
+    def finalize_response(self, view, response):
+        """Render here, so the handler does not need a thread to render a DRF Response."""
+        response = view.finalize_response(view.request, response)
+        if isinstance(response, Response):
+            with timer('render'):
+                response.render()
+            response = HttpResponse(response.content, status=response.status_code, headers=response.headers)
+        return response
+    
+    async def list(self, view):
+        queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+        return await self.conditional_response(view, queryset, self.list_response)
+    
+    async def retrieve(self, view):
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+        try:
+            queryset = queryset.filter(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        return await self.conditional_response(view, queryset, self.retrieve_response)
+    
+    async def conditional_response(self, view, queryset, handler):
+        """ConditionalGetMixin.conditional_response with the aggregate run asynchronously."""
+        values = await queryset.order_by().aaggregate(**view.get_conditional_aggregates())
+        view.etag = etag = view.etag_from_aggregates(values)
+        response = get_conditional_response(view.request, etag=etag)
+        if response is None:
+            response = await self.cached_response(view, queryset, handler)
+        if response.status_code in (200, 304):
+            if etag:
+                response['ETag'] = etag
+            patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+    
+    async def cached_response(self, view, queryset, handler):
+        """CachedResponseMixin.cached_response using the async cache API."""
+        if not view.caches_response(view.request):
+            return await handler(view, queryset)
+        
+        key = view.get_response_cache_key(view.request, version=await aget_catalog_version())
+        entry = await cache.aget(key)
+        if entry is None:
+            response = await handler(view, queryset)
+            if response.status_code != 200:
+                return response
+            entry = view.build_cache_entry(view.request, response)
+            await cache.aset(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+        
+        # Compress outside the event loop
+        coding, changed = await sync_to_async(view.negotiate_encoding, thread_sensitive=False)(view.request, entry)
+        if changed and view.remaining_timeout(entry) > 0:
+            await cache.aset(key, entry, view.remaining_timeout(entry))
+        return view.entry_response(entry, coding)
+    
+    async def list_response(self, view, queryset):
+        paginator = view.paginator
+        if paginator is None:
+            rows = [obj async for obj in queryset.aiterator()]
+            return Response(view.get_serializer(rows, many=True).data)
+        
+        get_list_queryset = getattr(view, 'get_list_queryset', None)
+        if get_list_queryset is not None:
+            queryset = get_list_queryset(queryset)
+        rows = await self.paginate(getattr(paginator, 'fallback', paginator), queryset, view.request)
+        return paginator.get_paginated_response(view.get_serializer(rows, many=True).data)
+    
+    async def retrieve_response(self, view, queryset):
+        try:
+            instance = await queryset.aget()
+        except queryset.model.DoesNotExist:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        return Response(view.get_serializer(instance).data)
+    
+    async def paginate(self, pagination, queryset, request):
+        """PageNumberPagination.paginate_queryset with the count and page fetched asynchronously."""
+        paginator = pagination.django_paginator_class(queryset, pagination.get_page_size(request))
+        paginator.count = await queryset.acount()
+        page_number = pagination.get_page_number(request, paginator)
+        try:
+            page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(pagination.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        
+        page.object_list = [obj async for obj in page.object_list.aiterator()]
+        pagination.request = request
+        pagination.page = page
+        return page.object_list
+
+
+product_list = AsyncCatalogView(ProductViewSet, 'list', basename='product').as_view()
+product_detail = AsyncCatalogView(ProductViewSet, 'retrieve', basename='product').as_view()
+category_list = AsyncCatalogView(CategoryViewSet, 'list', basename='category').as_view()
+category_detail = AsyncCatalogView(CategoryViewSet, 'retrieve', basename='category').as_view()
@@ -0,0 +1,469 @@
+"""
+Streaming bulk import and export of the catalog (CSV or JSON Lines).
+
+Rows are read and written one at a time and written to the database in
+batches, so memory stays flat whatever the file size. Products are upserted
+by slug with bulk_create/bulk_update; rows without a slug become new products
+with a unique slug derived from their name. Bulk writes send no model
+signals, so the importer keeps the derived state itself: precomputed prices,
+the search vector (PostgreSQL), primary images and, once at the end, the
+catalog cache version.
+"""
+import csv
+import json
+import os
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils._os import safe_join
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from .cache import bump_catalog_version
+from .models import Category, PriceWindow, Product, ProductImage
+
+FORMATS = ('csv', 'jsonl')
+FIELDS = [
+    'slug', 'name', 'description', 'category', 'price', 'promo_price', 'promo_start', 'promo_end',
+    'stock_quantity', 'status', 'is_new', 'images',
+]
+# Columns copied onto Product as they are (category and images are resolved)
+PRODUCT_FIELDS = [
+    'name', 'description', 'price', 'promo_price', 'promo_start', 'promo_end',
+    'stock_quantity', 'status', 'is_new',
+]
+IMAGE_SEPARATOR = '|'
+SLUG_SUFFIX_RE = re.compile(r'-(\d+)$')
+# Model fields whose validators (max_length, max_digits, integer range) each column must pass
+LIMITS = {
+    **{field: Product._meta.get_field(field) for field in ('slug', 'name', 'price', 'promo_price', 'stock_quantity')},
+    'category': Category._meta.get_field('name'),
+}
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n', ''}
+
+
+class RowError(ValueError):
+    """A row that cannot be imported."""
+
+
+def detect_format(path, fmt=None):
+    """Return the explicit format, or the one implied by the file extension."""
+    if fmt:
+        return fmt
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(file, fmt):
+    """
+    Yield one dict per CSV record or JSON line. A line that is not a JSON
+    object is yielded as a RowError, for the importer to report and skip.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield RowError(f'Not valid JSON: {exc}.')
+            continue
+        yield row if isinstance(row, dict) else RowError('Not a JSON object.')
+
+
+class RowWriter:
+    """Write catalog rows as CSV (with a header) or JSON Lines."""
+    
+    def __init__(self, file, fmt):
+        self.file = file
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(file, fieldnames=FIELDS)
+            self.writer.writeheader()
+    
+    def csv_value(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+    
+    def write(self, row):
+        if self.fmt == 'csv':
+            self.writer.writerow({field: self.csv_value(value) for field, value in row.items()})
+        else:
+            self.file.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+
+
+def export_rows(products, batch_size=2000):
+    """
+    Yield one export row per product.
+    Products are read in primary key order one batch at a time (keyset
+    pagination, no OFFSET) with the images of each batch in a single query.
+    """
+    products = products.order_by('pk').values('pk', *PRODUCT_FIELDS, 'slug', 'category__name')
+    last_pk = 0
+    while True:
+        batch = list(products.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        images = {}
+        for product_id, name in ProductImage.objects.filter(
+            product_id__in=[row['pk'] for row in batch]
+        ).order_by('ordering', 'created_at', 'pk').values_list('product_id', 'image'):
+            images.setdefault(product_id, []).append(name)
+        for row in batch:
+            yield {
+                'slug': row['slug'],
+                'name': row['name'],
+                'description': row['description'],
+                'category': row['category__name'],
+                'price': row['price'],
+                'promo_price': row['promo_price'],
+                'promo_start': row['promo_start'],
+                'promo_end': row['promo_end'],
+                'stock_quantity': row['stock_quantity'],
+                'status': row['status'],
+                'is_new': row['is_new'],
+                'images': IMAGE_SEPARATOR.join(images.get(row['pk'], [])),
+            }
+        last_pk = batch[-1]['pk']
+
+
+def parse_decimal(value, field, required=False):
+    if value in (None, ''):
+        if required:
+            raise RowError(f'{field} is required.')
+        return None
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise RowError(f'{field}: {value!r} is not a number.')
+    if not number.is_finite() or number < 0:
+        raise RowError(f'{field}: {value!r} must be a positive number.')
+    try:
+        return number.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RowError(f'{field}: {value!r} is too large.')
+
+
+def parse_datetime_value(value, field):
+    if value in (None, ''):
+        return None
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise RowError(f'{field}: {value!r} is not an ISO 8601 date and time.')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_int(value, field):
+    try:
+        number = int(value or 0)
+    except (TypeError, ValueError):
+        raise RowError(f'{field}: {value!r} is not an integer.')
+    if number < 0:
+        raise RowError(f'{field}: {value!r} must not be negative.')
+    return number
+
+
+def parse_bool(value, field):
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f'{field}: {value!r} is not a boolean.')
+
+
+def clean_row(row):
+    """
+    Validate one input row; return a dict holding only the columns present.
+    Raises RowError.
+    """
+    cleaned = {}
+    for field in FIELDS:
+        if field not in row:
+            continue
+        value = row[field]
+        if field in ('price', 'promo_price'):
+            value = parse_decimal(value, field, required=field == 'price')
+        elif field in ('promo_start', 'promo_end'):
+            value = parse_datetime_value(value, field)
+        elif field == 'stock_quantity':
+            value = parse_int(value, field)
+        elif field == 'is_new':
+            value = parse_bool(value, field)
+        elif field == 'status':
+            value = value or 'draft'
+            if value not in dict(Product.STATUS_CHOICES):
+                raise RowError(f'status: {value!r} is not one of {", ".join(dict(Product.STATUS_CHOICES))}.')
+        elif field == 'images':
+            value = [name.strip() for name in (value or '').split(IMAGE_SEPARATOR) if name.strip()]
+        else:
+            value = (value or '').strip() if isinstance(value, str) or value is None else str(value)
+        cleaned[field] = value
+    if 'slug' in cleaned and cleaned['slug'] and cleaned['slug'] != slugify(cleaned['slug']):
+        raise RowError(f'slug: {cleaned["slug"]!r} is not a valid slug.')
+    # Values the database would reject would abort the whole batch
+    for field, model_field in LIMITS.items():
+        if cleaned.get(field) not in (None, ''):
+            try:
+                model_field.run_validators(cleaned[field])
+            except ValidationError as exc:
+                raise RowError(f'{field}: {" ".join(exc.messages)}')
+    return cleaned
+
+
+class SlugAllocator:
+    """
+    Hand out unique slugs for a model, in bulk.
+    One query per batch finds which base slugs are taken; the highest numeric
+    suffix in use is then looked up once per colliding base and counted up in
+    memory, so repeated names cost no further queries.
+    """
+    
+    def __init__(self, model, max_length=200):
+        self.model = model
+        self.max_length = max_length
+        self.next_suffix = {}
+    
+    def base(self, name, fallback):
+        # Leave room for a '-<n>' suffix within max_length
+        return (slugify(name) or fallback)[:self.max_length - 8].strip('-') or fallback
+    
+    def allocate(self, names, fallback='item', reserved=()):
+        """Return a unique slug for each name, in order. `reserved` slugs are also avoided."""
+        bases = [self.base(name, fallback) for name in names]
+        taken = set(reserved)
+        taken.update(self.model.objects.filter(
+            slug__in={base for base in bases if base not in self.next_suffix}
+        ).values_list('slug', flat=True))
+        slugs = [None] * len(bases)
+        pending = range(len(bases))
+        while pending:
+            for index in pending:
+                slugs[index] = self.candidate(bases[index], taken)
+                taken.add(slugs[index])
+            # A suffixed slug can still exist (created outside this import): retry those
+            clashes = set(self.model.objects.filter(
+                slug__in=[slugs[index] for index in pending]
+            ).values_list('slug', flat=True))
+            taken.update(clashes)
+            pending = [index for index in pending if slugs[index] in clashes]
+        return slugs
+    
+    def candidate(self, base, taken):
+        if base not in self.next_suffix:
+            if base not in taken:
+                self.next_suffix[base] = 2
+                return base
+            self.next_suffix[base] = self.highest_suffix(base) + 1
+        while True:
+            slug = f'{base}-{self.next_suffix[base]}'
+            self.next_suffix[base] += 1
+            if slug not in taken:
+                return slug
+    
+    def highest_suffix(self, base):
+        highest = 1
+        for slug in self.model.objects.filter(slug__startswith=f'{base}-').values_list('slug', flat=True).iterator():
+            match = SLUG_SUFFIX_RE.match(slug[len(base):])
+            if match:
+                highest = max(highest, int(match.group(1)))
+        return highest
+
+
+class CatalogImporter:
+    """
+    Upsert products from an iterable of rows.
+    Call run(rows) and read the counters afterwards. Rows that fail
+    validation are skipped and reported through `on_error(line, message)`.
+    """
+    
+    def __init__(self, batch_size=1000, images_dir=None, on_error=None, on_progress=None):
+        self.batch_size = batch_size
+        self.images_dir = images_dir
+        self.on_error = on_error or (lambda line, message: None)
+        self.on_progress = on_progress or (lambda importer: None)
+        self.product_slugs = SlugAllocator(Product)
+        self.category_slugs = SlugAllocator(Category)
+        self.categories = {}
+        self.stored_images = {}
+        self.image_field = ProductImage._meta.get_field('image')
+        self.rows = self.created = self.updated = self.unchanged = self.skipped = self.images = 0
+    
+    def run(self, rows):
+        batch = []
+        for line, row in enumerate(rows, start=1):
+            self.rows += 1
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                batch.append((line, clean_row(row)))
+            except RowError as exc:
+                self.skip(line, str(exc))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        if self.created or self.updated:
+            bump_catalog_version()
+    
+    def skip(self, line, message):
+        self.skipped += 1
+        self.on_error(line, message)
+    
+    def import_batch(self, batch):
+        with transaction.atomic():
+            self.write_batch(batch)
+        self.on_progress(self)
+    
+    def write_batch(self, batch):
+        now = timezone.now()
+        # The last row wins when a slug appears twice in a batch; the earlier ones are reported
+        keyed = {}
+        for line, row in batch:
+            key = row.get('slug') or ('new', line)
+            if key in keyed:
+                self.skip(keyed[key][0], f'slug {key!r} appears again on row {line}, which replaces this row.')
+            keyed[key] = (line, row)
+        
+        existing = Product.objects.in_bulk(
+            [key for key in keyed if isinstance(key, str)], field_name='slug'
+        )
+        self.resolve_categories(row['category'] for _, row in keyed.values() if row.get('category'))
+        windows = {}
+        for product_id, price, starts_at, ends_at in PriceWindow.objects.filter(
+            product__in=existing.values(), ends_at__gt=now
+        ).values_list('product_id', 'price', 'starts_at', 'ends_at'):
+            windows.setdefault(product_id, []).append((price, starts_at, ends_at))
+        
+        new_rows = [(line, row) for key, (line, row) in keyed.items() if key not in existing]
+        unnamed = {line for line, row in new_rows if not row.get('name') or row.get('price') is None}
+        for line in unnamed:
+            self.skip(line, 'name and price are required for new products.')
+        new_rows = [(line, row) for line, row in new_rows if line not in unnamed]
+        generated = iter(self.product_slugs.allocate(
+            [row['name'] for _, row in new_rows if not row.get('slug')],
+            fallback='product', reserved=[row['slug'] for _, row in new_rows if row.get('slug')],
+        ))
+        
+        to_create, to_update, images = [], [], []
+        update_fields = {'effective_price', 'price_valid_until', 'updated_at'}
+        for key, (line, row) in keyed.items():
+            product = existing.get(key)
+            if product is None and line in unnamed:
+                continue
+            values = {field: row[field] for field in PRODUCT_FIELDS if field in row}
+            if 'category' in row:
+                values['category_id'] = self.categories.get(row['category'])
+            
+            if product is None:
+                product = Product(slug=row.get('slug') or next(generated), **values)
+                product.apply_price_state([], now)
+                to_create.append(product)
+            else:
+                changed = [field for field, value in values.items() if getattr(product, field) != value]
+                for field in changed:
+                    setattr(product, field, values[field])
+                # Unchanged rows (e.g. re-importing an export) cost no write
+                if product.apply_price_state(windows.get(product.pk, []), now) or changed:
+                    product.updated_at = now
+                    update_fields.update(field.removesuffix('_id') for field in changed)
+                    to_update.append(product)
+                else:
+                    self.unchanged += 1
+            if row.get('images') and self.images_dir:
+                images.append((line, product, row['images']))
+        
+        Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+        Product.objects.bulk_update(to_update, sorted(update_fields), batch_size=self.batch_size)
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        
+        product_ids = [product.pk for product in to_create + to_update]
+        if product_ids and connections[Product.objects.db].vendor == 'postgresql':
+            Product.objects.filter(pk__in=product_ids).update_search_vector()
+        if images:
+            self.attach_images(images)
+    
+    def resolve_categories(self, names):
+        """Map category names to ids, creating missing categories in one query."""
+        missing = {name for name in names if name not in self.categories}
+        if not missing:
+            return
+        for pk, name in Category.objects.filter(name__in=missing).order_by('-pk').values_list('pk', 'name'):
+            # Lowest pk wins when several categories share a name
+            self.categories[name] = pk
+        missing = sorted(name for name in missing if name not in self.categories)
+        if missing:
+            slugs = self.category_slugs.allocate(missing, fallback='category')
+            created = Category.objects.bulk_create([
+                Category(name=name, slug=slug) for name, slug in zip(missing, slugs)
+            ])
+            for category in created:
+                self.categories[category.name] = category.pk
+    
+    def store_image(self, name):
+        """Save the file `name` from images_dir to product image storage; return its storage name."""
+        if name not in self.stored_images:
+            try:
+                path = safe_join(self.images_dir, name)
+            except SuspiciousFileOperation:
+                raise RowError(f'images: {name!r} is outside the images directory.')
+            if not os.path.isfile(path):
+                raise RowError(f'images: {name!r} not found in {self.images_dir}.')
+            target = self.image_field.generate_filename(None, os.path.basename(name))
+            with open(path, 'rb') as file:
+                self.stored_images[name] = self.image_field.storage.save(target, File(file, target))
+        return self.stored_images[name]
+    
+    def attach_images(self, rows):
+        """
+        Replace the images of each product with the listed files, keeping the
+        ones already attached. Storage is content-addressed, so re-importing
+        the same files writes nothing.
+        """
+        wanted = {}
+        for line, product, names in rows:
+            try:
+                wanted[product.pk] = [self.store_image(name) for name in names]
+            except RowError as exc:
+                self.on_error(line, str(exc))
+        if not wanted:
+            return
+        
+        attached = {}
+        for image in ProductImage.objects.filter(product_id__in=wanted).only('pk', 'product_id', 'image', 'ordering'):
+            attached[(image.product_id, image.image.name)] = image
+        to_create, to_update = [], []
+        for product_id, names in wanted.items():
+            for ordering, name in enumerate(names):
+                image = attached.pop((product_id, name), None)
+                if image is None:
+                    to_create.append(ProductImage(product_id=product_id, image=name, ordering=ordering))
+                elif image.ordering != ordering:
+                    image.ordering = ordering
+                    to_update.append(image)
+        if attached:
+            # Rare (images removed from a product): let the delete signals run
+            ProductImage.objects.filter(pk__in=[image.pk for image in attached.values()]).delete()
+        ProductImage.objects.bulk_create(to_create, batch_size=self.batch_size)
+        ProductImage.objects.bulk_update(to_update, ['ordering'], batch_size=self.batch_size)
+        Product.objects.filter(pk__in=wanted).refresh_primary_images()
+        self.images += len(to_create)
@@ -0,0 +1,194 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from core.compression import CODINGS, available_codings, choose_encoding, compress
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def get_catalog_version():
+    """Return the current catalog version token, creating one if needed."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(CATALOG_VERSION_KEY, version, timeout=None):
+            version = cache.get(CATALOG_VERSION_KEY, version)
+    return version
+
+
+async def aget_catalog_version():
+    """Async variant of get_catalog_version()."""
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not await cache.aadd(CATALOG_VERSION_KEY, version, timeout=None):
+            version = await cache.aget(CATALOG_VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog response.
+    A random token (rather than a counter) means an evicted version key can
+    never make old entries valid again.
+    """
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+class CachedResponseMixin:
+    """
+    Cache list/retrieve responses per catalog version, absolute URL and ETag
+    as rendered JSON. The key includes scheme, host and full query string,
+    since responses contain absolute links, and the ETag set by
+    ConditionalGetMixin, so a cached body is never older than the validator
+    sent with it (stock changes at checkout touch updated_at but send no
+    signal to bump the catalog version).
+    A gzip (or Brotli) variant is compressed the first time a client accepts
+    it and stored in the same entry, so later requests are served without
+    recompressing. Responses carry Vary: Accept-Encoding; their weak ETag is
+    the same for every coding. Other formats (browsable API, indented JSON)
+    are not cached.
+    """
+    cache_prefix = 'catalog:rendered'
+    etag = None
+    
+    def get_response_cache_key(self, request, version=None):
+        url_hash = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+        version = version or get_catalog_version()
+        etag_hash = hashlib.md5(self.etag.encode('utf-8')).hexdigest() if self.etag else '-'
+        return f'{self.cache_prefix}:{version}:{self.basename}:{self.action}:{url_hash}:{etag_hash}'
+    
+    def caches_response(self, request):
+        """Only compact JSON is cached."""
+        renderer = request.accepted_renderer
+        return isinstance(renderer, JSONRenderer) and renderer.get_indent(request.accepted_media_type, {}) is None
+    
+    def build_cache_entry(self, request, response):
+        """Render a 200 response once: the value stored in the cache."""
+        renderer = request.accepted_renderer
+        content = renderer.render(response.data, request.accepted_media_type, self.get_renderer_context())
+        content_type = f'{renderer.media_type}; charset={renderer.charset}' if renderer.charset else renderer.media_type
+        return {
+            'content_type': content_type,
+            'identity': content,
+            'expires': time.time() + settings.CATALOG_CACHE_TIMEOUT,
+        }
+    
+    def negotiate_encoding(self, request, entry):
+        """
+        Return (coding or None, changed): the coding to send, compressing the
+        entry's body for it if that variant is missing (changed is then True
+        and the entry should be stored again).
+        """
+        codings = [coding for coding in CODINGS if coding in entry or coding in available_codings()]
+        coding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'), codings)
+        if coding is None or coding in entry:
+            return coding, False
+        entry[coding] = compress(entry['identity'], coding)
+        return coding, True
+    
+    def remaining_timeout(self, entry):
+        """Seconds left before the entry expires, so storing a new variant does not extend it."""
+        return int(entry['expires'] - time.time())
+    
+    def entry_response(self, entry, coding):
+        body = entry.get(coding) if coding else None
+        response = HttpResponse(body or entry['identity'], content_type=entry['content_type'])
+        if body:
+            response['Content-Encoding'] = coding
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+    
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.caches_response(request):
+            return handler(request, *args, **kwargs)
+        
+        key = self.get_response_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = self.build_cache_entry(request, response)
+            cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+        
+        coding, changed = self.negotiate_encoding(request, entry)
+        if changed and self.remaining_timeout(entry) > 0:
+            cache.set(key, entry, self.remaining_timeout(entry))
+        return self.entry_response(entry, coding)
+    
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+    
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GETs on list/retrieve with 304 Not Modified.
+    The ETag comes from one aggregate query over the filtered queryset
+    (latest timestamps and row count), so revalidation skips serialization.
+    No Last-Modified is sent: the latest updated_at does not move when a
+    product is deleted or hidden, only the count does.
+    """
+    conditional_timestamp_fields = ['updated_at']
+    
+    def get_conditional_aggregates(self):
+        """Aggregates that change whenever the response would."""
+        aggregates = {'count': Count('pk')}
+        for index, field in enumerate(self.conditional_timestamp_fields):
+            aggregates[f'modified_{index}'] = Max(field)
+        return aggregates
+    
+    def get_etag(self, queryset):
+        """Return the ETag for queryset, or None if it is empty."""
+        values = queryset.order_by().aggregate(**self.get_conditional_aggregates())
+        return self.etag_from_aggregates(values)
+    
+    def etag_from_aggregates(self, values):
+        if not values['count']:
+            return None
+        fingerprint = '|'.join([
+            self.request.build_absolute_uri(),
+            self.request.accepted_media_type or '',
+            *(f'{key}={value}' for key, value in sorted(values.items())),
+        ])
+        # Weak: the validator tracks the data, not the exact bytes sent
+        return 'W/"%s"' % hashlib.md5(fingerprint.encode('utf-8')).hexdigest()
+    
+    def conditional_response(self, handler, queryset, request, *args, **kwargs):
+        self.etag = etag = self.get_etag(queryset)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            if etag:
+                response['ETag'] = etag
+            # The 200 response varies on it (CachedResponseMixin)
+            patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+    
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(super().list, queryset, request, *args, **kwargs)
+    
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            # Malformed lookup value: let get_object() answer 404
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(super().retrieve, queryset, request, *args, **kwargs)
@@ -0,0 +1,31 @@
+import django_filters
+from rest_framework import filters
+from .models import Product
+
+
+class StableOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter that ends every ordering with id (in the direction of the
+    first field), so rows with equal values keep one order across pages and
+    the (value, id) indexes can serve the sort.
+    """
+    
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering or any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            return ordering
+        direction = '-' if ordering[0].startswith('-') else ''
+        return [*ordering, f'{direction}id']
+
+
+class ProductFilter(django_filters.FilterSet):
+    """
+    FilterSet for Product.
+    Price range filters apply to the annotated current_price.
+    """
+    min_price = django_filters.NumberFilter(field_name='current_price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='current_price', lookup_expr='lte')
+    
+    class Meta:
+        model = Product
+        fields = ['category', 'status', 'is_new']
@@ -0,0 +1,167 @@
+"""
+Resized WebP/JPEG variants of product images.
+
+Variants are rendered with Pillow in a process pool, off the request path:
+workers only read the original from storage and write the variants back, the
+calling process stores the resulting names on ProductImage.variants from a
+thread of its own. Widths, formats and quality come from the PRODUCT_IMAGE_*
+settings.
+
+Variants live in the storage of ProductImage.image, which names files by the
+hash of their content: each original gets a directory of its own and a variant
+rendered with other settings gets a new name.
+"""
+import logging
+import multiprocessing
+import posixpath
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.db.models.functions import Now
+from PIL import Image, ImageOps
+
+from .cache import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = 'variants'
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+_executor = None
+_store_executor = None
+
+
+def variant_dir(name):
+    """Storage directory of the variants of image `name`."""
+    directory, filename = posixpath.split(name)
+    # Keep the original extension in the stem: photo.jpg and photo.png must not collide
+    return posixpath.join(directory, VARIANT_DIR, filename.replace('.', '-'))
+
+
+def variant_name(name, width, fmt):
+    """Name the `fmt` variant of image `name` at `width` pixels is saved as (the storage hashes the file name)."""
+    return posixpath.join(variant_dir(name), f'{width}w.{FORMATS[fmt][1]}')
+
+
+def variants_match(name, variants):
+    """Return True if variants were rendered from the image stored as `name`."""
+    directory = variant_dir(name)
+    return bool(variants) and all(
+        posixpath.dirname(variant) == directory
+        for widths in variants.values()
+        for variant in widths.values()
+    )
+
+
+def variant_urls(variants, storage):
+    """Return {format: [(width, url), ...]} ordered by width for stored `variants`."""
+    return {
+        fmt: sorted(
+            ((int(width), storage.url(name)) for width, name in widths.items()),
+            key=lambda variant: variant[0],
+        )
+        for fmt, widths in variants.items()
+    }
+
+
+def render_variants(name, storage=None):
+    """
+    Render every configured variant of image `name`; return {format: {width: name}}.
+    Widths at or above the original are skipped (an image narrower than every
+    configured width gets one variant at its own width).
+    """
+    if storage is None:
+        from .models import ProductImage
+        storage = ProductImage._meta.get_field('image').storage
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    
+    widths = [width for width in settings.PRODUCT_IMAGE_WIDTHS if width < image.width] or [image.width]
+    variants = {}
+    for fmt in settings.PRODUCT_IMAGE_FORMATS:
+        pil_format, _ = FORMATS[fmt]
+        converted = image
+        if pil_format == 'JPEG' and image.mode != 'RGB':
+            # JPEG has no alpha channel: flatten onto white
+            converted = Image.new('RGB', image.size, 'white')
+            rgba = image.convert('RGBA')
+            converted.paste(rgba, mask=rgba.getchannel('A'))
+        elif image.mode not in ('RGB', 'RGBA'):
+            converted = image.convert('RGBA')
+        
+        variants[fmt] = {}
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            resized = converted.resize((width, height), Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, quality=settings.PRODUCT_IMAGE_QUALITY, optimize=True)
+            variants[fmt][str(width)] = storage.save(variant_name(name, width, fmt), ContentFile(buffer.getvalue()))
+    return variants
+
+
+def _init_worker():
+    django.setup()
+
+
+def make_executor(workers):
+    """Process pool whose workers set up Django (spawned, so no inherited connections or threads)."""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+    )
+
+
+def get_executor():
+    """Process pool shared by this process, created on first use."""
+    global _executor
+    if _executor is None:
+        _executor = make_executor(settings.PRODUCT_IMAGE_WORKERS)
+    return _executor
+
+
+def get_store_executor():
+    """Thread of this process that stores rendered variants, created on first use."""
+    global _store_executor
+    if _store_executor is None:
+        _store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-variants')
+    return _store_executor
+
+
+def store_variants(image_id, name, variants):
+    """Save rendered variants unless the image was replaced in the meantime. Returns True if stored."""
+    from .models import Product, ProductImage
+    
+    updated = ProductImage.objects.filter(pk=image_id, image=name).update(variants=variants)
+    if updated:
+        Product.objects.filter(images=image_id).update(updated_at=Now())
+        bump_catalog_version()
+    return bool(updated)
+
+
+def store_rendered(image_id, name, future):
+    """Store the outcome of a render, opening and closing connections as a request would."""
+    close_old_connections()
+    try:
+        store_variants(image_id, name, future.result())
+    except Exception:
+        logger.exception('Could not generate variants for product image %s (%s)', image_id, name)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(image_id, name):
+    """Render variants of one image in the process pool and store them when done."""
+    future = get_executor().submit(render_variants, name)
+    # Done callbacks run in the pool's management thread: hand the database work to the store thread
+    future.add_done_callback(partial(get_store_executor().submit, store_rendered, image_id, name))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from catalog.cache import bump_catalog_version
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Flip precomputed effective prices of products whose promo or price window '
+        'started or ended. Run every minute (e.g. from cron).'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every product, not only those at a window boundary.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+    
+    def handle(self, *args, **options):
+        now = timezone.now()
+        products = Product.objects.all()
+        if not options['all']:
+            products = products.filter(price_valid_until__lte=now)
+        
+        with transaction.atomic():
+            changed = products.refresh_prices(now=now, batch_size=options['batch_size'])
+            if changed:
+                transaction.on_commit(bump_catalog_version)
+        
+        self.stdout.write(self.style.SUCCESS(f'{changed} product prices updated.'))
@@ -0,0 +1,50 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.bulk import FORMATS, RowWriter, detect_format, export_rows
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Export products as CSV or JSON Lines, in the format import_catalog reads. '
+        'Rows are streamed, so memory use does not grow with the catalog.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file (default: '-', standard output).")
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Output format (default: from the file extension, else csv).')
+        parser.add_argument('--status', choices=[status for status, _ in Product.STATUS_CHOICES],
+                            help='Only export products with this status.')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Products read per query.')
+    
+    def handle(self, *args, **options):
+        fmt = detect_format(options['path'], options['format'])
+        products = Product.objects.all()
+        if options['status']:
+            products = products.filter(status=options['status'])
+        
+        if options['path'] == '-':
+            self.export(products, sys.stdout, fmt, options['batch_size'])
+            return
+        try:
+            file = open(options['path'], 'w', newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(exc)
+        with file:
+            count, elapsed = self.export(products, file, fmt, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} products exported in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} rows/s).'
+        ))
+    
+    def export(self, products, file, fmt, batch_size):
+        start = time.perf_counter()
+        writer = RowWriter(file, fmt)
+        count = 0
+        for row in export_rows(products, batch_size=batch_size):
+            writer.write(row)
+            count += 1
+        return count, time.perf_counter() - start
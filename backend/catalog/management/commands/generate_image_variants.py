@@ -0,0 +1,48 @@
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Now
+
+from catalog.cache import bump_catalog_version
+from catalog.images import make_executor, render_variants
+from catalog.models import Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Render resized WebP/JPEG variants for product images that have none yet.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Re-render every image (e.g. after changing PRODUCT_IMAGE_WIDTHS).')
+        parser.add_argument('--workers', type=int, default=settings.PRODUCT_IMAGE_WORKERS,
+                            help='Rendering processes.')
+    
+    def handle(self, *args, **options):
+        images = ProductImage.objects.exclude(image='')
+        if not options['all']:
+            images = images.filter(variants={})
+        pending = list(images.order_by('pk').values_list('pk', 'product_id', 'image'))
+        self.stdout.write(f'Rendering variants for {len(pending)} images with {options["workers"]} workers...')
+        
+        stored = failed = 0
+        product_ids = set()
+        with make_executor(options['workers']) as executor:
+            futures = {executor.submit(render_variants, name): (pk, product_id, name) for pk, product_id, name in pending}
+            for future in as_completed(futures):
+                pk, product_id, name = futures[future]
+                try:
+                    variants = future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'Image {pk} ({name}): {exc}')
+                    continue
+                # Skip images replaced while rendering
+                if ProductImage.objects.filter(pk=pk, image=name).update(variants=variants):
+                    stored += 1
+                    product_ids.add(product_id)
+        
+        if product_ids:
+            Product.objects.filter(pk__in=product_ids).update(updated_at=Now())
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'{stored} images rendered, {failed} failed.'))
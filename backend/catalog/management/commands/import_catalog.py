@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.bulk import FORMATS, CatalogImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Upsert products from a CSV or JSON Lines file (one product per row, matched by slug). '
+        'The file is streamed and written in batches; throughput is reported as it goes.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input.")
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format (default: from the file extension, else csv).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per transaction.')
+        parser.add_argument('--images', metavar='DIR',
+                            help="Directory the 'images' column is relative to; without it images are ignored.")
+    
+    def handle(self, *args, **options):
+        fmt = detect_format(options['path'], options['format'])
+        if options['images'] and not os.path.isdir(options['images']):
+            raise CommandError(f"{options['images']} is not a directory.")
+        
+        start = time.perf_counter()
+        
+        def on_error(line, message):
+            self.stderr.write(f'Row {line}: {message}')
+        
+        def on_progress(importer):
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'{importer.rows} rows, {importer.rows / elapsed:.0f} rows/s')
+        
+        importer = CatalogImporter(
+            batch_size=options['batch_size'], images_dir=options['images'],
+            on_error=on_error, on_progress=on_progress,
+        )
+        if options['path'] == '-':
+            importer.run(read_rows(sys.stdin, fmt))
+        else:
+            try:
+                file = open(options['path'], newline='', encoding='utf-8')
+            except OSError as exc:
+                raise CommandError(exc)
+            with file:
+                importer.run(read_rows(file, fmt))
+        
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'{importer.rows} rows in {elapsed:.1f}s ({importer.rows / max(elapsed, 1e-9):.0f} rows/s): '
+            f'{importer.created} created, {importer.updated} updated, {importer.unchanged} unchanged, '
+            f'{importer.skipped} skipped, '
+            f'{importer.images} images attached.'
+        ))
+        if importer.images:
+            self.stdout.write('Run generate_image_variants to render the resized variants of new images.')
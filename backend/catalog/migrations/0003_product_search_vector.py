@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:23
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """GIN index and backfill; skipped on databases without tsvector support."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX catalog_product_search_vector_gin '
+        'ON catalog_product USING gin (search_vector)'
+    )
+    vector = None
+    for config in settings.CATALOG_SEARCH_CONFIGS:
+        config_vector = (
+            SearchVector('name', weight='A', config=config)
+            + SearchVector('description', weight='B', config=config)
+        )
+        vector = config_vector if vector is None else vector + config_vector
+    Product = apps.get_model('catalog', 'Product')
+    Product.objects.update(search_vector=vector)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS catalog_product_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_product_primary_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:31
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def backfill_effective_prices(apps, schema_editor):
+    """
+    Effective price and next price change from the promo fields (the only
+    price window that exists yet). Self-contained on purpose: later changes to
+    catalog.pricing must not alter what this migration does.
+    """
+    Product = apps.get_model('catalog', 'Product')
+    now = timezone.now()
+    products = []
+    for product in Product.objects.only('price', 'promo_price', 'promo_start', 'promo_end').iterator():
+        product.effective_price, product.price_valid_until = product.price, None
+        start, end = product.promo_start, product.promo_end
+        if product.promo_price and start and end and start < end:
+            if start <= now < end:
+                product.effective_price = product.promo_price
+                product.price_valid_until = end
+            elif now < start:
+                product.price_valid_until = start
+        products.append(product)
+    Product.objects.bulk_update(products, ['effective_price', 'price_valid_until'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_valid_until',
+            field=models.DateTimeField(db_index=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='PriceWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_windows', to='catalog.product')),
+            ],
+            options={
+                'verbose_name': 'Price Window',
+                'verbose_name_plural': 'Price Windows',
+                'ordering': ['starts_at'],
+                'indexes': [models.Index(fields=['product', 'starts_at', 'ends_at'], name='pricewindow_product_range_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_effective_prices, migrations.RunPython.noop),
+    ]
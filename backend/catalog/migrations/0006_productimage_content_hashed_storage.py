@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:44
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_productimage_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=core.storage.product_image_storage, upload_to='products/'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:54
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY keeps the table writable while the index builds
+    atomic = False
+
+    dependencies = [
+        ('catalog', '0006_productimage_content_hashed_storage'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['-created_at', '-id'], name='product_active_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['category', '-created_at', '-id'], name='product_active_category_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_new', True), ('status', 'active')), fields=['-created_at', '-id'], name='product_active_new_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('effective_price', 'price'), models.F('id'), condition=models.Q(('status', 'active')), name='product_active_price_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['category', 'updated_at', 'id'], name='product_active_stamp_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='productimage',
+            index=models.Index(fields=['product', 'ordering', 'created_at'], name='productimage_product_idx'),
+        ),
+    ]
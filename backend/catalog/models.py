@@ -1,6 +1,15 @@
+from collections import defaultdict
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce, Least, Now
+from django.utils import timezone
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator
+from core.storage import product_image_storage
+from .images import variant_urls, variants_match
+from .pricing import legacy_window, price_state
 
 
 class Category(models.Model):
@@ -28,6 +37,78 @@ class Category(models.Model):
         super().save(*args, **kwargs)
 
 
+class ProductQuerySet(models.QuerySet):
+    """QuerySet for Product."""
+    
+    def with_current_price(self):
+        """Annotate current_price from the precomputed effective price (no promo logic)."""
+        return self.annotate(current_price=Coalesce(
+            F('effective_price'), F('price'),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+    
+    def with_price_at(self, when):
+        """Annotate price_at: the effective price at `when`, computed in one query."""
+        window_price = Subquery(
+            PriceWindow.objects.filter(
+                product=OuterRef('pk'), starts_at__lte=when, ends_at__gt=when
+            ).order_by('price').values('price')[:1]
+        )
+        legacy_price = Case(
+            When(promo_price__gt=0, promo_start__lte=when, promo_end__gt=when, then=F('promo_price')),
+            default=None,
+        )
+        # LEAST() of two nullable prices that also works where LEAST(x, NULL) is NULL
+        lowest = Least(Coalesce(window_price, legacy_price), Coalesce(legacy_price, window_price))
+        return self.annotate(price_at=Coalesce(
+            lowest, F('price'), output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+    
+    def refresh_prices(self, now=None, batch_size=1000):
+        """
+        Recompute effective_price and price_valid_until from the price schedule.
+        Returns the number of products whose price state changed.
+        """
+        now = now or timezone.now()
+        product_ids = list(self.values_list('pk', flat=True))
+        changed = 0
+        for start in range(0, len(product_ids), batch_size):
+            batch_ids = product_ids[start:start + batch_size]
+            windows = defaultdict(list)
+            for product_id, price, starts_at, ends_at in PriceWindow.objects.filter(
+                product_id__in=batch_ids, ends_at__gt=now
+            ).values_list('product_id', 'price', 'starts_at', 'ends_at'):
+                windows[product_id].append((price, starts_at, ends_at))
+            
+            products = Product.objects.filter(pk__in=batch_ids).only(
+                'price', 'promo_price', 'promo_start', 'promo_end', 'effective_price', 'price_valid_until'
+            )
+            updated = []
+            for product in products:
+                if product.apply_price_state(windows[product.pk], now):
+                    product.updated_at = now
+                    updated.append(product)
+            Product.objects.bulk_update(updated, ['effective_price', 'price_valid_until', 'updated_at'])
+            changed += len(updated)
+        return changed
+    
+    def update_search_vector(self):
+        """Rebuild search_vector from name and description (PostgreSQL only)."""
+        from .search import product_search_vector
+        return self.update(search_vector=product_search_vector())
+    
+    def refresh_primary_images(self):
+        """Point each product at its first image by ordering and touch updated_at."""
+        first_image = ProductImage.objects.filter(
+            product=OuterRef('pk')
+        ).order_by('ordering', 'created_at', 'pk').values('pk')[:1]
+        return self.update(primary_image=Subquery(first_image), updated_at=Now())
+
+
+# Columns the precomputed effective price depends on
+PRICE_FIELDS = frozenset(['price', 'promo_price', 'promo_start', 'promo_end'])
+
+
 class Product(models.Model):
     """
     Product model.
@@ -49,13 +130,37 @@ class Product(models.Model):
     stock_quantity = models.IntegerField(default=0, validators=[MinValueValidator(0)])
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     is_new = models.BooleanField(default=False)
+    primary_image = models.ForeignKey(
+        'ProductImage', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='+'
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Precomputed from price, promo fields and price windows; see apply_price_schedule
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, editable=False)
+    price_valid_until = models.DateTimeField(null=True, editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
         ordering = ['-created_at']
+        # The public API only reads active products: partial indexes matching its orderings
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], condition=Q(status='active'),
+                         name='product_active_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], condition=Q(status='active'),
+                         name='product_active_category_idx'),
+            models.Index(fields=['-created_at', '-id'], condition=Q(status='active', is_new=True),
+                         name='product_active_new_idx'),
+            models.Index(Coalesce('effective_price', 'price'), 'id', condition=Q(status='active'),
+                         name='product_active_price_idx'),
+            # Covers the ETag aggregate (count, latest updated_at) with an index-only scan
+            models.Index(fields=['category', 'updated_at', 'id'], condition=Q(status='active'),
+                         name='product_active_stamp_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -63,18 +168,46 @@ class Product(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        update_fields = kwargs.get('update_fields')
+        # Saves of other columns (stock, primary image...) leave the price state alone
+        if update_fields is None or not PRICE_FIELDS.isdisjoint(update_fields):
+            now = timezone.now()
+            windows = []
+            if self.pk:
+                windows = list(self.price_windows.filter(ends_at__gt=now).values_list('price', 'starts_at', 'ends_at'))
+            self.apply_price_state(windows, now)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'effective_price', 'price_valid_until'}
         super().save(*args, **kwargs)
     
+    def apply_price_state(self, windows, now):
+        """
+        Set effective_price/price_valid_until from (price, start, end) windows
+        plus the promo fields. Returns True if either value changed.
+        """
+        legacy = legacy_window(self)
+        if legacy:
+            windows = [*windows, legacy]
+        state = price_state(self.price, windows, now)
+        if state == (self.effective_price, self.price_valid_until):
+            return False
+        self.effective_price, self.price_valid_until = state
+        return True
+    
     @property
     def current_price(self):
-        """Returns the current price (promo if active, otherwise regular price)."""
-        from django.utils import timezone
-        now = timezone.now()
-        if self.promo_price and self.promo_start and self.promo_end:
-            if self.promo_start <= now <= self.promo_end:
-                return self.promo_price
+        """Returns the current price (precomputed from promo fields and price windows)."""
+        if '_current_price' in self.__dict__:
+            return self._current_price
+        if self.effective_price is not None:
+            return self.effective_price
         return self.price
     
+    @current_price.setter
+    def current_price(self, value):
+        """Store the value annotated by ProductQuerySet.with_current_price()."""
+        self._current_price = value
+    
     @property
     def is_in_stock(self):
         """Returns True if product is in stock."""
@@ -83,9 +216,14 @@ class Product(models.Model):
     @property
     def stock_status(self):
         """Returns stock status string."""
-        if self.stock_quantity == 0:
+        return self.stock_status_for(self.stock_quantity)
+    
+    @staticmethod
+    def stock_status_for(stock_quantity):
+        """Stock status string for a stock quantity."""
+        if stock_quantity == 0:
             return 'out-of-stock'
-        elif self.stock_quantity < 10:
+        elif stock_quantity < 10:
             return 'limited'
         return 'in-stock'
 
@@ -95,14 +233,59 @@ class ProductImage(models.Model):
     Product image model.
     """
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='products/')
+    image = models.ImageField(upload_to='products/', storage=product_image_storage)
     ordering = models.IntegerField(default=0)
+    
+    # Resized copies ({format: {width: storage name}}), rendered in the background
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         verbose_name = 'Product Image'
         verbose_name_plural = 'Product Images'
         ordering = ['ordering', 'created_at']
+        indexes = [
+            # Gallery order, also used to pick the primary image
+            models.Index(fields=['product', 'ordering', 'created_at'], name='productimage_product_idx'),
+        ]
     
     def __str__(self):
         return f"{self.product.name} - Image {self.ordering}"
+    
+    def save(self, *args, **kwargs):
+        """Drop variants of a replaced image; new ones are rendered after commit."""
+        if self.variants and not variants_match(self.image.name, self.variants):
+            self.variants = {}
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'variants'}
+        super().save(*args, **kwargs)
+    
+    def variant_urls(self):
+        """Return {format: [(width, url), ...]} ordered by width."""
+        return variant_urls(self.variants, self.image.storage)
+
+
+class PriceWindow(models.Model):
+    """
+    Scheduled price for a product between starts_at (inclusive) and ends_at (exclusive).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_windows')
+    price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Price Window'
+        verbose_name_plural = 'Price Windows'
+        ordering = ['starts_at']
+        indexes = [
+            models.Index(fields=['product', 'starts_at', 'ends_at'], name='pricewindow_product_range_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} - €{self.price} ({self.starts_at:%Y-%m-%d %H:%M} → {self.ends_at:%Y-%m-%d %H:%M})"
+    
+    def clean(self):
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': 'End must be after start.'})
@@ -0,0 +1,31 @@
+"""
+Price schedule helpers.
+A product's price at time T is the lowest price among the windows open at T
+(start <= T < end), or its base price when none is open. The legacy
+promo_price/promo_start/promo_end fields count as one more window.
+"""
+
+
+def legacy_window(product):
+    """The product's promo fields as a (price, start, end) window, or None."""
+    if product.promo_price and product.promo_start and product.promo_end:
+        if product.promo_start < product.promo_end:
+            return (product.promo_price, product.promo_start, product.promo_end)
+    return None
+
+
+def price_at(base_price, windows, when):
+    """Effective price at `when` for base_price and (price, start, end) windows."""
+    open_prices = [price for price, start, end in windows if start <= when < end]
+    return min(open_prices) if open_prices else base_price
+
+
+def next_price_change(windows, when):
+    """First window boundary after `when`, or None if the price never changes again."""
+    boundaries = [moment for _, start, end in windows for moment in (start, end) if moment > when]
+    return min(boundaries, default=None)
+
+
+def price_state(base_price, windows, when):
+    """Return (effective price, valid until) at `when`."""
+    return price_at(base_price, windows, when), next_price_change(windows, when)
@@ -0,0 +1,60 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+
+def product_search_vector():
+    """Weighted tsvector over name (A) and description (B) for every search config."""
+    vector = None
+    for config in settings.CATALOG_SEARCH_CONFIGS:
+        config_vector = (
+            SearchVector('name', weight='A', config=config)
+            + SearchVector('description', weight='B', config=config)
+        )
+        vector = config_vector if vector is None else vector + config_vector
+    return vector
+
+
+def product_search_query(text):
+    """
+    Build a tsquery matching all words of text, the last one as a prefix.
+    Returns None if text has no searchable words.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    raw = ' & '.join(f"'{word}'" for word in words) + ':*'
+    query = None
+    for config in settings.CATALOG_SEARCH_CONFIGS:
+        config_query = SearchQuery(raw, search_type='raw', config=config)
+        query = config_query if query is None else query | config_query
+    return query
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Full-text search on Product.search_vector, ranked by relevance.
+    Falls back to DRF's ILIKE search on databases other than PostgreSQL.
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        if connections[queryset.db].vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+        
+        text = request.query_params.get(self.search_param, '')
+        query = product_search_query(text.replace('\x00', ''))
+        if query is None:
+            return queryset
+        
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        )
+        # Rank by relevance unless the client asked for an explicit ordering
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('-search_rank', *getattr(view, 'ordering', None) or [])
+        return queryset
@@ -1,16 +1,54 @@
 from rest_framework import serializers
+from core.profiling import ProfiledSerializerMixin, timer
+from .images import variant_urls
 from .models import Category, Product, ProductImage
 
 
+def image_srcset(image, request=None):
+    """Return {format: srcset string} for the rendered variants of a ProductImage."""
+    return srcset_from_urls(image.variant_urls(), request.build_absolute_uri if request else None)
+
+
+def srcset_from_urls(urls, absolute_url=None):
+    """Return {format: srcset string} for {format: [(width, url), ...]}, made absolute with `absolute_url`."""
+    srcset = {}
+    for fmt, variants in urls.items():
+        srcset[fmt] = ', '.join(
+            f'{absolute_url(url) if absolute_url else url} {width}w' for width, url in variants
+        )
+    return srcset
+
+
+def absolute_url_builder(request):
+    """
+    request.build_absolute_uri for many URLs: plain root-relative paths (all
+    storage URLs) are joined to the scheme and host computed once, anything
+    else goes through build_absolute_uri.
+    """
+    origin = request.build_absolute_uri('/')[:-1]
+    
+    def absolute_url(url):
+        if url.startswith('/') and not url.startswith('//') and '/.' not in url:
+            return origin + url
+        return request.build_absolute_uri(url)
+    
+    return absolute_url
+
+
 class ProductImageSerializer(serializers.ModelSerializer):
     """Serializer for ProductImage."""
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'ordering']
+        fields = ['id', 'image', 'srcset', 'ordering']
+    
+    def get_srcset(self, obj):
+        """Resized WebP/JPEG variants ({} until they are rendered)."""
+        return image_srcset(obj, self.context.get('request'))
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """Serializer for Category."""
     
     class Meta:
@@ -18,7 +56,7 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'is_active', 'ordering']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """Serializer for Product (read-only for public API)."""
     category = CategorySerializer(read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
@@ -37,26 +75,86 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'slug', 'created_at', 'updated_at']
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """Lightweight serializer for product lists."""
     category = serializers.StringRelatedField()
     current_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     stock_status = serializers.CharField(read_only=True)
     primary_image = serializers.SerializerMethodField()
+    primary_image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'slug', 'category', 'current_price',
-            'stock_status', 'is_new', 'primary_image'
+            'stock_status', 'is_new', 'primary_image', 'primary_image_srcset'
         ]
     
     def get_primary_image(self, obj):
-        """Get the first image ordered by ordering field."""
-        first_image = obj.images.order_by('ordering').first()
-        if first_image:
+        """Get the precomputed primary image (first image by ordering)."""
+        primary_image = obj.primary_image
+        if primary_image:
             request = self.context.get('request')
             if request:
-                return request.build_absolute_uri(first_image.image.url)
-            return first_image.image.url
+                return request.build_absolute_uri(primary_image.image.url)
+            return primary_image.image.url
         return None
+    
+    def get_primary_image_srcset(self, obj):
+        """Resized variants of the primary image, for thumbnails in grid views."""
+        if obj.primary_image:
+            return image_srcset(obj.primary_image, self.context.get('request'))
+        return None
+
+
+class ProductListRowSerializer:
+    """
+    Fast path for ProductListSerializer(many=True).
+    Works on the plain rows of `get_rows(queryset)` (only the listed columns,
+    no Product or ProductImage instances) and returns the same data.
+    """
+    price_field = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    
+    def __init__(self, instance=None, many=True, context=None):
+        self.instance = instance
+        self.context = context or {}
+    
+    @staticmethod
+    def get_rows(queryset):
+        """values() rows of a queryset annotated with current_price."""
+        return queryset.values(
+            'id', 'name', 'slug', 'category__name', 'current_price', 'stock_quantity', 'is_new',
+            'primary_image', 'primary_image__image', 'primary_image__variants',
+        )
+    
+    @property
+    def data(self):
+        with timer('serialize'):
+            return self.to_representation(self.instance)
+    
+    def to_representation(self, rows):
+        request = self.context.get('request')
+        absolute_url = absolute_url_builder(request) if request else None
+        price = self.price_field.to_representation
+        stock_status = Product.stock_status_for
+        storage = ProductImage._meta.get_field('image').storage
+        data = []
+        for row in rows:
+            image = srcset = None
+            if row['primary_image'] is not None:
+                image = storage.url(row['primary_image__image'])
+                if absolute_url:
+                    image = absolute_url(image)
+                srcset = srcset_from_urls(variant_urls(row['primary_image__variants'], storage), absolute_url)
+            data.append({
+                'id': row['id'],
+                'name': row['name'],
+                'slug': row['slug'],
+                'category': row['category__name'],
+                'current_price': price(row['current_price']),
+                'stock_status': stock_status(row['stock_quantity']),
+                'is_new': row['is_new'],
+                'primary_image': image,
+                'primary_image_srcset': srcset,
+            })
+        return data
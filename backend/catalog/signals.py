@@ -0,0 +1,60 @@
+from functools import partial
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .cache import bump_catalog_version
+from .images import schedule_variants
+from .models import Category, PriceWindow, Product, ProductImage
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, using, update_fields=None, **kwargs):
+    """Keep the full-text search vector in sync with name and description."""
+    if update_fields is not None and not {'name', 'description'} & update_fields:
+        return
+    if connections[using].vendor == 'postgresql':
+        Product.objects.using(using).filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=ProductImage)
+def product_image_saved(sender, instance, **kwargs):
+    """Refresh the primary image of the image's product (and of its previous product)."""
+    Product.objects.filter(
+        Q(pk=instance.product_id) | Q(primary_image=instance)
+    ).refresh_primary_images()
+
+
+@receiver(post_save, sender=ProductImage)
+def product_image_variants(sender, instance, using, **kwargs):
+    """Render resized variants in the background once the image is committed."""
+    if instance.image and not instance.variants:
+        transaction.on_commit(
+            partial(schedule_variants, instance.pk, instance.image.name), using=using
+        )
+
+
+@receiver(post_delete, sender=ProductImage)
+def product_image_deleted(sender, instance, **kwargs):
+    """Promote the next image when the primary image is deleted."""
+    Product.objects.filter(pk=instance.product_id).refresh_primary_images()
+
+
+@receiver(post_save, sender=PriceWindow)
+@receiver(post_delete, sender=PriceWindow)
+def price_window_changed(sender, instance, **kwargs):
+    """Recompute the product's precomputed price state."""
+    Product.objects.filter(pk=instance.product_id).refresh_prices()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=PriceWindow)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=PriceWindow)
+def catalog_changed(sender, using, **kwargs):
+    """Invalidate cached catalog responses once the change is committed."""
+    transaction.on_commit(bump_catalog_version, using=using)
@@ -0,0 +1,534 @@
+import tempfile
+from concurrent.futures import Executor, Future
+from decimal import Decimal
+from io import BytesIO, StringIO
+from itertools import count
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .bulk import CatalogImporter, RowWriter, SlugAllocator, export_rows, read_rows
+from .cache import get_catalog_version
+from .images import render_variants, store_variants, variant_dir, variants_match
+from .models import Category, Product, ProductImage
+from .search import ProductSearchFilter
+
+
+product_numbers = count()
+
+
+def create_products(number, category):
+    """Active products with two images each (the first becomes the primary image)."""
+    products = []
+    for _ in range(number):
+        index = next(product_numbers)
+        product = Product.objects.create(
+            name=f'Product {index}', category=category, price=Decimal('10.00'),
+            stock_quantity=index, status='active',
+        )
+        for ordering in range(2):
+            ProductImage.objects.create(
+                product=product, image=f'products/{product.pk}-{ordering}.jpg', ordering=ordering,
+            )
+        products.append(product)
+    return products
+
+
+class ProductListQueryCountTests(TestCase):
+    """The product list runs a fixed number of queries whatever the page size."""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Toys')
+    
+    def count_queries(self, url):
+        """Queries run by an uncached GET of url."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+    
+    def assert_constant_queries(self, url):
+        """5 products and a full page of 20 (out of 30) take the same queries."""
+        create_products(5, self.category)
+        small = self.count_queries(url)
+        create_products(25, self.category)
+        cache.clear()
+        with self.assertNumQueries(small):
+            response = self.client.get(url)
+        results = response.json()['results']
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(item['primary_image'] for item in results))
+    
+    def test_page_number_list(self):
+        self.assert_constant_queries('/api/catalog/products/')
+    
+    def test_cursor_list(self):
+        self.assert_constant_queries('/api/catalog/products/?pagination=cursor')
+
+
+class ProductOrderingTests(TestCase):
+    """Paging through a sort with equal values returns every product exactly once."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        # All at the same price; names differ
+        cls.product_ids = {product.pk for product in create_products(45, Category.objects.create(name='Dice'))}
+    
+    def collect(self, url, params):
+        """Ids of every page of url, following the next links."""
+        client = APIClient()
+        ids = []
+        response = client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [item['id'] for item in response.json()['results']]
+            if not response.json()['next']:
+                return ids
+            cache.clear()
+            response = client.get(response.json()['next'])
+    
+    def test_pages_have_no_duplicates_or_gaps(self):
+        for ordering in ('current_price', '-current_price', 'price', '-created_at'):
+            for pagination in ({}, {'pagination': 'cursor'}):
+                with self.subTest(ordering=ordering, **pagination):
+                    ids = self.collect('/api/catalog/products/', {'ordering': ordering, **pagination})
+                    self.assertEqual(len(ids), len(self.product_ids))
+                    self.assertEqual(set(ids), self.product_ids)
+
+
+class ConditionalGetTests(TestCase):
+    """Catalog revalidation sees products disappearing from a list."""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.products = create_products(3, Category.objects.create(name='Games'))
+    
+    def test_hidden_product_changes_list_etag(self):
+        response = self.client.get('/api/catalog/products/')
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/catalog/products/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        
+        Product.objects.filter(pk=self.products[0].pk).update(status='hidden')
+        response = self.client.get('/api/catalog/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        # If-Modified-Since alone never yields a 304 for catalog lists
+        response = self.client.get('/api/catalog/products/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+    
+    def test_weak_etag_revalidation(self):
+        for url in ('/api/catalog/products/', f'/api/catalog/products/{self.products[0].pk}/'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertTrue(etag.startswith('W/"'))
+                # Same validator whatever the coding
+                self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')['ETag'], etag)
+                # Revalidation is one aggregate query, no serialization
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                # If-None-Match compares weakly: the strong form and lists match too
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag[2:]).status_code, 304)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=f'W/"other", {etag}').status_code, 304)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='W/"other"').status_code, 200)
+
+
+class CatalogCacheTests(TestCase):
+    """Catalog writes move the catalog version, which retires every cached response."""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Puzzles')
+        self.product, self.other = create_products(2, self.category)
+    
+    def names(self):
+        """Product names in the list and in the first product's detail response."""
+        listed = {item['id']: item['name'] for item in self.client.get('/api/catalog/products/').json()['results']}
+        detail = self.client.get(f'/api/catalog/products/{self.product.pk}/').json()['name']
+        return listed[self.product.pk], detail
+    
+    def test_writes_bump_version(self):
+        writes = [
+            lambda: self.product.save(),
+            lambda: self.category.save(),
+            lambda: self.product.images.last().delete(),
+            lambda: self.other.delete(),
+        ]
+        for write in writes:
+            version = get_catalog_version()
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertNotEqual(get_catalog_version(), version)
+    
+    def test_write_invalidates_cached_list_and_detail(self):
+        original = self.product.name
+        self.assertEqual(self.names(), (original, original))
+        # Cached: a change that neither signals nor moves the ETag is not seen yet
+        Product.objects.filter(pk=self.product.pk).update(name='Renamed')
+        with self.assertNumQueries(2):
+            self.assertEqual(self.names(), (original, original))
+        
+        # Saving another product leaves this product's ETag alone: the new version retires its detail
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.save()
+        self.assertEqual(self.names(), ('Renamed', 'Renamed'))
+
+
+class ProductSaveTests(TestCase):
+    """Product.save only reads price windows when a price column is saved."""
+    
+    def setUp(self):
+        self.product = Product.objects.create(name='Yo-yo', price=Decimal('4.00'), stock_quantity=3, status='active')
+    
+    def window_queries(self, **save_kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            self.product.save(**save_kwargs)
+        return [query for query in queries if 'catalog_pricewindow' in query['sql']]
+    
+    def test_save_of_other_columns_skips_price_windows(self):
+        self.product.stock_quantity = 2
+        self.assertEqual(self.window_queries(update_fields=['stock_quantity', 'updated_at']), [])
+    
+    def test_price_save_updates_effective_price(self):
+        self.product.price = Decimal('3.00')
+        self.assertEqual(len(self.window_queries(update_fields=['price', 'updated_at'])), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.effective_price, Decimal('3.00'))
+    
+    def test_full_save_updates_effective_price(self):
+        self.product.price = Decimal('2.00')
+        self.assertEqual(len(self.window_queries()), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.effective_price, Decimal('2.00'))
+
+
+class ImageVariantTests(TestCase):
+    """Variants are stored next to the original, under names that change with their content."""
+    
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name, PRODUCT_IMAGE_WIDTHS=[64], PRODUCT_IMAGE_FORMATS=['webp', 'jpeg'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        buffer = BytesIO()
+        Image.linear_gradient('L').resize((128, 96)).save(buffer, 'PNG')
+        product = Product.objects.create(name='Puzzle box', price=Decimal('8.00'), status='active')
+        self.image = ProductImage.objects.create(
+            product=product, image=SimpleUploadedFile('Box.PNG', buffer.getvalue(), content_type='image/png'),
+        )
+        self.storage = self.image.image.storage
+    
+    def test_variants_use_image_storage(self):
+        name = self.image.image.name
+        variants = render_variants(name)
+        self.assertTrue(variants_match(name, variants))
+        for fmt, extension in (('webp', '.webp'), ('jpeg', '.jpg')):
+            variant = variants[fmt]['64']
+            self.assertTrue(variant.startswith(variant_dir(name) + '/'))
+            self.assertTrue(variant.endswith(extension))
+            self.assertTrue(self.storage.exists(variant))
+    
+    def test_image_narrower_than_every_width(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (40, 30), (255, 0, 0, 128)).save(buffer, 'PNG')
+        name = self.storage.save('products/small.png', SimpleUploadedFile('small.png', buffer.getvalue()))
+        with override_settings(PRODUCT_IMAGE_WIDTHS=[64, 128]):
+            variants = render_variants(name)
+        self.assertEqual({fmt: list(widths) for fmt, widths in variants.items()}, {'webp': ['40'], 'jpeg': ['40']})
+        with self.storage.open(variants['jpeg']['40']) as file:
+            jpeg = Image.open(file)
+            # No alpha channel in JPEG: flattened to RGB
+            self.assertEqual((jpeg.format, jpeg.mode, jpeg.size), ('JPEG', 'RGB', (40, 30)))
+        # Variants of another image, or none, do not match
+        self.assertFalse(variants_match(self.image.image.name, variants))
+        self.assertFalse(variants_match(name, {}))
+    
+    def test_variant_names_change_with_rendering_settings(self):
+        name = self.image.image.name
+        before = render_variants(name)
+        self.assertEqual(render_variants(name), before)
+        with override_settings(PRODUCT_IMAGE_QUALITY=20):
+            after = render_variants(name)
+        self.assertNotEqual(after['webp']['64'], before['webp']['64'])
+        self.assertNotEqual(after['jpeg']['64'], before['jpeg']['64'])
+        self.assertTrue(variants_match(name, after))
+
+
+class InlineExecutor(Executor):
+    """Runs submitted calls in the calling thread: at once, or on run_pending() when deferred."""
+    
+    def __init__(self, deferred=False):
+        self.deferred = deferred
+        self.pending = []
+    
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self.pending.append((future, fn, args, kwargs))
+        if not self.deferred:
+            self.run_pending()
+        return future
+    
+    def run_pending(self, limit=None):
+        """Run the oldest `limit` pending calls (all by default)."""
+        count = len(self.pending) if limit is None else limit
+        pending, self.pending = self.pending[:count], self.pending[count:]
+        for future, fn, args, kwargs in pending:
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as exc:
+                future.set_exception(exc)
+
+
+class ImageVariantStoreTests(TransactionTestCase):
+    """
+    Variants rendered after commit are stored on the image they were rendered
+    from, never on the image that replaced it. Rendering and storing run
+    inline; the store closes its connection, hence a TransactionTestCase.
+    """
+    
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name, PRODUCT_IMAGE_WIDTHS=[32], PRODUCT_IMAGE_FORMATS=['webp'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        self.renderer = InlineExecutor(deferred=True)
+        for target, executor in (('get_executor', self.renderer), ('get_store_executor', InlineExecutor())):
+            patcher = mock.patch(f'catalog.images.{target}', return_value=executor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.product = Product.objects.create(name='Lantern', price=Decimal('12.00'), status='active')
+    
+    def upload(self, color):
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), color).save(buffer, 'PNG')
+        return SimpleUploadedFile(f'{color}.png', buffer.getvalue(), content_type='image/png')
+    
+    def test_variants_are_stored_after_commit(self):
+        image = ProductImage.objects.create(product=self.product, image=self.upload('red'))
+        updated_at = Product.objects.get(pk=self.product.pk).updated_at
+        version = get_catalog_version()
+        self.renderer.run_pending()
+        
+        image.refresh_from_db()
+        self.assertEqual(list(image.variants['webp']), ['32'])
+        self.assertTrue(variants_match(image.image.name, image.variants))
+        self.assertGreater(Product.objects.get(pk=self.product.pk).updated_at, updated_at)
+        self.assertNotEqual(get_catalog_version(), version)
+    
+    def test_variants_of_replaced_image_are_dropped(self):
+        image = ProductImage.objects.create(product=self.product, image=self.upload('red'))
+        first = image.image.name
+        image.image = self.upload('blue')
+        image.save()
+        second = image.image.name
+        
+        # The render of the first image finishes after the replacement: nothing is stored
+        version = get_catalog_version()
+        self.renderer.run_pending(1)
+        image.refresh_from_db()
+        self.assertEqual(image.variants, {})
+        self.assertEqual(get_catalog_version(), version)
+        self.assertFalse(store_variants(image.pk, first, {'webp': {'32': f'{variant_dir(first)}/32w.webp'}}))
+        
+        self.renderer.run_pending()
+        image.refresh_from_db()
+        self.assertTrue(variants_match(second, image.variants))
+        self.assertNotEqual(get_catalog_version(), version)
+    
+    def test_render_failure_is_logged(self):
+        image = ProductImage.objects.create(product=self.product, image=self.upload('red'))
+        image.image.storage.delete(image.image.name)
+        with self.assertLogs('catalog.images', 'ERROR'):
+            self.renderer.run_pending()
+        image.refresh_from_db()
+        self.assertEqual(image.variants, {})
+
+
+class CatalogImportTests(TestCase):
+    """Rows the database would reject are reported with their row number and skipped."""
+    
+    def run_import(self, text, fmt='csv', batch_size=100):
+        errors = []
+        importer = CatalogImporter(batch_size=batch_size, on_error=lambda line, message: errors.append(line))
+        importer.run(read_rows(StringIO(text), fmt))
+        return importer, errors
+    
+    def test_rows_over_field_limits(self):
+        rows = [
+            'slug,name,category,price,stock_quantity',
+            'first,First,Toys,1.00,1',
+            f'long-name,{"n" * 201},Toys,1.00,1',
+            f'{"s" * 201},Long slug,Toys,1.00,1',
+            f'long-category,Long category,{"c" * 201},1.00,1',
+            'much-stock,Much stock,Toys,1.00,3000000000',
+            'dear,Dear,Toys,123456789.00,1',
+            'dearer,Dearer,Toys,1e40,1',
+            'last,Last,Toys,1.00,1',
+        ]
+        importer, errors = self.run_import('\n'.join(rows) + '\n')
+        self.assertEqual(errors, [2, 3, 4, 5, 6, 7])
+        self.assertEqual((importer.rows, importer.created, importer.skipped), (8, 2, 6))
+        self.assertEqual(set(Product.objects.values_list('slug', flat=True)), {'first', 'last'})
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ['Toys'])
+    
+    def test_lines_that_are_not_json_objects(self):
+        lines = [
+            '{"name": "First", "price": "1.00"}',
+            '{"name": "Broken", ',
+            '[1, 2]',
+            '{"name": "Last", "price": "2.00"}',
+        ]
+        importer, errors = self.run_import('\n'.join(lines) + '\n', fmt='jsonl')
+        self.assertEqual(errors, [2, 3])
+        self.assertEqual((importer.rows, importer.created, importer.skipped), (4, 2, 2))
+    
+    def test_repeated_slug_in_batch(self):
+        rows = ['slug,name,price', 'kite,Red kite,1.00', 'kite,Blue kite,2.00', 'ball,Ball,3.00']
+        importer, errors = self.run_import('\n'.join(rows) + '\n')
+        self.assertEqual(errors, [1])
+        self.assertEqual((importer.rows, importer.created, importer.skipped), (3, 2, 1))
+        self.assertEqual(Product.objects.get(slug='kite').name, 'Blue kite')
+
+
+class SlugAllocatorTests(TestCase):
+    """Generated slugs avoid existing and reserved slugs and stay within max_length."""
+    
+    def setUp(self):
+        for slug in ('kite', 'kite-3'):
+            Product.objects.create(name='Kite', slug=slug, price=Decimal('1.00'))
+    
+    def test_suffixes_count_up(self):
+        allocator = SlugAllocator(Product)
+        slugs = allocator.allocate(['Kite', 'Kite', 'Yo-yo', 'Ball'], fallback='product', reserved=['yo-yo'])
+        self.assertEqual(slugs, ['kite-4', 'kite-5', 'yo-yo-2', 'ball'])
+        # Bases seen before are counted up in memory: one query checks the result
+        with self.assertNumQueries(1):
+            self.assertEqual(allocator.allocate(['Kite', 'Ball']), ['kite-6', 'ball-2'])
+    
+    def test_slug_fits_max_length(self):
+        allocator = SlugAllocator(Product)
+        Product.objects.create(name='Long', slug=allocator.allocate(['x' * 300])[0], price=Decimal('1.00'))
+        slug = allocator.allocate(['x' * 300])[0]
+        self.assertLessEqual(len(slug), 200)
+        self.assertTrue(slug.endswith('-2'))
+        self.assertEqual(allocator.allocate(['!!!'], fallback='product'), ['product'])
+
+
+class CatalogRoundTripTests(TestCase):
+    """Importing an export changes nothing."""
+    
+    def setUp(self):
+        products = create_products(3, Category.objects.create(name='Kites'))
+        Product.objects.filter(pk=products[0].pk).update(
+            description='With a tail, "quoted", and a comma.', promo_price=Decimal('7.50'), is_new=True,
+        )
+        Product.objects.create(name='Loose', price=Decimal('2.00'), status='draft')
+    
+    def test_round_trip(self):
+        before = list(export_rows(Product.objects.all()))
+        for fmt in ('csv', 'jsonl'):
+            with self.subTest(fmt=fmt):
+                file = StringIO()
+                writer = RowWriter(file, fmt)
+                for row in export_rows(Product.objects.all(), batch_size=2):
+                    writer.write(row)
+                file.seek(0)
+                errors = []
+                importer = CatalogImporter(on_error=lambda line, message: errors.append(message))
+                importer.run(read_rows(file, fmt))
+                self.assertEqual(errors, [])
+                self.assertEqual(
+                    (importer.rows, importer.unchanged, importer.created, importer.updated), (4, 4, 0, 0)
+                )
+                self.assertEqual(list(export_rows(Product.objects.all())), before)
+
+
+class ProductSearchTests(TestCase):
+    """Search matches every word, the last one as a prefix, best matches first."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.red_kite = Product.objects.create(
+            name='Red kite', description='Flies on windy days.', price=Decimal('9.00'), status='active',
+        )
+        cls.kite_string = Product.objects.create(
+            name='Kite string', description='Fifty metres of line.', price=Decimal('3.00'), status='active',
+        )
+        cls.ball = Product.objects.create(
+            name='Blue ball', description='Bounces high. Goes well with a kite.', price=Decimal('2.00'),
+            status='active',
+        )
+    
+    def setUp(self):
+        cache.clear()
+    
+    def search(self, text):
+        response = APIClient().get('/api/catalog/products/', {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+    
+    def search_filter(self, text):
+        view = mock.Mock(search_fields=['name', 'description'], ordering=['id'])
+        request = Request(APIRequestFactory().get('/', {'search': text}))
+        return ProductSearchFilter().filter_queryset(request, Product.objects.order_by('id'), view)
+    
+    @skipUnless(connection.vendor == 'postgresql', 'Full-text search needs PostgreSQL.')
+    def test_prefix_and_multiple_words(self):
+        self.assertEqual(set(self.search('kit')), {self.red_kite.pk, self.kite_string.pk, self.ball.pk})
+        self.assertEqual(self.search('bou'), [self.ball.pk])
+        self.assertEqual(self.search('red kite'), [self.red_kite.pk])
+        self.assertEqual(self.search('kite str'), [self.kite_string.pk])
+        self.assertEqual(self.search('red ball'), [])
+    
+    @skipUnless(connection.vendor == 'postgresql', 'Full-text search needs PostgreSQL.')
+    def test_name_matches_rank_first(self):
+        ids = self.search('kite')
+        self.assertEqual(ids[-1], self.ball.pk)
+        self.assertEqual(set(ids[:2]), {self.red_kite.pk, self.kite_string.pk})
+        # An explicit ordering replaces the ranking
+        response = APIClient().get('/api/catalog/products/', {'search': 'kite', 'ordering': 'price'})
+        self.assertEqual(
+            [item['id'] for item in response.json()['results']],
+            [self.ball.pk, self.kite_string.pk, self.red_kite.pk],
+        )
+    
+    @skipUnless(connection.vendor == 'postgresql', 'Full-text search needs PostgreSQL.')
+    def test_search_vector_follows_name_and_description(self):
+        self.red_kite.stock_quantity = 5
+        with CaptureQueriesContext(connection) as queries:
+            self.red_kite.save(update_fields=['stock_quantity'])
+        self.assertFalse([query for query in queries if 'search_vector' in query['sql']])
+        self.red_kite.name = 'Green kite'
+        self.red_kite.save(update_fields=['name'])
+        self.assertEqual(self.search('green'), [self.red_kite.pk])
+    
+    def test_fallback_on_other_databases(self):
+        with mock.patch.object(connection, 'vendor', 'sqlite'):
+            queryset = self.search_filter('kite str')
+            self.assertNotIn('search_rank', queryset.query.annotations)
+            self.assertIn('LIKE', str(queryset.query))
+            self.assertEqual(list(queryset), [self.kite_string])
+            self.assertEqual(list(self.search_filter('kite')), [self.red_kite, self.kite_string, self.ball])
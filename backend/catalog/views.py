@@ -1,36 +1,74 @@
-from rest_framework import viewsets, filters
+from rest_framework import viewsets
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer
 from django_filters.rest_framework import DjangoFilterBackend
+from core.pagination import OptInCursorPagination
+from core.renderers import FastJSONRenderer
+from .cache import CachedResponseMixin, ConditionalGetMixin
+from .filters import ProductFilter, StableOrderingFilter
 from .models import Category, Product
-from .serializers import CategorySerializer, ProductSerializer, ProductListSerializer
+from .search import ProductSearchFilter
+from .serializers import CategorySerializer, ProductSerializer, ProductListRowSerializer, ProductListSerializer
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Category - read-only public API.
     """
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
-    filter_backends = [filters.OrderingFilter]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    filter_backends = [StableOrderingFilter]
     ordering_fields = ['ordering', 'name']
     ordering = ['ordering', 'name']
 
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Product - read-only public API.
     """
-    queryset = Product.objects.filter(status='active').select_related('category').prefetch_related('images')
+    queryset = (
+        Product.objects.filter(status='active')
+        .with_current_price()
+        .select_related('category', 'primary_image')
+        .defer('search_vector')
+    )
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'status', 'is_new']
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    filter_backends = [DjangoFilterBackend, StableOrderingFilter, ProductSearchFilter]
+    filterset_class = ProductFilter
     search_fields = ['name', 'description']
-    ordering_fields = ['created_at', 'price', 'name']
-    ordering = ['-created_at']
+    ordering_fields = ['created_at', 'price', 'current_price', 'name']
+    ordering = ['-created_at', '-id']
+    pagination_class = OptInCursorPagination
+    conditional_timestamp_fields = ['updated_at', 'category__updated_at']
+    
+    def get_queryset(self):
+        """Only prefetch the full image gallery for detail views."""
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            queryset = queryset.prefetch_related('images')
+        return queryset
     
     def get_serializer_class(self):
         """Use lightweight serializer for list, full serializer for detail."""
         if self.action == 'list':
-            return ProductListSerializer
+            return ProductListRowSerializer if self.serializes_rows() else ProductListSerializer
         return ProductSerializer
+    
+    def serializes_rows(self):
+        """
+        Page-number list pages are built from values() rows (ProductListRowSerializer);
+        cursor pages need instances to compute their cursors.
+        """
+        return self.action == 'list' and not self.paginator.wants_cursor(self.request)
+    
+    def get_list_queryset(self, queryset):
+        """The filtered queryset the list action paginates and serializes."""
+        if self.serializes_rows():
+            return ProductListRowSerializer.get_rows(queryset)
+        return queryset
+    
+    def paginate_queryset(self, queryset):
+        return super().paginate_queryset(self.get_list_queryset(queryset))
@@ -1,10 +1,24 @@
 """
 ASGI config for ecommerce project.
+Requests are resolved against config.urls_asgi, which serves the public
+catalog from async views.
 """
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+
+class CatalogASGIRequest(ASGIRequest):
+    urlconf = 'config.urls_asgi'
+
+
+class CatalogASGIHandler(ASGIHandler):
+    request_class = CatalogASGIRequest
+
+
+# Same as django.core.asgi.get_asgi_application(), with the request class above
+django.setup(set_prefix=False)
+application = CatalogASGIHandler()
@@ -3,6 +3,7 @@ Django settings for ecommerce project.
 """
 import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -26,20 +27,26 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party
     'rest_framework',
+    'rest_framework.authtoken',  # API tokens (TokenAuthentication), e.g. for metrics scrapers
     'corsheaders',
     'django_filters',
     
     # Local apps
+    'core',
     'accounts',
     'catalog',
     'orders',
     'discounts',
+    'reports',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -82,6 +89,16 @@ DATABASES = {
     }
 }
 
+# Cache
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared cache
+# (e.g. django.core.cache.backends.redis.RedisCache) when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -115,6 +132,11 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Serve MEDIA_ROOT from Django (core.views.serve_media); leave off when a web server or CDN does
+SERVE_MEDIA = os.getenv('SERVE_MEDIA', str(DEBUG)) == 'True'
+# Uploaded product images are named by content hash, so they can be cached forever
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', str(365 * 24 * 60 * 60)))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -129,6 +151,11 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # Rates of views with a throttle_scope (per user, or per IP for guests)
+    'DEFAULT_THROTTLE_RATES': {
+        'reservations': os.getenv('STOCK_RESERVATION_THROTTLE_RATE', '20/min'),
+        'coupons': os.getenv('COUPON_VALIDATE_THROTTLE_RATE', '30/min'),
+    },
 }
 
 # CORS settings
@@ -140,3 +167,64 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+
+# Let browser clients send Idempotency-Key on checkout and X-Profile
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'x-profile')
+# Let browser clients read profiling timings
+CORS_EXPOSE_HEADERS = ['Server-Timing']
+
+# Catalog response cache
+# Seconds a cached catalog API response is kept; saves in the catalog invalidate earlier
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '300'))
+
+# Coupons
+# Seconds each worker may reuse its in-process table of active coupons
+COUPON_TABLE_TTL = int(os.getenv('COUPON_TABLE_TTL', '60'))
+
+# Stock reservations
+# Seconds a cart or checkout may hold stock before release_expired_reservations gives it back
+STOCK_RESERVATION_TTL = int(os.getenv('STOCK_RESERVATION_TTL', '600'))
+# Units one reservation may hold across all its items
+STOCK_RESERVATION_MAX_QUANTITY = int(os.getenv('STOCK_RESERVATION_MAX_QUANTITY', '20'))
+
+# Idempotent checkout
+# Seconds a stored Idempotency-Key response is replayed before the key can be reused
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', '86400'))
+
+# Product image variants
+# Widths (px) and formats of the resized copies rendered for every product image
+PRODUCT_IMAGE_WIDTHS = [int(width) for width in os.getenv('PRODUCT_IMAGE_WIDTHS', '320,640,1024,1600').split(',')]
+PRODUCT_IMAGE_FORMATS = os.getenv('PRODUCT_IMAGE_FORMATS', 'webp,jpeg').split(',')
+PRODUCT_IMAGE_QUALITY = int(os.getenv('PRODUCT_IMAGE_QUALITY', '80'))
+# Processes rendering variants in the background, per web worker
+PRODUCT_IMAGE_WORKERS = int(os.getenv('PRODUCT_IMAGE_WORKERS', '2'))
+
+# Catalog search
+# PostgreSQL text search configurations used for stemming (shop languages: RO/RU/EN)
+CATALOG_SEARCH_CONFIGS = os.getenv('CATALOG_SEARCH_CONFIGS', 'romanian,russian,english').split(',')
+
+# Request profiling (core.profiling.ProfilingMiddleware)
+# Fraction of requests profiled at random and logged (0 disables sampling)
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+# Requests sending "X-Profile: <token>" are profiled and get a Server-Timing header; without a token only with DEBUG
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+
+# Metrics (core.metrics)
+# Directory where each worker process keeps its memory-mapped metric file; empty keeps metrics per process
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+
+# Logging
+# Profiled requests are logged as one JSON object per line
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'profiling': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        'core.profiling': {'handlers': ['profiling'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -0,0 +1,11 @@
+"""
+URL configuration for the ASGI application.
+The public catalog is served by async views; everything else is shared with config.urls.
+"""
+from django.urls import path, include
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('api/catalog/', include('catalog.async_urls')),
+    *wsgi_urlpatterns,
+]
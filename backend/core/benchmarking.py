@@ -0,0 +1,223 @@
+"""
+Helpers shared by the benchmark management commands.
+Seeded rows use a 'bench-' slug prefix so they can be told apart from real data.
+"""
+import asyncio
+import io
+import math
+import statistics
+import sys
+import time
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.test import Client, override_settings
+
+from catalog.models import Category, Product
+
+SEED_PREFIX = 'bench-'
+# Product list pages the request mixes browse, like most visitors (fewer if the catalog is smaller)
+BROWSED_PAGES = 50
+
+
+def seed_catalog(products, categories=20, batch_size=5000, stdout=None):
+    """Top the catalog up to `products` seeded active products. Returns rows created."""
+    category_ids = []
+    for index in range(categories):
+        category, _ = Category.objects.get_or_create(
+            slug=f'{SEED_PREFIX}category-{index}',
+            defaults={'name': f'Bench category {index}'},
+        )
+        category_ids.append(category.pk)
+    
+    existing = Product.objects.filter(slug__startswith=SEED_PREFIX).count()
+    created = 0
+    for start in range(existing, products, batch_size):
+        stop = min(start + batch_size, products)
+        with transaction.atomic():
+            seeded = Product.objects.bulk_create([
+                Product(
+                    name=f'Bench product {index}',
+                    slug=f'{SEED_PREFIX}product-{index}',
+                    description=f'Seeded benchmark product number {index}.',
+                    category_id=category_ids[index % len(category_ids)],
+                    price=Decimal(5 + index % 200),
+                    stock_quantity=index % 50,
+                    status='active',
+                    is_new=index % 7 == 0,
+                )
+                for index in range(start, stop)
+            ])
+            # bulk_create skips save() and its signals: fill the derived columns the catalog reads
+            batch = Product.objects.filter(pk__in=[product.pk for product in seeded])
+            if connections[batch.db].vendor == 'postgresql':
+                batch.update_search_vector()
+            batch.refresh_prices()
+            batch.refresh_primary_images()
+        created += stop - start
+        if stdout:
+            stdout.write(f'Seeded {stop}/{products} products')
+    return created
+
+
+def seed_orders(orders, customers=100, batch_size=2000, stdout=None):
+    """
+    Top seeded orders up to `orders`, spread over `customers` seeded users, with
+    one to three items of seeded products each. Stock is not touched. Returns
+    orders created.
+    """
+    from accounts.models import User
+    from orders.models import Order, OrderItem
+    
+    users = []
+    for index in range(customers):
+        user, _ = User.objects.get_or_create(
+            email=f'{SEED_PREFIX}customer-{index}@example.com',
+            defaults={'username': f'{SEED_PREFIX}customer-{index}'},
+        )
+        users.append(user.pk)
+    products = list(
+        Product.objects.filter(slug__startswith=SEED_PREFIX).order_by('pk')
+        .values_list('pk', 'price', 'category_id')[:1000]
+    )
+    
+    existing = Order.objects.filter(user__in=users).count()
+    for start in range(existing, orders, batch_size):
+        stop = min(start + batch_size, orders)
+        with transaction.atomic():
+            created = Order.objects.bulk_create([
+                Order(user_id=users[index % len(users)], status='completed' if index % 3 else 'new')
+                for index in range(start, stop)
+            ])
+            items = []
+            for index, order in enumerate(created, start):
+                for line in range(index % 3 + 1):
+                    product_id, price, category_id = products[(index * 7 + line) % len(products)]
+                    items.append(OrderItem(
+                        order=order, product_id=product_id, category_id=category_id,
+                        quantity=line + 1, price_at_purchase=price,
+                    ))
+                    order.total_price += (line + 1) * price
+            OrderItem.objects.bulk_create(items)
+            Order.objects.bulk_update(created, ['total_price'])
+        if stdout:
+            stdout.write(f'Seeded {stop}/{orders} orders')
+    return max(0, orders - existing)
+
+
+def page_count(products):
+    """Pages of the product list holding `products` products (at least one)."""
+    return max(1, math.ceil(products / settings.REST_FRAMEWORK['PAGE_SIZE']))
+
+
+def uncached():
+    """Settings override disabling the cache, so every request queries the database."""
+    return override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+
+
+def benchmark_client():
+    """Django test client addressed to an allowed host."""
+    return Client(SERVER_NAME='localhost')
+
+
+def time_request(client, path, repeat=5, **extra):
+    """Issue GET path `repeat` times; return (last response, list of durations in ms)."""
+    durations = []
+    response = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path, **extra)
+        durations.append((time.perf_counter() - start) * 1000)
+    return response, durations
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values (pct in 0-100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def median(values):
+    return statistics.median(values) if values else 0.0
+
+
+async def asgi_get(application, path, headers=()):
+    """GET path straight through an ASGI application; return (status, headers, body)."""
+    url = urlsplit(path)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': url.path,
+        'raw_path': url.path.encode('ascii'),
+        'query_string': url.query.encode('ascii'),
+        'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'accept', b'application/json'), *headers],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    received = False
+    
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client never disconnects
+        await asyncio.Future()
+    
+    start = {}
+    body = []
+    
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            start.update(message)
+        elif message['type'] == 'http.response.body':
+            body.append(message.get('body', b''))
+    
+    await application(scope, receive, send)
+    response_headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in start['headers']}
+    return start['status'], response_headers, b''.join(body)
+
+
+def wsgi_get(application, path, headers=None):
+    """GET path straight through a WSGI application; return (status, headers, body)."""
+    url = urlsplit(path)
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        **(headers or {}),
+    }
+    start = {}
+    
+    def start_response(status, response_headers, exc_info=None):
+        start['status'] = int(status.split()[0])
+        start['headers'] = {name.lower(): value for name, value in response_headers}
+    
+    result = application(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return start['status'], start['headers'], body
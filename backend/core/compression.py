@@ -0,0 +1,73 @@
+"""
+Content-coding negotiation for response bodies compressed ahead of time.
+gzip is always available, Brotli when the brotli package is installed.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred first when a client accepts several equally
+CODINGS = ['br', 'gzip']
+# Bodies smaller than this are sent as they are (as GZipMiddleware does)
+MIN_SIZE = 200
+GZIP_LEVEL = 9
+# Quality 11 is several times slower for a few percent
+BROTLI_QUALITY = 9
+
+
+def available_codings():
+    """Codings this process can produce."""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def compress(content, coding):
+    """`content` compressed with `coding`, or None if that does not make it smaller."""
+    if len(content) < MIN_SIZE:
+        return None
+    if coding == 'br':
+        compressed = brotli.compress(content, quality=BROTLI_QUALITY)
+    else:
+        # A fixed mtime keeps the output identical for identical content
+        compressed = gzip.compress(content, GZIP_LEVEL, mtime=0)
+    return compressed if len(compressed) < len(content) else None
+
+
+def parse_accept_encoding(header):
+    """{coding: q} from an Accept-Encoding header; invalid weights count as 0."""
+    accepted = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def choose_encoding(header, codings):
+    """
+    The best of `codings` (in CODINGS order) acceptable per Accept-Encoding
+    `header`, or None for identity. Identity is only preferred when the
+    header gives it a higher weight than every available coding.
+    """
+    accepted = parse_accept_encoding(header or '')
+    best, best_q = None, 0.0
+    for coding in CODINGS:
+        if coding not in codings:
+            continue
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    if accepted.get('identity', 0.0) > best_q:
+        return None
+    return best
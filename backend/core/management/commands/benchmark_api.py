@@ -0,0 +1,202 @@
+import json
+import platform
+import random
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from catalog.models import Category, Product
+from core.benchmarking import (
+    BROWSED_PAGES, SEED_PREFIX, benchmark_client, median, page_count, percentile, seed_catalog, seed_orders,
+)
+from orders.models import Order
+
+GUEST_EMAIL = f'{SEED_PREFIX}api@example.com'
+# Latency metrics compared against the baseline (relative threshold)
+TIMED_METRICS = ['p50_ms', 'p95_ms']
+
+
+class QueryTimer:
+    """Execute wrapper counting queries and the time spent in the database."""
+    
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+    
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the list, detail, search, filter and checkout endpoints on a seeded catalog: '
+        'latency percentiles, SQL queries and SQL time per request. Writes JSON and compares it '
+        'with a baseline file, failing on regressions.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000,
+                            help='Seed active products up to this count (default: 100000).')
+        parser.add_argument('--orders', type=int, default=1000000,
+                            help='Seed orders up to this count (default: 1000000).')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per endpoint first.')
+        parser.add_argument('--endpoints', nargs='+', help='Only run these endpoints.')
+        parser.add_argument('--cached', action='store_true',
+                            help='Keep the catalog response cache enabled (default: every request queries).')
+        parser.add_argument('--output', default='benchmark.json', help='Results file (default: benchmark.json).')
+        parser.add_argument('--baseline', help='Results file of an earlier run to compare with.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative latency increase counted as a regression (default: 0.2 = 20%%).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the request mix.')
+    
+    def handle(self, *args, **options):
+        seed_catalog(options['products'], stdout=self.stdout)
+        seed_orders(options['orders'], stdout=self.stdout)
+        endpoints = self.get_endpoints(random.Random(options['seed']), options['products'])
+        if options['endpoints']:
+            unknown = set(options['endpoints']) - set(endpoints)
+            if unknown:
+                raise CommandError(f'Unknown endpoints: {", ".join(sorted(unknown))}. Choose from {", ".join(endpoints)}.')
+            endpoints = {name: endpoints[name] for name in options['endpoints']}
+        
+        if options['cached']:
+            cache_settings = override_settings()
+        else:
+            cache_settings = override_settings(
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+            )
+        client = benchmark_client()
+        results = {}
+        self.stdout.write(
+            f"{'endpoint':<16} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'sql ms':>8}"
+        )
+        try:
+            with cache_settings:
+                for name, request in endpoints.items():
+                    results[name] = self.run(client, request, options['requests'], options['warmup'])
+                    self.report(name, results[name])
+        finally:
+            Order.objects.filter(guest_email=GUEST_EMAIL).delete()
+        
+        data = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'products': options['products'],
+                'orders': options['orders'],
+                'requests': options['requests'],
+                'cached': options['cached'],
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as file:
+            json.dump(data, file, indent=2, sort_keys=True)
+        self.stdout.write(f"Results written to {options['output']}")
+        
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+            regressions = self.compare(baseline['results'], results, options['threshold'])
+            if regressions:
+                raise CommandError(f'{regressions} regressions against {options["baseline"]}.')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}.'))
+    
+    def get_endpoints(self, rng, products):
+        """{name: callable(client) -> response}, each call picking its own path."""
+        list_pages = min(BROWSED_PAGES, page_count(products))
+        product_ids = list(
+            Product.objects.filter(slug__startswith=SEED_PREFIX, status='active').values_list('pk', flat=True)[:5000]
+        )
+        category_ids = list(Category.objects.filter(slug__startswith=SEED_PREFIX).values_list('pk', flat=True))
+        checkout_product, _ = Product.objects.update_or_create(
+            slug=f'{SEED_PREFIX}checkout-product',
+            defaults={'name': 'Bench checkout product', 'price': 10, 'status': 'active', 'stock_quantity': 10 ** 9},
+        )
+        checkout = json.dumps({
+            'guest_email': GUEST_EMAIL,
+            'items': [{'product': checkout_product.pk, 'quantity': 1}],
+        })
+        words = ['bench', 'product', 'seeded', 'number']
+        
+        return {
+            'product_list': lambda client: client.get(f'/api/catalog/products/?page={rng.randint(1, list_pages)}'),
+            'product_detail': lambda client: client.get(f'/api/catalog/products/{rng.choice(product_ids)}/'),
+            'product_search': lambda client: client.get(
+                f'/api/catalog/products/?search={rng.choice(words)}+{rng.randint(1, 999)}'
+            ),
+            'product_filter': lambda client: client.get(
+                f'/api/catalog/products/?category={rng.choice(category_ids)}&is_new=true'
+                f'&min_price=10&max_price=150&ordering=current_price'
+            ),
+            'category_list': lambda client: client.get('/api/catalog/categories/'),
+            'checkout': lambda client: client.post('/api/orders/', checkout, content_type='application/json'),
+        }
+    
+    def run(self, client, request, count, warmup):
+        for _ in range(warmup):
+            request(client)
+        durations, queries, sql_ms = [], [], []
+        errors = 0
+        for _ in range(count):
+            timer = QueryTimer()
+            with connection.execute_wrapper(timer):
+                start = time.perf_counter()
+                response = request(client)
+                durations.append((time.perf_counter() - start) * 1000)
+            queries.append(timer.count)
+            sql_ms.append(timer.seconds * 1000)
+            errors += response.status_code >= 400
+        return {
+            'requests': count,
+            'errors': errors,
+            'p50_ms': round(median(durations), 3),
+            'p95_ms': round(percentile(durations, 95), 3),
+            'p99_ms': round(percentile(durations, 99), 3),
+            'mean_ms': round(sum(durations) / len(durations), 3),
+            'queries': median(queries),
+            'max_queries': max(queries),
+            'sql_ms': round(median(sql_ms), 3),
+        }
+    
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<16} {result['errors']:>7} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+            f"{result['p99_ms']:>9.2f} {result['queries']:>8g} {result['sql_ms']:>8.2f}"
+        )
+    
+    def compare(self, baseline, results, threshold):
+        """Print changes against the baseline; return the number of regressions."""
+        regressions = 0
+        self.stdout.write(f"\n{'endpoint':<16} {'metric':<8} {'baseline':>10} {'current':>10} {'change':>8}")
+        for name, result in results.items():
+            if name not in baseline:
+                self.stdout.write(f'{name:<16} (not in baseline)')
+                continue
+            for metric in TIMED_METRICS + ['queries', 'errors']:
+                before, after = baseline[name].get(metric), result[metric]
+                if before is None:
+                    continue
+                if metric in TIMED_METRICS:
+                    regressed = after > before * (1 + threshold)
+                else:
+                    # Query counts and errors must not grow at all
+                    regressed = after > before
+                change = f'{(after - before) / before:+.0%}' if before else ''
+                line = f'{name:<16} {metric:<8} {before:>10g} {after:>10g} {change:>8}'
+                if regressed:
+                    regressions += 1
+                    line = self.style.ERROR(f'{line}  REGRESSION')
+                self.stdout.write(line)
+        return regressions
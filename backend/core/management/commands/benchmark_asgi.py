@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from catalog.models import Product
+from core.benchmarking import BROWSED_PAGES, asgi_get, median, page_count, percentile, seed_catalog, wsgi_get
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the async catalog read path (config.asgi) with the WSGI path (config.wsgi) '
+        'under many concurrent clients: requests per second and p50/p99 latency.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000,
+                            help='Seed active products up to this count (default: 10000).')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per application.')
+        parser.add_argument('--concurrency', type=int, default=100, help='Concurrent clients.')
+        parser.add_argument('--wsgi-workers', type=int, default=8,
+                            help='Worker threads serving the WSGI application (e.g. gunicorn threads).')
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='Extra milliseconds added to every query, to model a slow database.')
+        parser.add_argument('--cached', action='store_true',
+                            help='Keep the catalog response cache enabled (default: every request queries).')
+    
+    def handle(self, *args, **options):
+        seed_catalog(options['products'], stdout=self.stdout)
+        paths = self.build_paths(options['requests'], options['products'])
+        
+        if options['db_latency']:
+            delay = options['db_latency'] / 1000
+            
+            def slow_query(execute, sql, params, many, context):
+                time.sleep(delay)
+                return execute(sql, params, many, context)
+            
+            def add_latency(sender, connection, **kwargs):
+                connection.execute_wrappers.append(slow_query)
+            
+            connection_created.connect(add_latency, weak=False)
+        
+        from config.asgi import application as asgi_application
+        from config.wsgi import application as wsgi_application
+        
+        if options['cached']:
+            cache_settings = nullcontext()
+        else:
+            cache_settings = override_settings(
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+            )
+        with cache_settings:
+            self.check_same_responses(asgi_application, wsgi_application, paths[:20])
+            self.stdout.write(
+                f"{'app':>6} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}"
+            )
+            self.report('asgi', *asyncio.run(
+                self.run_asgi(asgi_application, paths, options['concurrency'])
+            ))
+            self.report('wsgi', *self.run_wsgi(
+                wsgi_application, paths, options['concurrency'], options['wsgi_workers']
+            ))
+    
+    def build_paths(self, count, products):
+        """Mix of list pages, filtered lists, product details and the category list."""
+        product_ids = list(
+            Product.objects.filter(status='active').order_by('?').values_list('pk', flat=True)[:count]
+        )
+        list_pages = min(BROWSED_PAGES, page_count(products))
+        new_pages = min(10, page_count(Product.objects.filter(status='active', is_new=True).count()))
+        paths = []
+        for index in range(count):
+            kind = index % 4
+            if kind == 0:
+                paths.append(f'/api/catalog/products/?page={index // 4 % list_pages + 1}')
+            elif kind == 1:
+                paths.append(f'/api/catalog/products/?is_new=true&ordering=current_price&page={index // 4 % new_pages + 1}')
+            elif kind == 2:
+                paths.append(f'/api/catalog/products/{product_ids[index % len(product_ids)]}/')
+            else:
+                paths.append('/api/catalog/categories/')
+        return paths
+    
+    def check_same_responses(self, asgi_application, wsgi_application, paths):
+        for path in paths:
+            asgi_status, _, asgi_body = asyncio.run(asgi_get(asgi_application, path))
+            wsgi_status, _, wsgi_body = wsgi_get(wsgi_application, path)
+            if (asgi_status, asgi_body) != (wsgi_status, wsgi_body):
+                self.stderr.write(f'Responses differ for {path}: {asgi_status} vs {wsgi_status}')
+    
+    async def run_asgi(self, application, paths, concurrency):
+        """`concurrency` client coroutines sharing one event loop."""
+        pending = iter(paths)
+        durations = []
+        errors = 0
+        
+        async def client():
+            nonlocal errors
+            for path in pending:
+                start = time.perf_counter()
+                status, _, _ = await asgi_get(application, path)
+                durations.append((time.perf_counter() - start) * 1000)
+                errors += status != 200
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return durations, errors, time.perf_counter() - start
+    
+    def run_wsgi(self, application, paths, concurrency, workers):
+        """`concurrency` client threads sharing `workers` WSGI worker slots; waiting counts as latency."""
+        pending = iter(paths)
+        lock = threading.Lock()
+        slots = threading.BoundedSemaphore(workers)
+        durations = []
+        errors = []
+        
+        def client():
+            while True:
+                with lock:
+                    path = next(pending, None)
+                if path is None:
+                    return
+                start = time.perf_counter()
+                with slots:
+                    status, _, _ = wsgi_get(application, path)
+                durations.append((time.perf_counter() - start) * 1000)
+                if status != 200:
+                    errors.append(path)
+        
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return durations, len(errors), time.perf_counter() - start
+    
+    def report(self, name, durations, errors, elapsed):
+        self.stdout.write(
+            f'{name:>6} {len(durations):>9} {errors:>7} {len(durations) / elapsed:>9.1f} '
+            f'{median(durations):>9.2f} {percentile(durations, 99):>9.2f}'
+        )
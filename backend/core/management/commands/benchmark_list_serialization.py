@@ -0,0 +1,94 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from catalog.images import variant_name
+from catalog.models import Product, ProductImage
+from catalog.serializers import ProductListRowSerializer, ProductListSerializer
+from catalog.views import ProductViewSet
+from core.benchmarking import SEED_PREFIX, median, seed_catalog
+from core.renderers import FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the CPU time of building one product list page from model instances '
+        '(ProductListSerializer + JSONRenderer) and from values() rows '
+        '(ProductListRowSerializer + FastJSONRenderer), and check both give the same bytes.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000, help='Products per page (default: 1000).')
+        parser.add_argument('--repeat', type=int, default=20, help='Measurements per path (default: 20).')
+    
+    def handle(self, *args, **options):
+        size = options['products']
+        seed_catalog(size, stdout=self.stdout)
+        queryset = ProductViewSet.queryset.order_by('-created_at', '-id')[:size]
+        self.add_images(queryset)
+        request = Request(RequestFactory().get('/api/catalog/products/', SERVER_NAME='localhost'))
+        context = {'request': request}
+        
+        def instances():
+            return list(queryset.all())
+        
+        def rows():
+            return list(ProductListRowSerializer.get_rows(queryset))
+        
+        paths = {
+            'instances': (instances, ProductListSerializer, JSONRenderer()),
+            'rows': (rows, ProductListRowSerializer, FastJSONRenderer()),
+        }
+        results = {}
+        for name, (fetch, serializer_class, renderer) in paths.items():
+            timings = {'fetch': [], 'serialize': [], 'render': []}
+            for _ in range(options['repeat']):
+                start = time.process_time()
+                objects = fetch()
+                fetched = time.process_time()
+                data = serializer_class(objects, many=True, context=context).data
+                serialized = time.process_time()
+                content = renderer.render(data)
+                rendered = time.process_time()
+                timings['fetch'].append((fetched - start) * 1000)
+                timings['serialize'].append((serialized - fetched) * 1000)
+                timings['render'].append((rendered - serialized) * 1000)
+            results[name] = {step: median(values) for step, values in timings.items()}, content
+        
+        if results['instances'][1] != results['rows'][1]:
+            raise CommandError('The two paths rendered different bytes.')
+        
+        self.stdout.write(f'CPU ms per page of {size} products (median of {options["repeat"]}); '
+                          f'orjson {"installed" if orjson else "not installed"}')
+        self.stdout.write(f"{'path':<10} {'fetch':>8} {'serialize':>10} {'render':>8} {'total':>8}")
+        totals = {}
+        for name, (timings, content) in results.items():
+            totals[name] = sum(timings.values())
+            self.stdout.write(
+                f"{name:<10} {timings['fetch']:>8.2f} {timings['serialize']:>10.2f} "
+                f"{timings['render']:>8.2f} {totals[name]:>8.2f}"
+            )
+        saved = totals['instances'] - totals['rows']
+        self.stdout.write(self.style.SUCCESS(
+            f'Identical output; {saved:.2f} ms CPU saved per page ({saved / totals["instances"]:.0%}).'
+        ))
+    
+    def add_images(self, queryset):
+        """Give every other product of the page a primary image with variants (names only, no files)."""
+        product_ids = [
+            product_id
+            for index, (product_id, primary_image) in enumerate(queryset.values_list('pk', 'primary_image'))
+            if index % 2 == 0 and primary_image is None
+        ]
+        images = []
+        for product_id in product_ids:
+            name = f'products/{SEED_PREFIX}{product_id}.jpg'
+            images.append(ProductImage(product_id=product_id, image=name, variants={
+                fmt: {str(width): variant_name(name, width, fmt) for width in (320, 640)} for fmt in ('webp', 'jpeg')
+            }))
+        if images:
+            ProductImage.objects.bulk_create(images)
+            Product.objects.filter(pk__in=product_ids).refresh_primary_images()
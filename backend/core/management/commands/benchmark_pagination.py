@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from rest_framework.pagination import Cursor
+
+from catalog.models import Product
+from core.benchmarking import benchmark_client, median, page_count, seed_catalog, time_request, uncached
+from core.pagination import OptInCursorPagination
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare page-number and cursor pagination latency on the product list at increasing depth '
+        '(with the response cache disabled).'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200000,
+                            help='Seed active products up to this count (default: 200000).')
+        parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1000, 10000],
+                            help='Page numbers to measure.')
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per measurement.')
+    
+    def handle(self, *args, **options):
+        seed_catalog(options['products'], stdout=self.stdout)
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        last_page = page_count(options['products'])
+        pages = [page for page in options['pages'] if page <= last_page]
+        if len(pages) < len(options['pages']):
+            self.stderr.write(f"Skipping pages after {last_page}, the last page of {options['products']} products.")
+        client = benchmark_client()
+        ordered = Product.objects.filter(status='active').order_by('-created_at', '-id')
+        paginator = OptInCursorPagination()
+        paginator.base_url = '/api/catalog/products/?pagination=cursor'
+        
+        self.stdout.write(f"{'page':>8} {'page-number ms':>16} {'cursor ms':>12}")
+        with uncached():
+            for page in pages:
+                _, page_times = time_request(
+                    client, f'/api/catalog/products/?page={page}', options['repeat']
+                )
+                
+                # Cursor clients walk page by page; jump straight to the same
+                # position with the cursor of the previous page's next link.
+                offset = (page - 1) * page_size
+                path = paginator.base_url
+                if offset:
+                    path = paginator.encode_cursor(self.cursor_at(ordered, offset))
+                response, cursor_times = time_request(client, path, options['repeat'])
+                if response.status_code != 200:
+                    self.stderr.write(f'Cursor request for page {page} failed: {response.status_code}')
+                
+                self.stdout.write(
+                    f'{page:>8} {median(page_times):>16.2f} {median(cursor_times):>12.2f}'
+                )
+    
+    def cursor_at(self, ordered, offset):
+        """
+        The cursor DRF puts in the next link of a page ending after `offset` rows:
+        positioned on the last created_at before the next row's, skipping the
+        rows that share the next row's created_at.
+        """
+        pk, created_at = ordered.values_list('pk', 'created_at')[offset]
+        ties = ordered.filter(created_at=created_at, pk__gt=pk).count()
+        previous = (
+            ordered.filter(created_at__gt=created_at).order_by('created_at')
+            .values_list('created_at', flat=True).first()
+        )
+        return Cursor(offset=ties, reverse=False, position=None if previous is None else str(previous))
@@ -0,0 +1,123 @@
+import multiprocessing
+import time
+
+from django.db import DatabaseError, connections
+from django.core.management.base import BaseCommand
+
+from catalog.models import Category, Product
+from core.benchmarking import SEED_PREFIX, benchmark_client, median, percentile, uncached
+from orders.models import Order, StockReservation
+from orders.reservations import reserve
+
+GUEST_EMAIL = 'bench@example.com'
+
+
+def checkout_worker(job):
+    """Place orders for the hot product from a forked process; return (durations ms, failures)."""
+    product_id, quantity, tokens, orders = job
+    client = benchmark_client()
+    durations = []
+    failures = 0
+    for index in range(orders):
+        payload = {'guest_email': GUEST_EMAIL, 'items': [{'product': product_id, 'quantity': quantity}]}
+        if tokens:
+            payload['reservation'] = tokens[index]
+        start = time.perf_counter()
+        try:
+            response = client.post('/api/orders/', payload, content_type='application/json')
+        except DatabaseError:
+            response = None
+        durations.append((time.perf_counter() - start) * 1000)
+        if response is None or response.status_code != 201:
+            failures += 1
+    connections.close_all()
+    return durations, failures
+
+
+def hold_worker(job):
+    """Take holds on the hot product from a forked process; return (durations ms, failures)."""
+    product_id, quantity, _, orders = job
+    client = benchmark_client()
+    durations = []
+    failures = 0
+    for _ in range(orders):
+        payload = {'items': [{'product': product_id, 'quantity': quantity}]}
+        start = time.perf_counter()
+        try:
+            response = client.post('/api/orders/reservations/', payload, content_type='application/json')
+        except DatabaseError:
+            response = None
+        durations.append((time.perf_counter() - start) * 1000)
+        if response is None or response.status_code != 201:
+            failures += 1
+    connections.close_all()
+    return durations, failures
+
+
+class Command(BaseCommand):
+    help = (
+        'Place concurrent orders for a single hot product from several processes and report '
+        'throughput for direct checkout, taking holds, and checkout of held stock. '
+        'With --products N the processes are spread over N products, so the same load '
+        'without row lock contention can be compared. '
+        'Run against PostgreSQL; SQLite serializes all writers.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='Concurrent client processes.')
+        parser.add_argument('--orders', type=int, default=200, help='Orders per process and mode.')
+        parser.add_argument('--quantity', type=int, default=1, help='Units per order.')
+        parser.add_argument('--products', type=int, default=1, help='Products the processes are spread over.')
+        parser.add_argument('--modes', nargs='+', choices=['direct', 'hold', 'reserved'],
+                            default=['direct', 'hold', 'reserved'])
+    
+    def handle(self, *args, **options):
+        processes, orders, quantity = options['processes'], options['orders'], options['quantity']
+        category, _ = Category.objects.get_or_create(
+            slug=f'{SEED_PREFIX}category-hot', defaults={'name': 'Bench hot category'}
+        )
+        products = [
+            Product.objects.get_or_create(
+                slug=f'{SEED_PREFIX}hot-product' + (f'-{index}' if index else ''),
+                defaults={'name': f'Bench hot product {index}', 'category': category, 'price': 10, 'status': 'active'},
+            )[0]
+            for index in range(options['products'])
+        ]
+        
+        self.stdout.write(
+            f"{'mode':>10} {'orders':>8} {'failed':>8} {'orders/s':>10} {'p50 ms':>10} {'p95 ms':>10}"
+        )
+        # DummyCache also keeps the reservation throttle out of the measurement
+        with uncached():
+            for mode in options['modes']:
+                self.run_mode(mode, products, processes, orders, quantity)
+        
+        Order.objects.filter(guest_email=GUEST_EMAIL).delete()
+        StockReservation.objects.filter(product__in=products).delete()
+    
+    def run_mode(self, mode, products, processes, orders, quantity):
+        Product.objects.filter(pk__in=[product.pk for product in products]).update(
+            stock_quantity=processes * orders * quantity
+        )
+        jobs = []
+        for index in range(processes):
+            product = products[index % len(products)]
+            tokens = []
+            if mode == 'reserved':
+                # Holds are taken at cart time; only checkout is timed
+                tokens = [str(reserve({product.pk: quantity})[0].token) for _ in range(orders)]
+            jobs.append((product.pk, quantity, tokens, orders))
+        
+        worker = hold_worker if mode == 'hold' else checkout_worker
+        connections.close_all()
+        start = time.perf_counter()
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            results = pool.map(worker, jobs)
+        elapsed = time.perf_counter() - start
+        
+        durations = [duration for worker_durations, _ in results for duration in worker_durations]
+        failures = sum(worker_failures for _, worker_failures in results)
+        self.stdout.write(
+            f'{mode:>10} {len(durations):>8} {failures:>8} {len(durations) / elapsed:>10.1f} '
+            f'{median(durations):>10.2f} {percentile(durations, 95):>10.2f}'
+        )
@@ -0,0 +1,342 @@
+"""
+Prometheus-style metrics shared by all worker processes.
+
+Each process writes its values to its own memory-mapped file in METRICS_DIR
+(one writer per file, so increments need no cross-process locking) and the
+metrics endpoint sums the files of every process when it is scraped. Without
+METRICS_DIR the values live in anonymous memory and only cover the process
+answering the scrape, which is enough for runserver.
+
+Point METRICS_DIR at a directory (ideally on tmpfs) used by the workers of one
+deployment only, and empty it when the deployment starts. Files of workers that
+have exited are kept, so their counts still add up.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from .profiling import wrap_connections
+
+# Metric file layout: bytes in use, then entries of (key length, key padded to 8 bytes, value)
+HEADER = struct.Struct('<Q')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE = 64 * 1024
+# Other methods are counted as OTHER, so clients cannot create label values at will
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+REGISTRY = {}
+
+
+def padded(offset):
+    """Round offset up to a multiple of 8, so values are aligned."""
+    return (offset + 7) & ~7
+
+
+def read_entries(data):
+    """Yield (key, value, value offset) for every entry of a metric file's bytes."""
+    if len(data) < HEADER.size:
+        return
+    used = min(HEADER.unpack_from(data, 0)[0], len(data))
+    offset = HEADER.size
+    while offset < used:
+        length = KEY_LENGTH.unpack_from(data, offset)[0]
+        key_start = offset + KEY_LENGTH.size
+        value_offset = padded(key_start + length)
+        key = bytes(data[key_start:key_start + length]).decode()
+        yield key, VALUE.unpack_from(data, value_offset)[0], value_offset
+        offset = value_offset + VALUE.size
+
+
+class MetricFile:
+    """
+    One process's values in a memory map, backed by `path` or anonymous.
+    An entry is written in full before the used size is bumped, so readers in
+    other processes never see half of one.
+    """
+    
+    def __init__(self, path=None):
+        self.fd = None
+        size = INITIAL_SIZE
+        if path is not None:
+            # An existing file (a recycled pid) is continued
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            size = max(os.fstat(self.fd).st_size, INITIAL_SIZE)
+            os.ftruncate(self.fd, size)
+        self.memory = self.map(size)
+        if HEADER.unpack_from(self.memory, 0)[0] < HEADER.size:
+            HEADER.pack_into(self.memory, 0, HEADER.size)
+        self.offsets = {key: offset for key, value, offset in read_entries(self.memory)}
+    
+    def map(self, size):
+        if self.fd is None:
+            return mmap.mmap(-1, size)
+        return mmap.mmap(self.fd, size)
+    
+    def grow(self, needed):
+        size = len(self.memory)
+        while size < needed:
+            size *= 2
+        if self.fd is None:
+            memory = self.map(size)
+            memory[:len(self.memory)] = self.memory
+        else:
+            os.ftruncate(self.fd, size)
+            memory = self.map(size)
+        self.memory.close()
+        self.memory = memory
+    
+    def append(self, key):
+        encoded = key.encode()
+        used = HEADER.unpack_from(self.memory, 0)[0]
+        value_offset = padded(used + KEY_LENGTH.size + len(encoded))
+        end = value_offset + VALUE.size
+        if end > len(self.memory):
+            self.grow(end)
+        KEY_LENGTH.pack_into(self.memory, used, len(encoded))
+        self.memory[used + KEY_LENGTH.size:used + KEY_LENGTH.size + len(encoded)] = encoded
+        VALUE.pack_into(self.memory, value_offset, 0.0)
+        HEADER.pack_into(self.memory, 0, end)
+        self.offsets[key] = value_offset
+        return value_offset
+    
+    def add(self, key, amount):
+        offset = self.offsets.get(key)
+        if offset is None:
+            offset = self.append(key)
+        VALUE.pack_into(self.memory, offset, VALUE.unpack_from(self.memory, offset)[0] + amount)
+
+
+class MetricStore:
+    """
+    The metric file of the current process, opened on first use (and again
+    in a forked child, which must not write to its parent's file).
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.file = None
+        self.pid = None
+    
+    def get_file(self):
+        if self.file is None or self.pid != os.getpid():
+            directory = settings.METRICS_DIR
+            path = None
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f'{os.getpid()}.db')
+            self.file = MetricFile(path)
+            self.pid = os.getpid()
+        return self.file
+    
+    def add(self, *increments):
+        """Add each (key, amount) pair."""
+        with self.lock:
+            metric_file = self.get_file()
+            for key, amount in increments:
+                metric_file.add(key, amount)
+    
+    def collect(self):
+        """{key: value} summed over the files of all processes (or this process only)."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            with self.lock:
+                data = self.get_file().memory[:]
+            return {key: value for key, value, offset in read_entries(data)}
+        
+        totals = defaultdict(float)
+        for name in os.listdir(directory) if os.path.isdir(directory) else []:
+            if not name.endswith('.db'):
+                continue
+            try:
+                with open(os.path.join(directory, name), 'rb') as file:
+                    data = file.read()
+            except FileNotFoundError:
+                continue
+            for key, value, offset in read_entries(data):
+                totals[key] += value
+        return totals
+
+
+store = MetricStore()
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def format_sample(name, labels, value):
+    if labels:
+        pairs = ','.join(
+            '%s="%s"' % (label, str(text).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+            for label, text in labels
+        )
+        name = f'{name}{{{pairs}}}'
+    return f'{name} {format_value(value)}'
+
+
+class Metric:
+    """A named metric with fixed label names, registered for the metrics endpoint."""
+    type = None
+    
+    def __init__(self, name, documentation, labelnames=()):
+        if name in REGISTRY:
+            raise ValueError(f'Metric {name} is already registered.')
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.keys = {}
+        REGISTRY[name] = self
+    
+    def key(self, sample, labels, extra=()):
+        """Store key of a sample, cached per label values."""
+        label_values = tuple(str(labels[label]) for label in self.labelnames)
+        cache_key = (sample, label_values, extra)
+        key = self.keys.get(cache_key)
+        if key is None:
+            key = json.dumps([self.name, sample, [*zip(self.labelnames, label_values), *extra]])
+            self.keys[cache_key] = key
+        return key
+    
+    def render(self, samples):
+        """Exposition lines for [(sample name, labels, value)] of this metric."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines += [format_sample(sample, labels, value) for sample, labels, value in sorted(samples)]
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+    
+    def inc(self, amount=1, **labels):
+        store.add((self.key(self.name, labels), amount))
+
+
+class Histogram(Metric):
+    type = 'histogram'
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets or self.default_buckets) + (float('inf'),)
+    
+    def observe(self, value, **labels):
+        # Buckets are stored per bound and made cumulative when rendered
+        bound = self.buckets[bisect_left(self.buckets, value)]
+        store.add(
+            (self.key(f'{self.name}_bucket', labels, (('le', format_value(bound)),)), 1),
+            (self.key(f'{self.name}_sum', labels), value),
+            (self.key(f'{self.name}_count', labels), 1),
+        )
+    
+    def render(self, samples):
+        series = defaultdict(lambda: {'buckets': {}, 'sum': 0.0, 'count': 0.0})
+        for sample, labels, value in samples:
+            if sample.endswith('_bucket'):
+                *labels, (_, bound) = labels
+                series[tuple(labels)]['buckets'][bound] = value
+            else:
+                series[tuple(labels)][sample.rsplit('_', 1)[1]] = value
+        
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for labels, data in sorted(series.items()):
+            total = 0
+            for bound in self.buckets:
+                total += data['buckets'].get(format_value(bound), 0)
+                lines.append(format_sample(f'{self.name}_bucket', [*labels, ('le', format_value(bound))], total))
+            lines.append(format_sample(f'{self.name}_sum', labels, data['sum']))
+            lines.append(format_sample(f'{self.name}_count', labels, data['count']))
+        return lines
+
+
+def render_metrics():
+    """Every registered metric in the Prometheus text exposition format (version 0.0.4)."""
+    samples = defaultdict(list)
+    for key, value in store.collect().items():
+        name, sample, labels = json.loads(key)
+        samples[name].append((sample, tuple(tuple(pair) for pair in labels), value))
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines += metric.render(samples.get(name, []))
+    return '\n'.join(lines) + '\n'
+
+
+requests_total = Counter(
+    'http_requests_total', 'HTTP requests handled, by view, method and status.', ['view', 'method', 'status']
+)
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Time to produce the response, by view and method.', ['view', 'method']
+)
+request_queries = Histogram(
+    'http_request_queries', 'Database queries run per request, by view and method.', ['view', 'method'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+
+
+class QueryCounter:
+    """Execute wrapper counting queries."""
+    
+    def __init__(self):
+        self.count = 0
+    
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status and query count of every request per view (URL
+    name), on both the WSGI and the ASGI path.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            wrap_connections(stack, queries)
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, queries.count)
+        return response
+    
+    async def __acall__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+        stack = ExitStack()
+        # Queries run in the request's thread-sensitive worker thread, on its connections
+        await sync_to_async(wrap_connections)(stack, queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.record(request, response, time.perf_counter() - start, queries.count)
+        return response
+    
+    def record(self, request, response, duration, queries):
+        match = request.resolver_match
+        view = (match.view_name or match.route) if match else 'unmatched'
+        method = request.method if request.method in METHODS else 'OTHER'
+        requests_total.inc(view=view, method=method, status=response.status_code)
+        request_duration.observe(duration, view=view, method=method)
+        request_queries.observe(queries, view=view, method=method)
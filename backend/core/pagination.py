@@ -0,0 +1,57 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class OptInCursorPagination(CursorPagination):
+    """
+    Page-number pagination by default, cursor pagination on request.
+    Clients opt in with ?pagination=cursor; the next/previous links carry the
+    cursor and any filter parameters. DRF positions the cursor on the first
+    ordering field only (-created_at unless the view's OrderingFilter says
+    otherwise): rows sharing that value are skipped with an offset, so -id
+    only fixes their order. A row inserted with the same created_at as the
+    cursor position can shift the page boundary by one row.
+    """
+    mode_query_param = 'pagination'
+    ordering = ('-created_at', '-id')
+    fallback_class = PageNumberPagination
+    
+    def __init__(self):
+        self.fallback = self.fallback_class()
+        self.use_cursor = False
+    
+    def wants_cursor(self, request):
+        """Return True if the request asks for cursor pagination."""
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.wants_cursor(request)
+        if not self.use_cursor:
+            return self.fallback.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+    
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return self.fallback.get_paginated_response(data)
+        return super().get_paginated_response(data)
+    
+    def get_paginated_response_schema(self, schema):
+        return self.fallback.get_paginated_response_schema(schema)
+    
+    def get_schema_operation_parameters(self, view):
+        return (
+            self.fallback.get_schema_operation_parameters(view)
+            + super().get_schema_operation_parameters(view)
+        )
+    
+    def get_html_context(self):
+        if not self.use_cursor:
+            return self.fallback.get_html_context()
+        return super().get_html_context()
+    
+    def to_html(self):
+        if not self.use_cursor:
+            return self.fallback.to_html()
+        return super().to_html()
@@ -0,0 +1,39 @@
+import json
+
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    """Row estimate from the PostgreSQL planner for queryset, without running it."""
+    try:
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    except EmptyResultSet:
+        # A filter that cannot match (e.g. none()) compiles to no SQL at all
+        return 0
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts the PostgreSQL planner's row estimate for large results.
+    Falls back to an exact COUNT(*) when the estimate is below `exact_count_threshold`
+    or on other databases, so small tables and narrow filters stay exact.
+    """
+    exact_count_threshold = 100000
+    
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and connections[queryset.db].vendor == 'postgresql':
+            estimate = estimate_count(queryset)
+            if estimate >= self.exact_count_threshold:
+                return estimate
+        return super().count
@@ -0,0 +1,198 @@
+"""
+Opt-in per-request profiling.
+
+ProfilingMiddleware profiles a request when it sends the X-Profile header
+(whose value must equal PROFILING_TOKEN when one is set; without a token the
+header only works with DEBUG on) or when it is picked at random with
+probability PROFILING_SAMPLE_RATE. A profiled request records:
+
+- sql: number of queries and time spent executing them, through
+  connection.execute_wrapper on every database connection
+- serialize: time spent in serializers using ProfiledSerializerMixin
+- render: time spent rendering the response (DRF renderers)
+- total: time spent in the middleware stack below ProfilingMiddleware
+
+The timings are logged as one JSON object per line to the 'core.profiling'
+logger and, when the client asked for the profile, sent back in a
+Server-Timing header. Timings can overlap: queries run while serializing
+count towards both sql and serialize.
+
+Requests that are not profiled pay for one header lookup and, when sampling
+is on, one random() call; the serializer hook costs a context variable read
+per serialized object.
+"""
+import json
+import logging
+import random
+import secrets
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Profile of the request being handled, if it is profiled
+current_profile = ContextVar('current_profile', default=None)
+
+
+def wrap_connections(stack, wrapper):
+    """Enter connection.execute_wrapper(wrapper) on every database connection of this thread."""
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(wrapper))
+
+
+class Profile:
+    """Timings of one request; also the execute wrapper counting its queries."""
+    
+    def __init__(self, requested):
+        self.requested = requested
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.durations = {'sql': 0.0, 'serialize': 0.0, 'render': 0.0}
+        self.running = set()
+    
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['sql'] += time.perf_counter() - start
+            self.queries += 1
+    
+    @contextmanager
+    def timer(self, name):
+        """Add the time spent in the block to `name`; nested timers of the same name are ignored."""
+        if name in self.running:
+            yield
+            return
+        self.running.add(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] += time.perf_counter() - start
+            self.running.discard(name)
+    
+    def as_dict(self):
+        data = {'total_ms': round((time.perf_counter() - self.started) * 1000, 3), 'queries': self.queries}
+        for name, seconds in self.durations.items():
+            data[f'{name}_ms'] = round(seconds * 1000, 3)
+        return data
+    
+    def server_timing(self, data):
+        """Server-Timing header value for the as_dict() result `data`."""
+        metrics = [f'sql;dur={data["sql_ms"]};desc="{self.queries} queries"']
+        metrics += [f'{name};dur={data[f"{name}_ms"]}' for name in self.durations if name != 'sql']
+        metrics.append(f'total;dur={data["total_ms"]}')
+        return ', '.join(metrics)
+
+
+@contextmanager
+def timer(name):
+    """Time the block as `name` in the current request's profile, if it is profiled."""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    with profile.timer(name):
+        yield
+
+
+class ProfiledSerializerMixin:
+    """Count the serializer's to_representation() time towards 'serialize'."""
+    
+    def to_representation(self, instance):
+        profile = current_profile.get()
+        if profile is None:
+            return super().to_representation(instance)
+        with profile.timer('serialize'):
+            return super().to_representation(instance)
+
+
+class ProfilingMiddleware:
+    """
+    Profile sampled or requested requests; see the module docstring.
+    Put it near the top of MIDDLEWARE so the timings cover the other middleware.
+    """
+    header = 'HTTP_X_PROFILE'
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profile = self.start_profile(request)
+        if profile is None:
+            return self.get_response(request)
+        
+        token = current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                wrap_connections(stack, profile)
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish_profile(request, response, profile)
+    
+    async def __acall__(self, request):
+        profile = self.start_profile(request)
+        if profile is None:
+            return await self.get_response(request)
+        
+        token = current_profile.set(profile)
+        stack = ExitStack()
+        # Queries run in the request's thread-sensitive worker thread, on its connections
+        await sync_to_async(wrap_connections)(stack, profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            current_profile.reset(token)
+        return self.finish_profile(request, response, profile)
+    
+    def start_profile(self, request):
+        """A new Profile if the request is to be profiled, else None."""
+        value = request.META.get(self.header)
+        if value is not None:
+            token = settings.PROFILING_TOKEN
+            if secrets.compare_digest(value.encode(), token.encode()) if token else settings.DEBUG:
+                return Profile(requested=True)
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate and random.random() < rate:
+            return Profile(requested=False)
+        return None
+    
+    def process_template_response(self, request, response):
+        """Time rendering, which the handler runs after the view and before our response phase."""
+        profile = current_profile.get()
+        if profile is not None:
+            start = time.perf_counter()
+            
+            def rendered(response):
+                profile.durations['render'] += time.perf_counter() - start
+            
+            response.add_post_render_callback(rendered)
+        return response
+    
+    def finish_profile(self, request, response, profile):
+        data = profile.as_dict()
+        if profile.requested:
+            response['Server-Timing'] = profile.server_timing(data)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'sampled': not profile.requested,
+            **data,
+        }))
+        return response
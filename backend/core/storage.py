@@ -0,0 +1,41 @@
+import hashlib
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentHashedStorage(FileSystemStorage):
+    """
+    File system storage that names files by the SHA-256 of their content.
+    The upload_to directory and the lowercased extension are kept, so
+    'products/photo.JPG' is stored as 'products/<sha256>.jpg'. Uploading the
+    same bytes again returns the existing name without writing a second copy,
+    and a name never points at different content, so it can be cached forever.
+    """
+    
+    def content_hash(self, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+    
+    def hashed_name(self, name, content):
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, self.content_hash(content) + extension)
+    
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def product_image_storage():
+    """Storage for ProductImage.image."""
+    return ContentHashedStorage()
@@ -0,0 +1,310 @@
+import gzip
+import multiprocessing
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import User
+from catalog.models import Category, Product
+from orders.models import Order
+from rest_framework.authtoken.models import Token
+from reports.rollups import rebuild
+from . import compression, metrics
+from .benchmarking import SEED_PREFIX, seed_catalog, seed_orders, uncached
+from .compression import choose_encoding, compress
+from .views import serve_media
+
+
+class ServeMediaRangeTests(SimpleTestCase):
+    """Byte ranges of media files, including files with no bytes at all."""
+    
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for name, content in (('empty.bin', b''), ('digits.txt', b'0123456789')):
+            with open(os.path.join(media_root.name, name), 'wb') as file:
+                file.write(content)
+    
+    def get(self, path, byte_range):
+        return serve_media(RequestFactory().get(f'/media/{path}', HTTP_RANGE=byte_range), path)
+    
+    def test_ranges_of_empty_file_are_unsatisfiable(self):
+        for byte_range in ('bytes=-5', 'bytes=0-', 'bytes=0-0'):
+            response = self.get('empty.bin', byte_range)
+            self.assertEqual(response.status_code, 416, byte_range)
+            self.assertEqual(response['Content-Range'], 'bytes */0')
+    
+    def test_suffix_range(self):
+        response = self.get('digits.txt', 'bytes=-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 7-9/10')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+
+class EncodingNegotiationTests(SimpleTestCase):
+    """Accept-Encoding picks the coding with the highest weight among those available."""
+    
+    def test_weights(self):
+        both = ['br', 'gzip']
+        self.assertEqual(choose_encoding('gzip, br', both), 'br')
+        self.assertEqual(choose_encoding('br;q=0.5, gzip', both), 'gzip')
+        self.assertEqual(choose_encoding('br;q=0, gzip;q=0.1', both), 'gzip')
+        self.assertEqual(choose_encoding('*', both), 'br')
+        self.assertEqual(choose_encoding('*;q=0.5, br;q=0', both), 'gzip')
+        self.assertIsNone(choose_encoding('gzip;q=0', both))
+        self.assertIsNone(choose_encoding('gzip;q=high', both))
+        self.assertIsNone(choose_encoding('deflate', both))
+        self.assertIsNone(choose_encoding('', both))
+        self.assertIsNone(choose_encoding(None, both))
+    
+    def test_identity(self):
+        both = ['br', 'gzip']
+        self.assertIsNone(choose_encoding('identity', both))
+        self.assertIsNone(choose_encoding('identity, gzip;q=0.5', both))
+        self.assertEqual(choose_encoding('identity;q=0.5, gzip', both), 'gzip')
+        # Equal weights: compress
+        self.assertEqual(choose_encoding('identity, gzip', both), 'gzip')
+    
+    def test_brotli_unavailable(self):
+        with mock.patch.object(compression, 'brotli', None):
+            codings = compression.available_codings()
+        self.assertEqual(codings, ['gzip'])
+        self.assertIsNone(choose_encoding('br', codings))
+        self.assertEqual(choose_encoding('br, gzip;q=0.1', codings), 'gzip')
+    
+    def test_small_or_incompressible_bodies_are_not_compressed(self):
+        self.assertIsNone(compress(b'{}', 'gzip'))
+        self.assertIsNone(compress(os.urandom(1000), 'gzip'))
+        body = b'{"results": []}' * 50
+        self.assertEqual(gzip.decompress(compress(body, 'gzip')), body)
+
+
+class CompressedCatalogResponseTests(TestCase):
+    """Cached catalog responses are sent compressed from variants stored next to the body."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Board games')
+        for index in range(10):
+            Product.objects.create(
+                name=f'Board game {index}', category=category, price=Decimal('25.00'), status='active',
+            )
+    
+    def setUp(self):
+        cache.clear()
+    
+    def get(self, accept_encoding=None):
+        headers = {'HTTP_ACCEPT_ENCODING': accept_encoding} if accept_encoding is not None else {}
+        response = self.client.get('/api/catalog/products/', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        return response
+    
+    def assert_stored_variant(self, coding, decompress):
+        body = self.get('identity').content
+        with mock.patch('catalog.cache.compress', wraps=compress) as compress_calls:
+            first = self.get(coding)
+            second = self.get(coding)
+        for response in (first, second):
+            self.assertEqual(response['Content-Encoding'], coding)
+            self.assertEqual(decompress(response.content), body)
+        self.assertEqual(compress_calls.call_count, 1)
+    
+    def test_identity(self):
+        for accept_encoding in (None, 'identity', 'gzip;q=0', 'deflate'):
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertNotIn('Content-Encoding', self.get(accept_encoding))
+    
+    def test_gzip_variant(self):
+        self.assert_stored_variant('gzip', gzip.decompress)
+    
+    @skipUnless(compression.brotli, 'brotli is not installed.')
+    def test_brotli_variant(self):
+        self.assert_stored_variant('br', compression.brotli.decompress)
+    
+    def test_brotli_requested_without_brotli(self):
+        with mock.patch.object(compression, 'brotli', None):
+            self.assertNotIn('Content-Encoding', self.get('br'))
+            self.assertEqual(self.get('br, gzip;q=0.5')['Content-Encoding'], 'gzip')
+
+
+def count_requests(view, times):
+    """Count `times` requests to `view` (run in a forked worker process)."""
+    for _ in range(times):
+        metrics.requests_total.inc(view=view, method='GET', status=200)
+
+
+class MetricsTests(TestCase):
+    """The metrics endpoint: who may scrape it, what it returns and from which processes."""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='secret')
+        self.customer = User.objects.create_user(email='buyer@example.com', username='buyer', password='secret')
+    
+    def scrape(self, user=None):
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Token {Token.objects.get_or_create(user=user)[0].key}'
+        return self.client.get('/api/metrics/', **headers)
+    
+    def test_admin_only(self):
+        # SessionAuthentication comes first and sends no challenge: 403 rather than 401
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(self.customer).status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Token unknown').status_code, 403)
+        response = self.scrape(self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+    
+    def test_exposition_format(self):
+        self.client.get('/api/catalog/categories/')
+        lines = self.scrape(self.admin).content.decode().splitlines()
+        self.assertIn('# TYPE http_requests_total counter', lines)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', lines)
+        self.assertTrue([
+            line for line in lines
+            if line.startswith('http_requests_total{view="category-list",method="GET",status="200"} ')
+        ])
+        # Buckets are cumulative and the +Inf bucket equals the count
+        prefix = 'http_request_queries_bucket{view="category-list",method="GET",le="'
+        buckets = [float(line.rsplit(' ', 1)[1]) for line in lines if line.startswith(prefix)]
+        self.assertEqual(buckets, sorted(buckets))
+        count = next(
+            line for line in lines if line.startswith('http_request_queries_count{view="category-list",method="GET"}')
+        )
+        self.assertEqual(buckets[-1], float(count.rsplit(' ', 1)[1]))
+        self.assertTrue([line for line in lines if line.startswith(prefix + '+Inf"}')])
+    
+    def test_values_of_all_processes_are_summed(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            context = multiprocessing.get_context('fork')
+            workers = [context.Process(target=count_requests, args=('metrics-test', 5)) for _ in range(3)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+                self.assertEqual(worker.exitcode, 0)
+            self.assertEqual(len([name for name in os.listdir(directory) if name.endswith('.db')]), 3)
+            lines = metrics.render_metrics().splitlines()
+        self.assertIn('http_requests_total{view="metrics-test",method="GET",status="200"} 15', lines)
+
+
+class SeedCatalogTests(TestCase):
+    """Seeded products look like products saved one by one."""
+    
+    def test_derived_columns_are_filled(self):
+        seed_catalog(30, categories=3, batch_size=20)
+        products = Product.objects.filter(slug__startswith=SEED_PREFIX)
+        self.assertEqual(products.count(), 30)
+        self.assertFalse(products.filter(effective_price__isnull=True).exists())
+        if connection.vendor == 'postgresql':
+            self.assertFalse(products.filter(search_vector__isnull=True).exists())
+            response = Client().get('/api/catalog/products/', {'search': 'seeded benchmark'})
+            self.assertEqual(response.json()['count'], 30)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are checked against PostgreSQL only.')
+class QueryPlanTests(TestCase):
+    """
+    Every query of the hot endpoints can use an index. Each one is EXPLAINed
+    with sequential scans disabled: the planner then only picks one when no
+    index can serve the query. Tables under MIN_ROWS rows are left out.
+    """
+    PRODUCTS = 5000
+    ORDERS = 5000
+    MIN_ROWS = 1000
+    
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(cls.PRODUCTS)
+        seed_orders(cls.ORDERS)
+        rebuild()
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='secret')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p')")
+            cls.table_rows = dict(cursor.fetchall())
+    
+    def get_targets(self):
+        """(name, user, path or queryset) for each endpoint and hot ORM query shape."""
+        customer = User.objects.filter(email__startswith=f'{SEED_PREFIX}customer-').first()
+        category = Category.objects.filter(slug__startswith=SEED_PREFIX).first()
+        product = Product.objects.filter(slug__startswith=SEED_PREFIX, status='active').first()
+        order = Order.objects.filter(user=customer).first()
+        today = timezone.localdate()
+        return [
+            ('product list', None, '/api/catalog/products/'),
+            ('product list, page 50', None, '/api/catalog/products/?page=50'),
+            ('products by category', None, f'/api/catalog/products/?category={category.pk}'),
+            ('new products', None, '/api/catalog/products/?is_new=true'),
+            ('products by price', None, '/api/catalog/products/?ordering=current_price'),
+            ('product list, cursor', None, '/api/catalog/products/?pagination=cursor'),
+            ('product search', None, '/api/catalog/products/?search=bench'),
+            ('product detail', None, f'/api/catalog/products/{product.pk}/'),
+            ('category list', None, '/api/catalog/categories/'),
+            ('order list (admin)', self.admin, '/api/orders/'),
+            ('order detail (admin)', self.admin, f'/api/orders/{order.pk}/'),
+            ('order export (admin)', self.admin, f'/api/orders/export/?start={today}&end={today}'),
+            ('sales by product (admin)', self.admin, f'/api/reports/sales/?start={today}&end={today}&group_by=product'),
+            ('sales by category (admin)', self.admin, f'/api/reports/sales/?start={today}&end={today}&group_by=category'),
+            ("a customer's orders", None, Order.objects.filter(user=customer).order_by('-created_at', '-id')[:20]),
+        ]
+    
+    def capture(self, user, target):
+        """SELECT statements run by one request (or one queryset), outside session and auth lookups."""
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        with CaptureQueriesContext(connection) as context:
+            if isinstance(target, str):
+                response = client.get(target)
+                self.assertEqual(response.status_code, 200, target)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            else:
+                list(target)
+        return [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT') and 'django_session' not in query['sql']
+        ]
+    
+    def explain(self, sql):
+        """JSON plan of `sql` with sequential scans disabled."""
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                return cursor.fetchone()[0][0]['Plan']
+            finally:
+                cursor.execute('RESET enable_seqscan')
+    
+    def seq_scans(self, plan):
+        """Relations read by Seq Scan nodes anywhere in the plan."""
+        if plan['Node Type'] == 'Seq Scan':
+            yield plan['Relation Name']
+        for child in plan.get('Plans', []):
+            yield from self.seq_scans(child)
+    
+    def test_hot_queries_use_indexes(self):
+        with uncached():
+            for name, user, target in self.get_targets():
+                with self.subTest(name):
+                    problems = []
+                    for sql in self.capture(user, target):
+                        scans = {
+                            relation for relation in self.seq_scans(self.explain(sql))
+                            if self.table_rows.get(relation, 0) >= self.MIN_ROWS
+                        }
+                        if scans:
+                            problems.append(f'{", ".join(sorted(scans))}: {sql[:300]}')
+                    self.assertEqual(problems, [])
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
+from .coupons import coupon_table
 from .models import Coupon
 
 
@@ -40,11 +41,13 @@ class CouponAdmin(admin.ModelAdmin):
     def activate_coupons(self, request, queryset):
         """Bulk action to activate coupons."""
         queryset.update(active=True)
+        coupon_table.invalidate()
         self.message_user(request, f'{queryset.count()} coupons activated.')
     activate_coupons.short_description = 'Activate selected coupons'
     
     def deactivate_coupons(self, request, queryset):
         """Bulk action to deactivate coupons."""
         queryset.update(active=False)
+        coupon_table.invalidate()
         self.message_user(request, f'{queryset.count()} coupons deactivated.')
     deactivate_coupons.short_description = 'Deactivate selected coupons'
@@ -0,0 +1,87 @@
+import threading
+import time
+import uuid
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Coupon
+
+COUPON_VERSION_KEY = 'discounts:coupon-version'
+
+CouponEntry = namedtuple('CouponEntry', ['id', 'code', 'discount_percent', 'active', 'valid_from', 'valid_until'])
+
+
+def normalize_code(code):
+    """Coupon codes are matched case-insensitively, ignoring surrounding spaces."""
+    return code.strip().upper()
+
+
+def discount_amount(subtotal, discount_percent):
+    """Discount for subtotal at discount_percent, rounded to cents."""
+    return (subtotal * discount_percent / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+class CouponTable:
+    """
+    In-process map of unexpired coupons keyed by normalized code.
+    Loaded with one query and reused until the TTL expires or the shared
+    version token (bumped on every coupon change) moves, so validation
+    traffic almost never reaches the database.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._coupons = {}
+        self._version = None
+        self._expires_at = 0.0
+    
+    def _is_fresh(self, version):
+        return time.monotonic() < self._expires_at and version == self._version
+    
+    def coupons(self):
+        """Return the current {normalized code: CouponEntry} map, reloading if stale."""
+        version = cache.get(COUPON_VERSION_KEY)
+        if self._is_fresh(version):
+            return self._coupons
+        with self._lock:
+            if not self._is_fresh(version):
+                # Inactive coupons are kept, so lookups can tell them from unknown codes
+                rows = Coupon.objects.filter(
+                    valid_until__gte=timezone.now()
+                ).order_by('active', 'created_at').values_list(*CouponEntry._fields)
+                # If two codes normalize the same way an active coupon wins, then the newest
+                self._coupons = {normalize_code(row[1]): CouponEntry(*row) for row in rows}
+                self._version = version
+                self._expires_at = time.monotonic() + settings.COUPON_TABLE_TTL
+        return self._coupons
+    
+    def lookup(self, code):
+        """
+        Find a currently valid coupon.
+        Returns (entry or None, message) with the same messages as Coupon.is_valid();
+        coupons that had expired when the table was loaded are not in it and
+        are "not found".
+        """
+        entry = self.coupons().get(normalize_code(code))
+        if entry is None:
+            return None, "Coupon not found"
+        if not entry.active:
+            return None, "Coupon is not active"
+        now = timezone.now()
+        if now < entry.valid_from:
+            return None, "Coupon is not yet valid"
+        if now > entry.valid_until:
+            return None, "Coupon has expired"
+        return entry, "Coupon is valid"
+    
+    def invalidate(self):
+        """Drop this process's map and tell other processes to reload theirs."""
+        self._expires_at = 0.0
+        cache.set(COUPON_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+coupon_table = CouponTable()
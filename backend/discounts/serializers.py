@@ -0,0 +1,7 @@
+from rest_framework import serializers
+
+
+class CouponValidateSerializer(serializers.Serializer):
+    """Input for coupon validation."""
+    code = serializers.CharField(max_length=50)
+    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .coupons import coupon_table
+from .models import Coupon
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def coupon_changed(sender, using, **kwargs):
+    """Reload the coupon table once the change is committed."""
+    transaction.on_commit(coupon_table.invalidate, using=using)
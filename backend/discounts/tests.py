@@ -0,0 +1,88 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.throttling import ScopedRateThrottle
+
+from .coupons import CouponTable, coupon_table
+from .models import Coupon
+
+
+def create_coupon(code, discount_percent='10.00', starts_in=-1, ends_in=30, **fields):
+    """Coupon valid from `starts_in` to `ends_in` days from now."""
+    now = timezone.now()
+    return Coupon.objects.create(
+        code=code, discount_percent=Decimal(discount_percent),
+        valid_from=now + timedelta(days=starts_in), valid_until=now + timedelta(days=ends_in), **fields,
+    )
+
+
+class CouponValidateTests(TestCase):
+    """Coupon validation answers from the coupon table, with the messages of Coupon.is_valid()."""
+    
+    def setUp(self):
+        cache.clear()
+        coupon_table.invalidate()
+        self.client = APIClient()
+    
+    def validate(self, code, **data):
+        response = self.client.post('/api/discounts/coupons/validate/', {'code': code, **data}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_messages(self):
+        create_coupon('SPRING')
+        paused = create_coupon('PAUSED', active=False)
+        later = create_coupon('LATER', starts_in=2)
+        create_coupon('OVER', starts_in=-30, ends_in=-1)
+        
+        data = self.validate(' spring ', subtotal='80.00')
+        self.assertEqual(
+            (data['valid'], data['code'], data['discount_amount'], data['total']), (True, 'SPRING', '8.00', '72.00')
+        )
+        self.assertEqual(self.validate('PAUSED')['message'], paused.is_valid()[1])
+        self.assertEqual(self.validate('LATER')['message'], later.is_valid()[1])
+        self.assertEqual(self.validate('OVER')['message'], 'Coupon not found')
+        self.assertEqual(self.validate('NOPE')['message'], 'Coupon not found')
+    
+    def test_edited_and_deactivated_coupons_are_picked_up(self):
+        coupon = create_coupon('SUMMER')
+        self.assertEqual(self.validate('SUMMER')['discount_percent'], '10.00')
+        # Loaded once, then answered from memory
+        with self.assertNumQueries(0):
+            self.assertEqual(self.validate('SUMMER')['discount_percent'], '10.00')
+        
+        coupon.discount_percent = Decimal('25.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            coupon.save()
+        self.assertEqual(self.validate('SUMMER')['discount_percent'], '25.00')
+        
+        coupon.active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            coupon.save()
+        data = self.validate('SUMMER')
+        self.assertEqual((data['valid'], data['message']), (False, 'Coupon is not active'))
+    
+    def test_other_processes_reload_on_version_change(self):
+        # Stands for the table of another worker process
+        other = CouponTable()
+        coupon = create_coupon('AUTUMN')
+        self.assertEqual(other.lookup('AUTUMN')[0].discount_percent, Decimal('10.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            coupon.delete()
+        self.assertEqual(other.lookup('AUTUMN'), (None, 'Coupon not found'))
+    
+    def test_validation_is_throttled_per_client(self):
+        rate = settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']['coupons']
+        allowed, _ = ScopedRateThrottle().parse_rate(rate)
+        for _ in range(allowed):
+            self.validate('GUESS')
+        response = self.client.post('/api/discounts/coupons/validate/', {'code': 'GUESS'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        # Another client is counted on its own
+        self.client = APIClient(REMOTE_ADDR='10.0.0.2')
+        self.validate('GUESS')
@@ -1,9 +1,6 @@
 from django.urls import path
-
-# Placeholder for future discount API endpoints
-# For MVP, discounts are managed only via Django Admin
+from .views import CouponValidateView
 
 urlpatterns = [
-    # Future: coupon validation endpoint
-    # path('coupons/validate/', ...),
+    path('coupons/validate/', CouponValidateView.as_view(), name='coupon-validate'),
 ]
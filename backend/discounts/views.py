@@ -0,0 +1,33 @@
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.throttling import ScopedRateThrottle
+from rest_framework.views import APIView
+from .coupons import coupon_table, discount_amount, normalize_code
+from .serializers import CouponValidateSerializer
+
+
+class CouponValidateView(APIView):
+    """
+    Validate a coupon code (public API).
+    Served from the in-process coupon table.
+    Throttled per client, so codes cannot be guessed by brute force.
+    """
+    permission_classes = [AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'coupons'
+    
+    def post(self, request):
+        serializer = CouponValidateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        code = serializer.validated_data['code']
+        
+        coupon, message = coupon_table.lookup(code)
+        data = {'code': normalize_code(code), 'valid': coupon is not None, 'message': message}
+        if coupon is not None:
+            data['discount_percent'] = f'{coupon.discount_percent:.2f}'
+            subtotal = serializer.validated_data.get('subtotal')
+            if subtotal is not None:
+                discount = discount_amount(subtotal, coupon.discount_percent)
+                data['discount_amount'] = f'{discount:.2f}'
+                data['total'] = f'{subtotal - discount:.2f}'
+        return Response(data)
@@ -1,6 +1,14 @@
 from django.contrib import admin
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.utils.html import format_html
-from .models import Order, OrderItem
+from accounts.models import User
+from core.paginator import EstimatedCountPaginator
+from .export import export_response
+from .models import Order, OrderItem, StockReservation
+from .reservations import release
+
+MAX_ORDER_ID = 2 ** 63 - 1
 
 
 class OrderItemInline(admin.TabularInline):
@@ -31,22 +39,63 @@ class OrderItemInline(admin.TabularInline):
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'user_display', 'status', 'total_price_display', 'item_count', 'created_at']
     list_filter = ['status', 'created_at']
-    search_fields = ['id', 'user__email', 'guest_email', 'guest_name']
-    readonly_fields = ['total_price', 'created_at', 'updated_at']
+    search_fields = ['id', 'user__email', 'guest_email']
+    search_help_text = 'Order id or exact customer e-mail'
+    readonly_fields = ['total_price', 'coupon', 'discount_percent', 'discount_amount', 'created_at', 'updated_at']
     inlines = [OrderItemInline]
     list_editable = ['status']
+    list_select_related = ['user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Order Information', {
             'fields': ('user', 'status', 'total_price', 'created_at', 'updated_at')
         }),
+        ('Discount', {
+            'fields': ('coupon', 'discount_percent', 'discount_amount'),
+            'classes': ('collapse',)
+        }),
         ('Guest Information', {
             'fields': ('guest_email', 'guest_name'),
             'classes': ('collapse',)
         }),
     )
     
-    actions = ['mark_processing', 'mark_completed', 'mark_cancelled']
+    actions = ['mark_processing', 'mark_completed', 'mark_cancelled', 'export_csv', 'export_jsonl']
+    
+    def get_queryset(self, request):
+        """Annotate item counts with a per-row subquery (evaluated for the current page only)."""
+        item_count = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+            count=Count('pk')
+        ).values('count')
+        return super().get_queryset(request).annotate(
+            item_count=Coalesce(Subquery(item_count, output_field=IntegerField()), Value(0))
+        )
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Match an order id or an exact (case-insensitive) customer e-mail.
+        Both are index-backed; substring search would scan the whole table.
+        """
+        term = search_term.strip().lstrip('#')
+        if not term:
+            return queryset, False
+        if term.isdecimal():
+            order_id = int(term)
+            # Ids beyond the bigint range cannot match (and would make PostgreSQL raise)
+            if order_id > MAX_ORDER_ID:
+                return queryset.none(), False
+            return queryset.filter(pk=order_id), False
+        users = User.objects.filter(email__iexact=term).values('pk')
+        return queryset.filter(Q(guest_email__iexact=term) | Q(user__in=users)), False
+    
+    def save_model(self, request, obj, form, change):
+        """Only write the changed columns when editing an existing order."""
+        if not change:
+            obj.save()
+        elif form.changed_data:
+            obj.save(update_fields=[*form.changed_data, 'updated_at'])
     
     def user_display(self, obj):
         """Display user or guest info."""
@@ -57,31 +106,42 @@ class OrderAdmin(admin.ModelAdmin):
     
     def total_price_display(self, obj):
         """Display total price with formatting."""
-        return format_html('<strong>€{:.2f}</strong>', obj.total_price)
+        return format_html('<strong>€{}</strong>', f'{obj.total_price:.2f}')
     total_price_display.short_description = 'Total'
     
     def item_count(self, obj):
-        """Display number of items."""
-        return obj.items.count()
+        """Display number of items (annotated in get_queryset)."""
+        return obj.item_count
     item_count.short_description = 'Items'
+    item_count.admin_order_field = 'item_count'
     
     def mark_processing(self, request, queryset):
         """Bulk action to mark orders as processing."""
-        queryset.update(status='processing')
+        queryset.update_status('processing')
         self.message_user(request, f'{queryset.count()} orders marked as processing.')
     mark_processing.short_description = 'Mark selected orders as processing'
     
     def mark_completed(self, request, queryset):
         """Bulk action to mark orders as completed."""
-        queryset.update(status='completed')
+        queryset.update_status('completed')
         self.message_user(request, f'{queryset.count()} orders marked as completed.')
     mark_completed.short_description = 'Mark selected orders as completed'
     
     def mark_cancelled(self, request, queryset):
         """Bulk action to mark orders as cancelled."""
-        queryset.update(status='cancelled')
+        queryset.update_status('cancelled')
         self.message_user(request, f'{queryset.count()} orders marked as cancelled.')
     mark_cancelled.short_description = 'Mark selected orders as cancelled'
+    
+    def export_csv(self, request, queryset):
+        """Stream the selected orders with their items as CSV (filter by date, then select all)."""
+        return export_response(request, queryset, output='csv')
+    export_csv.short_description = 'Export selected orders with items (CSV)'
+    
+    def export_jsonl(self, request, queryset):
+        """Stream the selected orders with their items as JSON Lines."""
+        return export_response(request, queryset, output='jsonl')
+    export_jsonl.short_description = 'Export selected orders with items (JSON Lines)'
 
 
 @admin.register(OrderItem)
@@ -95,3 +155,25 @@ class OrderItemAdmin(admin.ModelAdmin):
         """Display subtotal."""
         return f'€{obj.subtotal:.2f}'
     subtotal_display.short_description = 'Subtotal'
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['token', 'product', 'quantity', 'status', 'expires_at', 'order', 'created_at']
+    list_filter = ['status', 'expires_at']
+    list_select_related = ['product', 'order']
+    search_fields = ['token']
+    readonly_fields = ['token', 'product', 'quantity', 'status', 'order', 'expires_at', 'created_at', 'updated_at']
+    
+    actions = ['release_reservations']
+    
+    def has_add_permission(self, request):
+        """Holds are created through the API so stock is taken with them."""
+        return False
+    
+    def release_reservations(self, request, queryset):
+        """Bulk action to give the stock of the selected reservations back."""
+        tokens = set(queryset.filter(status='held').values_list('token', flat=True))
+        released = sum(release(token) for token in tokens)
+        self.message_user(request, f'{released} holds released.')
+    release_reservations.short_description = 'Release selected reservations'
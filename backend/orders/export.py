@@ -0,0 +1,163 @@
+"""
+Streaming export of orders and their items for accounting.
+
+One query joins orders, items, products, customers and coupons and is read
+through a server-side cursor (QuerySet.iterator() on PostgreSQL) as plain
+values() rows; rows are encoded and flushed in small chunks as they arrive,
+so memory does not grow with the export and the first bytes go out before
+the query has finished.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from rest_framework.negotiation import BaseContentNegotiation
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+ORDER_FIELDS = [
+    'order_id', 'created_at', 'status', 'user_id', 'customer_email', 'guest_name',
+    'coupon_code', 'discount_percent', 'discount_amount', 'total_price',
+]
+ITEM_FIELDS = ['item_id', 'product_id', 'product_slug', 'product_name', 'quantity', 'price_at_purchase', 'subtotal']
+# Rows fetched per round trip from the server-side cursor
+CURSOR_CHUNK_SIZE = 2000
+# Bytes buffered before a chunk is handed to the server
+FLUSH_SIZE = 64 * 1024
+
+
+class ExportContentNegotiation(BaseContentNegotiation):
+    """
+    Ignore the Accept header: the export picks its format from `output`, and
+    errors are rendered with the view's first renderer (JSON).
+    """
+    
+    def select_parser(self, request, parsers):
+        return parsers[0]
+    
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def export_rows(orders):
+    """
+    Yield values() rows of `orders`, one per item (orders without items get
+    one row with empty item columns), ordered by order.
+    """
+    rows = orders.prefetch_related(None).order_by('created_at', 'pk', 'items__pk').values(
+        'created_at', 'status', 'user_id', 'guest_name', 'discount_percent', 'discount_amount', 'total_price',
+        order_id=F('pk'),
+        customer_email=Coalesce('user__email', 'guest_email'),
+        coupon_code=F('coupon__code'),
+        item_id=F('items__pk'),
+        product_id=F('items__product_id'),
+        product_slug=F('items__product__slug'),
+        product_name=F('items__product__name'),
+        quantity=F('items__quantity'),
+        price_at_purchase=F('items__price_at_purchase'),
+    )
+    for row in rows.iterator(chunk_size=CURSOR_CHUNK_SIZE):
+        if row['item_id'] is not None:
+            row['subtotal'] = row['quantity'] * row['price_at_purchase']
+        else:
+            row['subtotal'] = None
+        yield row
+
+
+def format_datetime(value):
+    """ISO 8601 with microseconds and UTC offset; both formats write datetimes this way."""
+    return value.isoformat()
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder keeping full datetime precision (it cuts to milliseconds)."""
+    
+    def default(self, o):
+        if isinstance(o, datetime):
+            return format_datetime(o)
+        return super().default(o)
+
+
+def csv_lines(rows):
+    """A header, then one CSV line per item row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ORDER_FIELDS + ITEM_FIELDS)
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([
+            format_datetime(value) if isinstance(value, datetime) else value
+            for value in (row[field] for field in ORDER_FIELDS + ITEM_FIELDS)
+        ])
+        yield buffer.getvalue()
+
+
+def jsonl_lines(rows):
+    """One JSON object per order, its items nested (rows arrive grouped by order)."""
+    order = None
+    for row in rows:
+        if order is None or order['order_id'] != row['order_id']:
+            if order is not None:
+                yield json.dumps(order, cls=ExportJSONEncoder) + '\n'
+            order = {field: row[field] for field in ORDER_FIELDS}
+            order['items'] = []
+        if row['item_id'] is not None:
+            order['items'].append({field: row[field] for field in ITEM_FIELDS})
+    if order is not None:
+        yield json.dumps(order, cls=ExportJSONEncoder) + '\n'
+
+
+def chunked(lines):
+    """Join lines into chunks of about FLUSH_SIZE bytes; the first line is sent on its own."""
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return
+    yield first.encode()
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_SIZE:
+            yield ''.join(buffer).encode()
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+async def async_chunks(chunks):
+    """
+    Iterate `chunks` in the thread the view ran in (and so on its database
+    connection), so the ASGI handler streams instead of buffering a sync iterator.
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def export_response(request, orders, output='csv', filename='orders'):
+    """StreamingHttpResponse exporting `orders` as csv or jsonl."""
+    lines = csv_lines if output == 'csv' else jsonl_lines
+    chunks = chunked(lines(export_rows(orders)))
+    if isinstance(request, ASGIRequest):
+        chunks = async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    response['Cache-Control'] = 'no-store'
+    return response
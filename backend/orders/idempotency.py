@@ -0,0 +1,88 @@
+"""
+Idempotency-Key support for checkout.
+
+The key row is inserted in the same transaction as the order. A concurrent
+request with the same key blocks on the primary key until the first one
+commits (and then replays its response) or rolls back (and then runs itself).
+Only successful responses are stored; failed requests leave no row behind.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(request):
+    """Hash of the caller and the request body, so a key cannot be reused for another request."""
+    payload = json.dumps(
+        [request.method, request.path, request.user.pk, request.data],
+        sort_keys=True, cls=DjangoJSONEncoder,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def replay(record, fingerprint):
+    """Response for a key that already has a stored response."""
+    if record.fingerprint != fingerprint:
+        return Response(
+            {'detail': f'{HEADER} was already used for a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(record.response_body, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent_response(request, handler):
+    """
+    Run handler() once per Idempotency-Key header and replay its response on retries.
+    Requests without the header run handler() as usual.
+    """
+    key = request.headers.get(HEADER)
+    if key is None:
+        return handler()
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {'detail': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters.'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    
+    fingerprint = request_fingerprint(request)
+    now = timezone.now()
+    record = IdempotencyKey.objects.filter(key=key, expires_at__gt=now).first()
+    if record is not None:
+        return replay(record, fingerprint)
+    
+    with transaction.atomic():
+        IdempotencyKey.objects.filter(key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    key=key,
+                    fingerprint=fingerprint,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                )
+        except IntegrityError:
+            # A request with the same key committed while this one waited
+            record = None
+        else:
+            response = handler()
+            if status.is_success(response.status_code):
+                record.status_code = response.status_code
+                record.response_body = response.data
+                record.save(update_fields=['status_code', 'response_body'])
+            else:
+                transaction.set_rollback(True)
+            return response
+    
+    return replay(IdempotencyKey.objects.get(key=key), fingerprint)
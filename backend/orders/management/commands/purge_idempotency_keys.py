@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records. Run daily (e.g. from cron).'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Keys deleted per statement.')
+    
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now)
+                .values_list('key', flat=True)[:options['batch_size']]
+            )
+            if not keys:
+                break
+            deleted += IdempotencyKey.objects.filter(key__in=keys).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'{deleted} expired idempotency keys deleted.'))
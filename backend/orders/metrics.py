@@ -0,0 +1,14 @@
+"""Checkout metrics, exposed with the rest by core.metrics."""
+from core.metrics import Counter, Histogram
+
+orders_created = Counter('checkout_orders_created_total', 'Orders created by checkout.')
+stock_rejections = Counter('checkout_stock_rejections_total', 'Checkouts rejected for insufficient stock.')
+order_items = Histogram(
+    'checkout_order_items', 'Distinct products per created order.', buckets=(1, 2, 3, 5, 10, 20, 50),
+)
+
+
+def record_order(products):
+    """Count a committed order with `products` distinct products."""
+    orders_created.inc()
+    order_items.observe(products)
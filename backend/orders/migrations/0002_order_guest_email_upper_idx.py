@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:28
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(django.db.models.functions.text.Upper('guest_email'), name='order_guest_email_upper_idx'),
+        ),
+    ]
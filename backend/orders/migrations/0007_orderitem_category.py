@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_item_categories(apps, schema_editor):
+    # The category at placement is not known for existing items: use the current one
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('catalog', 'Product')
+    category = Product.objects.filter(pk=models.OuterRef('product_id')).values('category_id')[:1]
+    OrderItem.objects.update(category=models.Subquery(category))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_product_query_indexes'),
+        ('orders', '0006_order_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='category',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.category'),
+        ),
+        migrations.RunPython(backfill_item_categories, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,34 @@
-from django.db import models
+import uuid
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import DecimalField, F, Q, Sum
+from django.db.models.functions import Now, Upper
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from accounts.models import User
-from catalog.models import Product
+from catalog.models import Category, Product
+from discounts.coupons import discount_amount
+from discounts.models import Coupon
+from .signals import order_items_changed, order_status_changed
+
+
+class OrderQuerySet(models.QuerySet):
+    """QuerySet for Order."""
+    
+    def update_status(self, status):
+        """
+        Move every order of the queryset to `status` with one UPDATE and send
+        order_status_changed for the orders that changed. Returns their number.
+        """
+        with transaction.atomic(using=self.db):
+            previous = dict(
+                self.order_by().exclude(status=status).select_for_update().values_list('pk', 'status')
+            )
+            if previous:
+                Order.objects.using(self.db).filter(pk__in=previous).update(status=status, updated_at=Now())
+                order_status_changed.send(sender=Order, orders=previous, status=status)
+        return len(previous)
 
 
 class Order(models.Model):
@@ -18,6 +45,11 @@ class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='new')
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    
+    # Coupon applied at checkout (percentage is kept in case the coupon changes)
+    coupon = models.ForeignKey(Coupon, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
+    discount_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -25,28 +57,60 @@ class Order(models.Model):
     guest_email = models.EmailField(blank=True, null=True)
     guest_name = models.CharField(max_length=200, blank=True)
     
+    objects = OrderQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
         ordering = ['-created_at']
+        indexes = [
+            # Backs case-insensitive guest e-mail search in the admin
+            models.Index(Upper('guest_email'), name='order_guest_email_upper_idx'),
+            # Newest first: admin/API lists, date-range exports and rollup rebuilds
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+            # A customer's order history, newest first
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ]
     
     def __str__(self):
         if self.user:
             return f"Order #{self.id} - {self.user.email}"
         return f"Order #{self.id} - Guest ({self.guest_email or 'No email'})"
     
-    def calculate_total(self):
-        """Calculate total price from order items."""
-        total = sum(item.subtotal for item in self.items.all())
-        self.total_price = total
-        return total
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so save() can tell when it changes
+        instance._stored_status = instance.__dict__.get('status')
+        return instance
     
     def save(self, *args, **kwargs):
-        """Override save to auto-calculate total."""
-        if not self.pk:  # New order
-            super().save(*args, **kwargs)
-        self.calculate_total()
+        """Send order_status_changed when the saved status differs from the loaded one."""
         super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' not in update_fields:
+            return
+        previous = getattr(self, '_stored_status', None)
+        self._stored_status = self.status
+        if previous and previous != self.status:
+            order_status_changed.send(sender=Order, orders={self.pk: previous}, status=self.status)
+    
+    def calculate_total(self):
+        """Calculate total price (minus coupon discount) from order items with a single aggregate query."""
+        subtotal = self.items.aggregate(total=Sum(
+            F('quantity') * F('price_at_purchase'),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))['total'] or Decimal('0.00')
+        self.discount_amount = discount_amount(subtotal, self.discount_percent)
+        self.total_price = subtotal - self.discount_amount
+        return self.total_price
+    
+    def update_total(self):
+        """Recalculate the total and store it with a single UPDATE."""
+        self.calculate_total()
+        Order.objects.filter(pk=self.pk).update(
+            total_price=self.total_price, discount_amount=self.discount_amount, updated_at=Now()
+        )
 
 
 class OrderItem(models.Model):
@@ -57,6 +121,10 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.IntegerField(validators=[MinValueValidator(1)])
     price_at_purchase = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    # Category of the product when the item was added (sales rollups keep counting it there)
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -74,7 +142,80 @@ class OrderItem(models.Model):
         return self.quantity * self.price_at_purchase
     
     def save(self, *args, **kwargs):
-        """Override save to update order total."""
+        """Override save to update order total (and send order_items_changed for a new item)."""
+        adding = self._state.adding
+        if adding and self.category_id is None:
+            self.category_id = self.product.category_id
         super().save(*args, **kwargs)
-        self.order.calculate_total()
-        self.order.save()
+        self.order.update_total()
+        if adding:
+            order_items_changed.send(sender=OrderItem, items=[self.pk], sign=1)
+    
+    def delete(self, *args, **kwargs):
+        """Override delete to update order total (and send order_items_changed first)."""
+        order_items_changed.send(sender=OrderItem, items=[self.pk], sign=-1)
+        result = super().delete(*args, **kwargs)
+        self.order.update_total()
+        return result
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for a cart or checkout until it expires.
+    Rows sharing a token form one reservation; held quantities are already
+    taken off Product.stock_quantity.
+    """
+    STATUS_CHOICES = [
+        ('held', 'Held'),
+        ('converted', 'Converted'),
+        ('released', 'Released'),
+    ]
+    
+    token = models.UUIDField(default=uuid.uuid4)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held')
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='reservations')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Stock Reservation'
+        verbose_name_plural = 'Stock Reservations'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['token', 'product'], name='reservation_token_product_unique'),
+        ]
+        indexes = [
+            # Backs the sweeper that releases expired holds
+            models.Index(fields=['expires_at'], condition=Q(status='held'), name='reservation_held_expiry_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product} x{self.quantity} ({self.get_status_display()})"
+    
+    @property
+    def is_expired(self):
+        """Returns True if the hold is past its expiry."""
+        return self.expires_at <= timezone.now()
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored response of a checkout sent with an Idempotency-Key header.
+    Retries with the same key are answered from this row until it expires.
+    """
+    key = models.CharField(max_length=255, primary_key=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+    
+    def __str__(self):
+        return self.key
@@ -0,0 +1,133 @@
+"""
+Short-lived stock reservations.
+
+A hold takes stock off Product.stock_quantity when the cart or checkout
+starts, inside a short transaction of its own, so a hot product row is locked
+only for that statement instead of for a whole checkout. Checkout converts the
+holds of its reservation token and touches only products whose ordered
+quantity differs from the held one. Expired holds are handed back in batches
+by the release_expired_reservations command.
+"""
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from catalog.models import Product
+from .models import StockReservation
+
+
+class InsufficientStock(Exception):
+    """Raised when a product cannot cover the requested quantity."""
+    
+    def __init__(self, product_id, available):
+        super().__init__(f'Insufficient stock for product {product_id}')
+        self.product_id = product_id
+        self.available = available
+
+
+def reservation_ttl():
+    return timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+
+
+def adjust_stock(deltas):
+    """
+    Take {product_id: quantity} off stock (negative quantities give stock back).
+    Rows are locked in primary key order and changed with a single UPDATE;
+    raises InsufficientStock (leaving stock untouched) if any product is short.
+    Must run inside a transaction.
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    stock = dict(
+        Product.objects.select_for_update().filter(pk__in=deltas).order_by('pk')
+        .values_list('pk', 'stock_quantity')
+    )
+    for product_id in sorted(deltas):
+        if deltas[product_id] > 0 and stock.get(product_id, 0) < deltas[product_id]:
+            raise InsufficientStock(product_id, stock.get(product_id, 0))
+    Product.objects.filter(pk__in=deltas).update(
+        stock_quantity=F('stock_quantity') - Case(
+            *[When(pk=product_id, then=Value(delta)) for product_id, delta in deltas.items()],
+            output_field=IntegerField(),
+        ),
+        updated_at=Now(),
+    )
+
+
+def reserve(quantities, ttl=None):
+    """
+    Hold {product_id: quantity} under a new token, all or nothing.
+    Returns the created StockReservation rows.
+    """
+    expires_at = timezone.now() + (ttl or reservation_ttl())
+    with transaction.atomic():
+        adjust_stock(quantities)
+        token = uuid.uuid4()
+        return StockReservation.objects.bulk_create([
+            StockReservation(
+                token=token,
+                product_id=product_id,
+                quantity=quantity,
+                expires_at=expires_at,
+            )
+            for product_id, quantity in sorted(quantities.items())
+        ])
+
+
+def lock_holds(token):
+    """Lock and return the held rows of a reservation. Must run inside a transaction."""
+    return list(
+        StockReservation.objects.select_for_update()
+        .filter(token=token, status='held').order_by('product_id')
+    )
+
+
+def held_quantities(holds):
+    quantities = defaultdict(int)
+    for hold in holds:
+        quantities[hold.product_id] += hold.quantity
+    return quantities
+
+
+def close_holds(holds, status, order=None):
+    """Mark locked holds converted or released with one UPDATE."""
+    StockReservation.objects.filter(pk__in=[hold.pk for hold in holds]).update(
+        status=status, order=order, updated_at=Now()
+    )
+
+
+def release(token):
+    """Give the stock of a reservation back. Returns the number of holds released."""
+    with transaction.atomic():
+        holds = lock_holds(token)
+        if holds:
+            close_holds(holds, 'released')
+            adjust_stock({product_id: -quantity for product_id, quantity in held_quantities(holds).items()})
+    return len(holds)
+
+
+def release_expired(now=None, batch_size=1000):
+    """
+    Release holds that expired before `now`, `batch_size` holds per transaction.
+    Holds locked by a checkout in progress are skipped. Returns the number released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            holds = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(status='held', expires_at__lte=now).order_by('expires_at')[:batch_size]
+            )
+            if not holds:
+                return released
+            close_holds(holds, 'released')
+            adjust_stock({product_id: -quantity for product_id, quantity in held_quantities(holds).items()})
+        released += len(holds)
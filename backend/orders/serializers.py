@@ -1,6 +1,15 @@
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Order, OrderItem
+from . import metrics
+from .models import Order, OrderItem, StockReservation
+from .reservations import InsufficientStock, adjust_stock, close_holds, held_quantities, lock_holds, reserve
+from .signals import order_placed
 from catalog.models import Product
+from core.profiling import ProfiledSerializerMixin
+from discounts.coupons import coupon_table, discount_amount
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -14,13 +23,27 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'price_at_purchase', 'subtotal']
 
 
+class OrderItemCreateSerializer(serializers.Serializer):
+    """
+    Serializer for order items in checkout.
+    Products are resolved in bulk by OrderCreateSerializer.create.
+    """
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating orders (public API)."""
-    items = OrderItemSerializer(many=True)
+    items = OrderItemCreateSerializer(many=True)
+    coupon_code = serializers.CharField(max_length=50, write_only=True, required=False, allow_blank=True)
+    reservation = serializers.UUIDField(write_only=True, required=False)
     
     class Meta:
         model = Order
-        fields = ['id', 'user', 'guest_email', 'guest_name', 'items', 'total_price', 'status', 'created_at']
+        fields = [
+            'id', 'user', 'guest_email', 'guest_name', 'items', 'coupon_code', 'reservation',
+            'total_price', 'status', 'created_at'
+        ]
         read_only_fields = ['id', 'total_price', 'status', 'created_at']
     
     def validate_items(self, value):
@@ -29,6 +52,15 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Order must have at least one item.")
         return value
     
+    def validate_coupon_code(self, value):
+        """Resolve the coupon from the in-process coupon table."""
+        if not value:
+            return None
+        coupon, message = coupon_table.lookup(value)
+        if coupon is None:
+            raise serializers.ValidationError(message)
+        return coupon
+    
     def validate(self, data):
         """Validate guest information if user is not provided."""
         if not data.get('user') and not data.get('guest_email'):
@@ -36,42 +68,84 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         return data
     
     def create(self, validated_data):
-        """Create order with items."""
+        """
+        Create order with items in a single transaction.
+        The order is inserted with its final total and items with bulk_create;
+        stock is adjusted last with one UPDATE, so product rows stay locked
+        only until commit. Holds of the given reservation are converted and
+        only the difference to the ordered quantities touches stock.
+        """
         items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
+        coupon = validated_data.pop('coupon_code', None)
+        reservation = validated_data.pop('reservation', None)
         
+        # Merge repeated products into a single line
+        quantities = {}
         for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
+            product_id = item_data['product']
+            quantities[product_id] = quantities.get(product_id, 0) + item_data['quantity']
+        
+        with transaction.atomic():
+            products = Product.objects.with_current_price().only(
+                'name', 'price', 'stock_quantity', 'category'
+            ).filter(pk__in=quantities).in_bulk()
             
-            # Check stock availability
-            if product.stock_quantity < quantity:
+            missing = sorted(set(quantities) - set(products))
+            if missing:
                 raise serializers.ValidationError(
-                    f"Insufficient stock for {product.name}. Available: {product.stock_quantity}"
+                    {'items': [f"Invalid product id: {product_id}" for product_id in missing]}
                 )
             
+            # Expired holds the sweeper has not reached yet still count: their
+            # stock has not been given back.
+            holds = lock_holds(reservation) if reservation else []
+            held = held_quantities(holds)
+            
             # Use current price (promo if active)
-            price_at_purchase = product.current_price
+            prices = {product_id: product.current_price for product_id, product in products.items()}
+            subtotal = sum(prices[product_id] * quantity for product_id, quantity in quantities.items())
+            if coupon is not None:
+                validated_data.update(
+                    coupon_id=coupon.id,
+                    discount_percent=coupon.discount_percent,
+                    discount_amount=discount_amount(subtotal, coupon.discount_percent),
+                )
+            total_price = subtotal - validated_data.get('discount_amount', 0)
+            order = Order.objects.create(total_price=total_price, **validated_data)
             
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                price_at_purchase=price_at_purchase
-            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=products[product_id],
+                    category_id=products[product_id].category_id,
+                    quantity=quantity,
+                    price_at_purchase=prices[product_id],
+                )
+                for product_id, quantity in quantities.items()
+            ])
             
-            # Update stock
-            product.stock_quantity -= quantity
-            product.save()
-        
-        # Recalculate total
-        order.calculate_total()
-        order.save()
+            # Update stock: take what the holds do not cover, return unused holds
+            if holds:
+                close_holds(holds, 'converted', order=order)
+            try:
+                adjust_stock({
+                    product_id: quantities.get(product_id, 0) - held.get(product_id, 0)
+                    for product_id in {*quantities, *held}
+                })
+            except InsufficientStock as error:
+                metrics.stock_rejections.inc()
+                product = products[error.product_id]
+                raise serializers.ValidationError(
+                    f"Insufficient stock for {product.name}. "
+                    f"Available: {error.available + held.get(product.pk, 0)}"
+                )
+            order_placed.send(sender=Order, order=order)
+            transaction.on_commit(lambda: metrics.record_order(len(quantities)))
         
         return order
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """Serializer for Order (read-only for detail view)."""
     items = OrderItemSerializer(many=True, read_only=True)
     user_email = serializers.EmailField(source='user.email', read_only=True)
@@ -80,6 +154,84 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = [
             'id', 'user', 'user_email', 'guest_email', 'guest_name',
-            'status', 'total_price', 'items', 'created_at', 'updated_at'
+            'status', 'coupon', 'discount_percent', 'discount_amount', 'total_price',
+            'items', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'coupon', 'discount_percent', 'discount_amount', 'created_at', 'updated_at']
+    
+    def update(self, instance, validated_data):
+        """Write only the submitted columns."""
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
+
+class StockReservationItemSerializer(serializers.ModelSerializer):
+    """Serializer for one held product of a reservation."""
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    
+    class Meta:
+        model = StockReservation
+        fields = ['product', 'product_name', 'quantity']
+
+
+class StockReservationCreateSerializer(serializers.Serializer):
+    """Serializer for holding stock (public API)."""
+    items = OrderItemCreateSerializer(many=True)
+    
+    def validate_items(self, value):
+        """Validate that items list is not empty and within the units one reservation may hold."""
+        if not value:
+            raise serializers.ValidationError("Reservation must have at least one item.")
+        if sum(item['quantity'] for item in value) > settings.STOCK_RESERVATION_MAX_QUANTITY:
+            raise serializers.ValidationError(
+                f"A reservation can hold at most {settings.STOCK_RESERVATION_MAX_QUANTITY} units."
+            )
+        return value
+    
+    def create(self, validated_data):
+        """Hold all items under a new token, or none of them."""
+        quantities = {}
+        for item_data in validated_data['items']:
+            product_id = item_data['product']
+            quantities[product_id] = quantities.get(product_id, 0) + item_data['quantity']
+        
+        products = Product.objects.only('name').in_bulk(quantities)
+        missing = sorted(set(quantities) - set(products))
+        if missing:
+            raise serializers.ValidationError(
+                {'items': [f"Invalid product id: {product_id}" for product_id in missing]}
+            )
+        
+        try:
+            holds = reserve(quantities)
+        except InsufficientStock as error:
+            raise serializers.ValidationError(
+                f"Insufficient stock for {products[error.product_id].name}. Available: {error.available}"
+            )
+        for hold in holds:
+            hold.product = products[hold.product_id]
+        return holds
+
+
+class OrderExportSerializer(serializers.Serializer):
+    """Query parameters of the order export (admin API)."""
+    start = serializers.DateField()
+    end = serializers.DateField(help_text='Inclusive.')
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    output = serializers.ChoiceField(choices=['csv', 'jsonl'], default='csv')
+    
+    def validate(self, data):
+        if data['end'] < data['start']:
+            raise serializers.ValidationError({'end': 'End must not be before start.'})
+        return data
+    
+    def filter_orders(self, orders):
+        """Orders created from start 00:00 to the end of the end day (current time zone)."""
+        start = timezone.make_aware(datetime.combine(self.validated_data['start'], time.min))
+        end = timezone.make_aware(datetime.combine(self.validated_data['end'] + timedelta(days=1), time.min))
+        orders = orders.filter(created_at__gte=start, created_at__lt=end)
+        if self.validated_data.get('status'):
+            orders = orders.filter(status=self.validated_data['status'])
+        return orders
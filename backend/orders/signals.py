@@ -0,0 +1,17 @@
+"""
+Order lifecycle signals.
+
+Sent inside the transaction that made the change; receivers that write
+elsewhere should defer their work with transaction.on_commit().
+"""
+from django.dispatch import Signal
+
+# Sent once an order and its items are inserted. Arguments: order
+order_placed = Signal()
+
+# Sent when orders move to another status. Arguments: orders ({pk: previous status}), status
+order_status_changed = Signal()
+
+# Sent when an item is added to an existing order (after the insert) or removed
+# from it (before the delete). Arguments: items (OrderItem pks), sign (1 added, -1 removed)
+order_items_changed = Signal()
@@ -0,0 +1,430 @@
+import csv
+import io
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework.throttling import ScopedRateThrottle
+
+from accounts.models import User
+from catalog.models import Product
+from .models import IdempotencyKey, Order, OrderItem, StockReservation
+from .views import OrderViewSet
+
+
+def order_payload(product, quantity=1):
+    return {
+        'guest_email': 'guest@example.com',
+        'guest_name': 'Guest',
+        'items': [{'product': product.pk, 'quantity': quantity}],
+    }
+
+
+# EstimatedCountPaginator asks the PostgreSQL planner before counting admin changelists
+ESTIMATE_QUERIES = 1 if connection.vendor == 'postgresql' else 0
+
+
+def create_order(products, status='new'):
+    """A guest order with one unit of each product; OrderItem.save keeps the total."""
+    order = Order.objects.create(guest_email='guest@example.com', status=status)
+    for product in products:
+        OrderItem.objects.create(order=order, product=product, quantity=1, price_at_purchase=product.price)
+    return order
+
+
+class OrderMutationQueryTests(TestCase):
+    """
+    Query budget of every path that changes an order. Status changes write
+    one UPDATE and never read the items; item changes keep the total with
+    one aggregate and one UPDATE. Work deferred with on_commit (sales
+    rollups) does not run inside TestCase and is not counted; removed items
+    are read for the rollups (one aggregate per rollup) before the delete.
+    """
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name=f'Puzzle {index}', price=Decimal('12.50'), stock_quantity=100, status='active')
+            for index in range(3)
+        ]
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='secret')
+    
+    def setUp(self):
+        self.admin_client = APIClient()
+        self.admin_client.force_login(self.admin)
+    
+    def count_queries(self, function, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = function(*args, **kwargs)
+        return response, len(queries)
+    
+    def changed_rows(self, queries, table):
+        """UPDATE statements of the captured queries that write to table."""
+        return [query['sql'] for query in queries if query['sql'].startswith(f'UPDATE "{table}"')]
+    
+    def test_checkout(self):
+        client = APIClient()
+        counts = []
+        for products in (self.products[:1], self.products):
+            payload = {
+                'guest_email': 'guest@example.com',
+                'items': [{'product': product.pk, 'quantity': 2} for product in products],
+            }
+            response, queries = self.count_queries(client.post, '/api/orders/', payload, format='json')
+            self.assertEqual(response.status_code, 201)
+            counts.append(queries)
+        # Savepoint, products, order insert, items insert, stock lock and update, release, response items
+        self.assertEqual(counts, [8, 8])
+        self.assertEqual(Order.objects.latest('pk').total_price, Decimal('75.00'))
+    
+    def test_create_order_is_one_insert(self):
+        with self.assertNumQueries(1):
+            Order.objects.create(guest_email='guest@example.com', total_price=Decimal('10.00'))
+    
+    def test_status_change_with_update_fields(self):
+        order = Order.objects.get(pk=create_order(self.products).pk)
+        order.status = 'processing'
+        with self.assertNumQueries(1):
+            order.save(update_fields=['status', 'updated_at'])
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.total_price), ('processing', Decimal('37.50')))
+    
+    def test_api_status_change(self):
+        counts = []
+        for products in (self.products[:1], self.products):
+            order = create_order(products)
+            response, queries = self.count_queries(
+                self.admin_client.patch, f'/api/orders/{order.pk}/', {'status': 'processing'}, format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['items']), len(products))
+            counts.append(queries)
+        # Session, user, order, items, products, one UPDATE
+        self.assertEqual(counts, [6, 6])
+    
+    def test_item_add_and_delete(self):
+        order = create_order(self.products[:2])
+        with self.assertNumQueries(3):
+            item = OrderItem.objects.create(
+                order=order, product=self.products[2], quantity=2, price_at_purchase=Decimal('5.00')
+            )
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal('35.00'))
+        with self.assertNumQueries(5):
+            item.delete()
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, Decimal('25.00'))
+    
+    def test_admin_bulk_actions(self):
+        client = self.client
+        client.force_login(self.admin)
+        for action in ('mark_processing', 'mark_completed', 'mark_cancelled'):
+            counts = []
+            for size in (1, 3):
+                orders = [create_order(self.products) for _ in range(size)]
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.post('/admin/orders/order/', {
+                        'action': action, '_selected_action': [order.pk for order in orders],
+                    })
+                self.assertEqual(response.status_code, 302)
+                self.assertEqual(len(self.changed_rows(queries, 'orders_order')), 1)
+                counts.append(len(queries))
+            # Session, user, changelist count, savepoint, lock, UPDATE, release, message count
+            self.assertEqual(counts, [8 + ESTIMATE_QUERIES] * 2, action)
+    
+    def test_admin_list_editable(self):
+        self.client.force_login(self.admin)
+        orders = [create_order(self.products) for _ in range(3)]
+        page = Order.objects.order_by('-created_at', '-id')
+        data = {
+            'form-TOTAL_FORMS': len(orders), 'form-INITIAL_FORMS': len(orders),
+            'form-MIN_NUM_FORMS': 0, 'form-MAX_NUM_FORMS': 1000, '_save': 'Save',
+        }
+        for index, order in enumerate(page):
+            data[f'form-{index}-id'] = order.pk
+            data[f'form-{index}-status'] = 'completed' if order.pk == orders[0].pk else order.status
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/admin/orders/order/', data)
+        self.assertEqual(response.status_code, 302)
+        # Django's changelist formset loads each row it validates; the changed one is one UPDATE
+        updates = self.changed_rows(queries, 'orders_order')
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"status" = \'completed\'', updates[0])
+        self.assertFalse([query for query in queries if 'SUM(' in query['sql']])
+        self.assertEqual(len(queries), 11 + ESTIMATE_QUERIES)
+    
+    def test_admin_inline_item_delete(self):
+        self.client.force_login(self.admin)
+        order = create_order(self.products)
+        items = list(order.items.order_by('pk'))
+        data = {
+            'status': 'new', 'guest_email': order.guest_email, 'guest_name': '',
+            'items-TOTAL_FORMS': len(items), 'items-INITIAL_FORMS': len(items),
+            'items-MIN_NUM_FORMS': 0, 'items-MAX_NUM_FORMS': 1000, '_save': 'Save',
+        }
+        for index, item in enumerate(items):
+            data[f'items-{index}-id'] = item.pk
+            data[f'items-{index}-order'] = order.pk
+        data['items-0-DELETE'] = 'on'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/admin/orders/order/{order.pk}/change/', data)
+        self.assertEqual(response.status_code, 302)
+        order.refresh_from_db()
+        self.assertEqual((order.items.count(), order.total_price), (2, Decimal('25.00')))
+        # Nothing on the order itself changed: only the total is written
+        self.assertEqual(len(self.changed_rows(queries, 'orders_order')), 1)
+        self.assertEqual(len(queries), 17)
+
+
+class OrderAdminSearchTests(TestCase):
+    """The order changelist search takes ids and e-mails, and never fails on odd digits."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='secret')
+        cls.order = Order.objects.create(guest_email='Buyer@Example.com')
+    
+    def search(self, term):
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/orders/order/', {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['cl'].result_list)
+    
+    def test_search_by_id_and_email(self):
+        self.assertEqual(self.search(f'#{self.order.pk}'), [self.order])
+        self.assertEqual(self.search('buyer@example.com'), [self.order])
+    
+    def test_search_with_non_decimal_digits(self):
+        self.assertEqual(self.search('²'), [])
+        self.assertEqual(self.search('9' * 30), [])
+
+
+class CheckoutCatalogTests(TestCase):
+    """The catalog shows stock taken by checkout, with a matching ETag."""
+    
+    def test_product_detail_after_checkout(self):
+        client = APIClient()
+        product = Product.objects.create(name='Kite', price=Decimal('10.00'), stock_quantity=12, status='active')
+        url = f'/api/catalog/products/{product.pk}/'
+        before = client.get(url)
+        self.assertEqual(before.json()['stock_quantity'], 12)
+        
+        response = client.post('/api/orders/', order_payload(product, 11), format='json')
+        self.assertEqual(response.status_code, 201)
+        
+        after = client.get(url, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual(after.json()['stock_quantity'], 1)
+        self.assertEqual(after.json()['stock_status'], 'limited')
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=after['ETag']).status_code, 304)
+
+
+class OrderExportTests(TestCase):
+    """CSV and JSON Lines exports write the same values."""
+    
+    def test_formats_agree_on_timestamps(self):
+        admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='secret')
+        product = Product.objects.create(name='Globe', price=Decimal('19.99'), stock_quantity=5, status='active')
+        order = create_order([product])
+        created_at = datetime(2024, 3, 5, 14, 7, 9, 123456, tzinfo=timezone.utc)
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        
+        client = APIClient()
+        client.force_authenticate(admin)
+        exports = {}
+        for output in ('csv', 'jsonl'):
+            response = client.get('/api/orders/export/', {'start': '2024-03-05', 'end': '2024-03-05', 'output': output})
+            self.assertEqual(response.status_code, 200)
+            exports[output] = b''.join(response.streaming_content).decode()
+        
+        csv_row = next(csv.DictReader(io.StringIO(exports['csv'])))
+        json_order = json.loads(exports['jsonl'])
+        self.assertEqual(csv_row['created_at'], '2024-03-05T14:07:09.123456+00:00')
+        self.assertEqual(json_order['created_at'], csv_row['created_at'])
+        self.assertEqual(json_order['total_price'], csv_row['total_price'])
+        self.assertEqual(json_order['items'][0]['subtotal'], csv_row['subtotal'])
+
+
+class StockReservationLimitTests(TestCase):
+    """Guests can only hold a bounded amount of stock, at a bounded rate."""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = Product.objects.create(name='Robot', price=Decimal('30.00'), stock_quantity=500, status='active')
+    
+    def hold(self, *quantities):
+        items = [{'product': self.product.pk, 'quantity': quantity} for quantity in quantities]
+        return self.client.post('/api/orders/reservations/', {'items': items}, format='json')
+    
+    def test_units_per_reservation_are_capped(self):
+        limit = settings.STOCK_RESERVATION_MAX_QUANTITY
+        self.assertEqual(self.hold(limit + 1).status_code, 400)
+        # The cap counts every line of the reservation
+        self.assertEqual(self.hold(limit, 1).status_code, 400)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 500)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.hold(limit).status_code, 201)
+    
+    def test_holds_are_throttled_per_client(self):
+        rate = settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']['reservations']
+        allowed, _ = ScopedRateThrottle().parse_rate(rate)
+        for _ in range(allowed):
+            self.assertEqual(self.hold(1).status_code, 201)
+        self.assertEqual(self.hold(1).status_code, 429)
+        self.assertEqual(StockReservation.objects.count(), allowed)
+        # Another client is counted on its own
+        self.client = APIClient(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(self.hold(1).status_code, 201)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs row locks (PostgreSQL).')
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Parallel checkouts of one product never oversell it."""
+    
+    def place_orders(self, product, buyers, quantity=1):
+        """POST one order per buyer, all at once from separate threads; return the status codes."""
+        barrier = threading.Barrier(buyers)
+        statuses = []
+        
+        def buy():
+            try:
+                client = APIClient()
+                barrier.wait()
+                response = client.post('/api/orders/', order_payload(product, quantity), format='json')
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=buy) for _ in range(buyers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+    
+    def test_parallel_orders_do_not_oversell(self):
+        product = Product.objects.create(name='Drone', price=Decimal('99.00'), stock_quantity=5, status='active')
+        statuses = self.place_orders(product, buyers=20)
+        
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 0)
+        self.assertEqual(statuses.count(201), 5)
+        self.assertEqual(statuses.count(400), 15)
+        self.assertEqual(Order.objects.count(), 5)
+        self.assertEqual(OrderItem.objects.aggregate(units=Sum('quantity'))['units'], 5)
+    
+    def test_parallel_multi_unit_orders_do_not_oversell(self):
+        product = Product.objects.create(name='Lamp', price=Decimal('15.00'), stock_quantity=10, status='active')
+        statuses = self.place_orders(product, buyers=12, quantity=3)
+        
+        product.refresh_from_db()
+        self.assertEqual(statuses.count(201), 3)
+        self.assertEqual(product.stock_quantity, 1)
+        self.assertEqual(OrderItem.objects.aggregate(units=Sum('quantity'))['units'], 9)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs row locks (PostgreSQL).')
+class IdempotentCheckoutTests(TransactionTestCase):
+    """Checkouts retried with the same Idempotency-Key place one order."""
+    
+    def setUp(self):
+        self.product = Product.objects.create(name='Kayak', price=Decimal('80.00'), stock_quantity=10, status='active')
+    
+    def checkout(self, key, quantity=1):
+        return APIClient().post(
+            '/api/orders/', order_payload(self.product, quantity), format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+    
+    def test_retry_replays_stored_response(self):
+        first = self.checkout('retry-key')
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first)
+        retry = self.checkout('retry-key')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 9)
+    
+    def test_key_reused_for_another_request(self):
+        self.assertEqual(self.checkout('reused-key').status_code, 201)
+        self.assertEqual(self.checkout('reused-key', quantity=2).status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+    
+    def test_failed_request_stores_nothing(self):
+        self.assertEqual(self.checkout('failed-key', quantity=11).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=20)
+        response = self.checkout('failed-key', quantity=11)
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+    
+    def test_expired_key_runs_again(self):
+        self.assertEqual(self.checkout('expiring-key').status_code, 201)
+        IdempotencyKey.objects.update(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+        response = self.checkout('expiring-key', quantity=2)
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.get().response_body['id'], response.json()['id'])
+    
+    def test_concurrent_duplicate_waits_and_replays(self):
+        created, release = threading.Event(), threading.Event()
+        create_order = OrderViewSet.create_order
+        calls = []
+        
+        def slow_create_order(view, request):
+            # Hold the first checkout open, key row inserted but not committed
+            calls.append(request)
+            response = create_order(view, request)
+            created.set()
+            release.wait(10)
+            return response
+        
+        responses = {}
+        
+        def checkout(name):
+            try:
+                responses[name] = self.checkout('concurrent-key')
+            finally:
+                connection.close()
+        
+        with mock.patch.object(OrderViewSet, 'create_order', slow_create_order):
+            first = threading.Thread(target=checkout, args=('first',))
+            first.start()
+            self.assertTrue(created.wait(10))
+            second = threading.Thread(target=checkout, args=('second',))
+            second.start()
+            # Wait until the duplicate blocks on the uncommitted key row
+            for _ in range(100):
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT count(*) FROM pg_locks WHERE NOT granted')
+                    if cursor.fetchone()[0]:
+                        break
+                time.sleep(0.05)
+            else:
+                self.fail('The duplicate checkout did not wait for the key.')
+            release.set()
+            first.join()
+            second.join()
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(responses['first'].status_code, 201)
+        self.assertEqual(responses['second'].status_code, 201)
+        self.assertEqual(responses['second']['Idempotent-Replayed'], 'true')
+        self.assertEqual(responses['second'].json(), responses['first'].json())
+        self.assertEqual(Order.objects.count(), 1)
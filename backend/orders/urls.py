@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import OrderViewSet
+from .views import OrderViewSet, StockReservationDetailView, StockReservationView
 
 router = DefaultRouter()
 router.register(r'', OrderViewSet, basename='order')
 
 urlpatterns = [
+    path('reservations/', StockReservationView.as_view(), name='reservation-list'),
+    path('reservations/<uuid:token>/', StockReservationDetailView.as_view(), name='reservation-detail'),
     path('', include(router.urls)),
 ]
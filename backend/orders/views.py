@@ -2,9 +2,19 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
-from django.db.models import Q
-from .models import Order
-from .serializers import OrderCreateSerializer, OrderSerializer
+from rest_framework.throttling import ScopedRateThrottle
+from rest_framework.views import APIView
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.http import Http404
+from core.pagination import OptInCursorPagination
+from .export import ExportContentNegotiation, export_response
+from .idempotency import idempotent_response
+from .models import Order, OrderItem, StockReservation
+from .reservations import release
+from .serializers import (
+    OrderCreateSerializer, OrderExportSerializer, OrderSerializer, StockReservationCreateSerializer,
+    StockReservationItemSerializer,
+)
 
 
 class OrderViewSet(viewsets.ModelViewSet):
@@ -13,8 +23,9 @@ class OrderViewSet(viewsets.ModelViewSet):
     - Public: Create orders (guest checkout)
     - Admin: List and manage all orders
     """
-    queryset = Order.objects.all().prefetch_related('items__product')
+    queryset = Order.objects.order_by('-created_at', '-id').select_related('user').prefetch_related('items__product')
     permission_classes = [AllowAny]  # Allow public order creation
+    pagination_class = OptInCursorPagination
     
     def get_serializer_class(self):
         """Use different serializers for create vs read."""
@@ -40,7 +51,13 @@ class OrderViewSet(viewsets.ModelViewSet):
         return Order.objects.none()
     
     def create(self, request, *args, **kwargs):
-        """Create a new order (public endpoint)."""
+        """
+        Create a new order (public endpoint).
+        Retries sent with the same Idempotency-Key header get the first response replayed.
+        """
+        return idempotent_response(request, lambda: self.create_order(request))
+    
+    def create_order(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
@@ -49,8 +66,85 @@ class OrderViewSet(viewsets.ModelViewSet):
             serializer.validated_data['user'] = request.user
         
         order = serializer.save()
+        prefetch_related_objects(
+            [order], Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        )
         
         return Response(
             OrderSerializer(order).data,
             status=status.HTTP_201_CREATED
         )
+    
+    def update(self, request, *args, **kwargs):
+        """
+        Update an order (admin). Items are read-only here, so the prefetched
+        items and products are kept for the response instead of being
+        reloaded one product at a time.
+        """
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'], content_negotiation_class=ExportContentNegotiation)
+    def export(self, request):
+        """
+        Stream orders with their items as CSV or JSON Lines (admin only).
+        Query parameters: start, end (dates, inclusive), optional status, output=csv|jsonl.
+        """
+        params = OrderExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        orders = params.filter_orders(self.get_queryset())
+        data = params.validated_data
+        return export_response(
+            request._request, orders, output=data['output'], filename=f"orders-{data['start']}-{data['end']}"
+        )
+
+
+def reservation_data(holds):
+    """Response body for the held rows of one reservation."""
+    return {
+        'reservation': str(holds[0].token),
+        'expires_at': holds[0].expires_at,
+        'items': StockReservationItemSerializer(holds, many=True).data,
+    }
+
+
+class StockReservationView(APIView):
+    """
+    Hold stock for a cart or checkout (public API).
+    The returned token is passed to order creation as `reservation`.
+    Throttled per client, since every hold takes stock off sale until it expires.
+    """
+    permission_classes = [AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'reservations'
+    
+    def post(self, request):
+        serializer = StockReservationCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        holds = serializer.save()
+        return Response(reservation_data(holds), status=status.HTTP_201_CREATED)
+
+
+class StockReservationDetailView(APIView):
+    """
+    Show or release the holds of a reservation (public API, keyed by token).
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request, token):
+        holds = list(
+            StockReservation.objects.filter(token=token, status='held')
+            .select_related('product').order_by('product_id')
+        )
+        if not holds:
+            raise Http404
+        return Response(reservation_data(holds))
+    
+    def delete(self, request, token):
+        if not release(token):
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,27 @@
+from django.contrib import admin
+from .models import DailyCategorySales, DailyProductSales
+
+
+class RollupAdmin(admin.ModelAdmin):
+    """Read-only view of a rollup table (maintained from orders, see rebuild_sales_rollups)."""
+    date_hierarchy = 'date'
+    list_filter = ['date']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(RollupAdmin):
+    list_display = ['date', 'product', 'units', 'revenue', 'orders', 'updated_at']
+    list_select_related = ['product']
+    raw_id_fields = ['product']
+
+
+@admin.register(DailyCategorySales)
+class DailyCategorySalesAdmin(RollupAdmin):
+    list_display = ['date', 'category', 'units', 'revenue', 'orders', 'updated_at']
+    list_select_related = ['category']
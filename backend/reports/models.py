@@ -0,0 +1,56 @@
+from django.db import models
+from catalog.models import Category, Product
+
+
+class DailyProductSales(models.Model):
+    """
+    Sales of one product on one day (orders not cancelled, by order date).
+    Maintained incrementally from order signals; see reports.rollups.
+    """
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Daily Product Sales'
+        verbose_name_plural = 'Daily Product Sales'
+        ordering = ['-date', 'product']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='daily_product_sales_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'date'], name='product_sales_product_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} on {self.date}: {self.units} units, €{self.revenue}"
+
+
+class DailyCategorySales(models.Model):
+    """
+    Sales of one category's products on one day, by the category of each item
+    when it was added (items without a category are left out).
+    """
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Daily Category Sales'
+        verbose_name_plural = 'Daily Category Sales'
+        ordering = ['-date', 'category']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='daily_category_sales_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'date'], name='category_sales_category_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.category_id} on {self.date}: {self.units} units, €{self.revenue}"
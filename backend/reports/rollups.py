@@ -0,0 +1,121 @@
+"""
+Daily sales rollups.
+
+Revenue is quantity x price_at_purchase (before order-level coupon
+discounts), counted on the day the order was placed in the server time zone,
+and for the category the product had when the item was added
+(OrderItem.category). Cancelled orders do not count. Placing an order adds
+its items, cancelling it subtracts them again (and un-cancelling adds them
+back); items added to or removed from an order one by one and deleted orders
+are applied too. Each change is a few aggregate queries over the affected
+items plus one UPDATE per touched rollup row. rebuild() recomputes everything
+from the items, e.g. after changing quantities or prices of existing items or
+deleting items with QuerySet.delete(), which send no signals.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Now, TruncDate
+from django.utils import timezone
+
+from orders.models import OrderItem
+from .models import DailyCategorySales, DailyProductSales
+
+REVENUE = Sum(F('quantity') * F('price_at_purchase'), output_field=DecimalField(max_digits=14, decimal_places=2))
+TOTALS = {'units': Sum('quantity'), 'revenue': REVENUE, 'orders': Count('order_id', distinct=True)}
+# (rollup model, key column, item path of the key)
+ROLLUPS = [
+    (DailyProductSales, 'product_id', 'product_id'),
+    (DailyCategorySales, 'category_id', 'category_id'),
+]
+
+
+def daily_totals(items, key_path):
+    """Units, revenue and distinct orders of `items` per (order day, key)."""
+    return items.filter(**{f'{key_path}__isnull': False}).annotate(
+        date=TruncDate('order__created_at'), key=F(key_path)
+    ).order_by().values('date', 'key').annotate(**TOTALS)
+
+
+def day_start(date):
+    """Midnight starting `date` in the current time zone."""
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def item_totals(items):
+    """
+    [(rollup model, key column, daily totals)] of the `items` queryset, read
+    now (e.g. before the items are deleted) and applied by apply_totals().
+    """
+    totals = []
+    for model, key, key_path in ROLLUPS:
+        # Sorted, so concurrent writers lock rollup rows in the same order
+        rows = sorted(daily_totals(items, key_path), key=lambda row: (row['date'], row['key']))
+        if rows:
+            totals.append((model, key, rows))
+    return totals
+
+
+def apply_totals(totals, sign=1):
+    """Add (sign=1) or subtract (sign=-1) totals from item_totals()."""
+    with transaction.atomic():
+        for model, key, rows in totals:
+            # Make sure every row exists, then increment it in place
+            model.objects.bulk_create(
+                [model(date=row['date'], **{key: row['key']}) for row in rows], ignore_conflicts=True
+            )
+            for row in rows:
+                model.objects.filter(date=row['date'], **{key: row['key']}).update(
+                    units=F('units') + sign * row['units'],
+                    revenue=F('revenue') + sign * row['revenue'],
+                    orders=F('orders') + sign * row['orders'],
+                    updated_at=Now(),
+                )
+
+
+def apply_items(items, sign=1):
+    """Add (sign=1) or subtract (sign=-1) the `items` queryset."""
+    with transaction.atomic():
+        apply_totals(item_totals(items), sign)
+
+
+def apply_orders(order_ids, sign=1):
+    """Add (sign=1) or subtract (sign=-1) the items of the given orders."""
+    apply_items(OrderItem.objects.filter(order_id__in=order_ids), sign)
+
+
+def rebuild(start=None, end=None, batch_size=5000):
+    """
+    Recompute the rollups from order items, for all days or from `start` to
+    `end` (inclusive dates). Returns the number of (product, category) rows written.
+    """
+    items = OrderItem.objects.exclude(order__status='cancelled')
+    if start:
+        items = items.filter(order__created_at__gte=day_start(start))
+    if end:
+        items = items.filter(order__created_at__lt=day_start(end + timedelta(days=1)))
+    written = []
+    with transaction.atomic():
+        for model, key, key_path in ROLLUPS:
+            rollups = model.objects.all()
+            if start:
+                rollups = rollups.filter(date__gte=start)
+            if end:
+                rollups = rollups.filter(date__lte=end)
+            rollups.delete()
+            
+            batch = []
+            count = 0
+            for row in daily_totals(items, key_path).iterator(chunk_size=batch_size):
+                batch.append(model(
+                    date=row['date'], units=row['units'], revenue=row['revenue'], orders=row['orders'],
+                    **{key: row['key']},
+                ))
+                if len(batch) >= batch_size:
+                    model.objects.bulk_create(batch)
+                    count += len(batch)
+                    batch = []
+            model.objects.bulk_create(batch)
+            written.append(count + len(batch))
+    return tuple(written)
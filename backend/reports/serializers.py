@@ -0,0 +1,35 @@
+from rest_framework import serializers
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    """Query parameters of the sales report."""
+    start = serializers.DateField()
+    end = serializers.DateField(help_text='Inclusive.')
+    group_by = serializers.ChoiceField(choices=['day', 'product', 'category'], default='day')
+    product = serializers.IntegerField(required=False)
+    category = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+    
+    def validate(self, data):
+        if data['end'] < data['start']:
+            raise serializers.ValidationError({'end': 'End must not be before start.'})
+        if data.get('product') and data.get('category'):
+            raise serializers.ValidationError('Filter by product or by category, not both.')
+        # Product rollups have no category column and category rollups cannot tell products apart
+        if data['group_by'] == 'product' and data.get('category'):
+            raise serializers.ValidationError({'category': 'Cannot filter by category when grouping by product.'})
+        if data['group_by'] == 'category' and data.get('product'):
+            raise serializers.ValidationError({'product': 'Cannot filter by product when grouping by category.'})
+        return data
+
+
+class SalesRowSerializer(serializers.Serializer):
+    """One row of the sales report; only the columns of the requested grouping are present."""
+    date = serializers.DateField(required=False)
+    product = serializers.IntegerField(source='product_id', required=False)
+    product_name = serializers.CharField(source='product__name', required=False)
+    category = serializers.IntegerField(source='category_id', required=False)
+    category_name = serializers.CharField(source='category__name', required=False)
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    orders = serializers.IntegerField(required=False)
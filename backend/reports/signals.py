@@ -0,0 +1,46 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from orders.models import Order, OrderItem
+from orders.signals import order_items_changed, order_placed, order_status_changed
+from .rollups import apply_items, apply_orders, apply_totals, item_totals
+
+
+@receiver(order_placed)
+def order_placed_rollup(sender, order, **kwargs):
+    """Add the new order's items to the sales rollups once it is committed."""
+    if order.status != 'cancelled':
+        transaction.on_commit(partial(apply_orders, [order.pk]), robust=True)
+
+
+@receiver(order_status_changed)
+def order_status_rollup(sender, orders, status, **kwargs):
+    """Take cancelled orders out of the rollups (and put un-cancelled ones back)."""
+    if status == 'cancelled':
+        order_ids, sign = [pk for pk, previous in orders.items() if previous != 'cancelled'], -1
+    else:
+        order_ids, sign = [pk for pk, previous in orders.items() if previous == 'cancelled'], 1
+    if order_ids:
+        transaction.on_commit(partial(apply_orders, order_ids, sign), robust=True)
+
+
+@receiver(order_items_changed)
+def order_items_rollup(sender, items, sign, **kwargs):
+    """
+    Count items added to an order once committed; take removed items out
+    (read now, while they still exist). Items of cancelled orders never count.
+    """
+    items = OrderItem.objects.filter(pk__in=items).exclude(order__status='cancelled')
+    if sign > 0:
+        transaction.on_commit(partial(apply_items, items), robust=True)
+    else:
+        transaction.on_commit(partial(apply_totals, item_totals(items), -1), robust=True)
+
+
+@receiver(pre_delete, sender=Order)
+def order_deleted_rollup(sender, instance, **kwargs):
+    """Take a deleted order's items out of the rollups (read before they are deleted with it)."""
+    if instance.status != 'cancelled':
+        totals = item_totals(OrderItem.objects.filter(order_id=instance.pk))
+        transaction.on_commit(partial(apply_totals, totals, -1), robust=True)
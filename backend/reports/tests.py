@@ -0,0 +1,103 @@
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from catalog.models import Category, Product
+from orders.models import Order, OrderItem
+from .models import DailyCategorySales, DailyProductSales
+
+
+def units(model, **key):
+    """Units in the rollup rows of `model` matching key, over all days."""
+    return model.objects.filter(**key).aggregate(units=Sum('units'))['units'] or 0
+
+
+class SalesReportQueryTests(TestCase):
+    """Filters that the requested grouping cannot apply are rejected."""
+    
+    def setUp(self):
+        admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        self.category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(name='Atlas', category=self.category, price=Decimal('20.00'))
+    
+    def report(self, **params):
+        today = timezone.localdate().isoformat()
+        return self.client.get('/api/reports/sales/', {'start': today, 'end': today, **params})
+    
+    def test_grouping_and_filter_must_agree(self):
+        response = self.report(group_by='product', category=self.category.pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('category', response.json())
+        response = self.report(group_by='category', product=self.product.pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('product', response.json())
+        self.assertEqual(self.report(group_by='product', product=self.product.pk).status_code, 200)
+        self.assertEqual(self.report(group_by='category', category=self.category.pk).status_code, 200)
+
+
+class SalesRollupTests(TestCase):
+    """Every way an order or its items go away takes back what was counted."""
+    
+    def setUp(self):
+        self.toys = Category.objects.create(name='Toys')
+        self.games = Category.objects.create(name='Games')
+        self.kite = Product.objects.create(
+            name='Kite', category=self.toys, price=Decimal('10.00'), stock_quantity=50, status='active'
+        )
+        self.chess = Product.objects.create(
+            name='Chess', category=self.games, price=Decimal('30.00'), stock_quantity=50, status='active'
+        )
+    
+    def place_order(self, product, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().post('/api/orders/', {
+                'guest_email': 'guest@example.com',
+                'items': [{'product': product.pk, 'quantity': quantity}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.json()['id'])
+    
+    def test_cancel_after_category_change(self):
+        order = self.place_order(self.kite, 2)
+        self.assertEqual(units(DailyCategorySales, category=self.toys), 2)
+        
+        self.kite.category = self.games
+        self.kite.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(pk=order.pk).update_status('cancelled')
+        # Taken back from the category the units were counted in
+        self.assertEqual(units(DailyCategorySales, category=self.toys), 0)
+        self.assertEqual(units(DailyCategorySales, category=self.games), 0)
+        self.assertEqual(units(DailyProductSales, product=self.kite), 0)
+    
+    def test_items_added_and_removed(self):
+        order = self.place_order(self.kite, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            item = OrderItem.objects.create(order=order, product=self.chess, quantity=3, price_at_purchase=Decimal('30.00'))
+        self.assertEqual(item.category, self.games)
+        self.assertEqual(units(DailyProductSales, product=self.chess), 3)
+        self.assertEqual(units(DailyCategorySales, category=self.games), 3)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        self.assertEqual(units(DailyProductSales, product=self.chess), 0)
+        self.assertEqual(units(DailyCategorySales, category=self.games), 0)
+        self.assertEqual(units(DailyProductSales, product=self.kite), 1)
+    
+    def test_deleted_orders(self):
+        order = self.place_order(self.kite, 4)
+        cancelled = self.place_order(self.kite, 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(pk=cancelled.pk).update_status('cancelled')
+        self.assertEqual(units(DailyProductSales, product=self.kite), 4)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(pk__in=[order.pk, cancelled.pk]).delete()
+        self.assertEqual(units(DailyProductSales, product=self.kite), 0)
+        self.assertEqual(units(DailyCategorySales, category=self.toys), 0)
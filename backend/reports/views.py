@@ -0,0 +1,48 @@
+from django.db.models import Sum
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .models import DailyCategorySales, DailyProductSales
+from .serializers import SalesReportQuerySerializer, SalesRowSerializer
+
+
+class SalesReportView(APIView):
+    """
+    Units, revenue and orders per day, product or category over a date range (admin only).
+    Reads only the daily rollup tables, never order items.
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        params = SalesReportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        group_by = query['group_by']
+        
+        if group_by == 'category' or query.get('category'):
+            rollups, key = DailyCategorySales.objects.all(), 'category'
+        else:
+            rollups, key = DailyProductSales.objects.all(), 'product'
+        rollups = rollups.filter(date__range=(query['start'], query['end']))
+        if query.get(key):
+            rollups = rollups.filter(**{f'{key}_id': query[key]})
+        
+        totals = {'units': Sum('units'), 'revenue': Sum('revenue')}
+        if group_by == 'day':
+            # Orders of several products on one day can be the same orders: only
+            # a single product or category has a meaningful order count per day
+            if query.get(key):
+                totals['orders'] = Sum('orders')
+            rows = rollups.values('date').annotate(**totals).order_by('date')
+        else:
+            totals['orders'] = Sum('orders')
+            rows = rollups.values(f'{group_by}_id', f'{group_by}__name').annotate(**totals).order_by(
+                '-revenue', f'{group_by}_id'
+            )[:query['limit']]
+        
+        return Response({
+            'start': query['start'],
+            'end': query['end'],
+            'group_by': group_by,
+            'results': SalesRowSerializer(rows, many=True).data,
+        })